@@ -15,6 +15,7 @@
 
 import sys
 import argparse
+from multiprocessing.pool import ThreadPool
 
 from requests import ConnectionError, RequestException
 
@@ -44,6 +45,8 @@ class GetAssetsCommand(Command):
                                  help='''The location from which to download the files. If not provided,
                                  config setting ``remote_assets_url`` will be used if available, else
                                  uses the default REMOTE_ASSETS_URL parameter in the script.''')
+        self.parser.add_argument('-j', '--jobs', metavar='N', type=int, default=4,
+                                 help='Number of assets to download concurrently (defaults to 4).')
         group = self.parser.add_mutually_exclusive_group(required=True)
         group.add_argument('-a', '--all', action='store_true',
                            help='Download assets for all extensions found in the index. Cannot be used with -e.')
@@ -60,7 +63,8 @@ class GetAssetsCommand(Command):
 
         # Get file index of assets
         ext_loader = ExtensionLoader(packages=settings.extension_packages, paths=settings.extension_paths)
-        getter = ext_loader.get_resource_getter('http_assets', None, url=args.url, always_fetch=args.force)
+        getter = ext_loader.get_resource_getter('http_assets', None, url=args.url, always_fetch=args.force,
+                                                max_connections=max(args.jobs, 1))
         try:
             getter.index = getter.fetch_index()
         except (ConnectionError, RequestException) as e:
@@ -94,11 +98,24 @@ class GetAssetsCommand(Command):
         # platform(s). This info might be unavailable and is not required to download
         # assets, since they are classified by extension name alone. So instead we use
         # a simple subclass of ``Extension`` providing a valid ``name`` attribute.
+        resources = []
         for ext_name in assets_to_get:
             owner = _instantiate(NamedExtension, ext_name)
-            self.logger.info('Getting assets for: {}'.format(ext_name))
-            for asset in all_assets[ext_name]:
-                getter.get(File(owner, asset))  # Download the files
+            resources.extend(File(owner, asset) for asset in all_assets[ext_name])
+
+        def download(resource):
+            self.logger.info('Getting {} for: {}'.format(resource.path, resource.owner.name))
+            return getter.get(resource)
+
+        pool = ThreadPool(max(args.jobs, 1))
+        try:
+            # map_async (rather than map) so that the wait can be interrupted.
+            results = pool.map_async(download, resources).get(sys.maxint)
+        finally:
+            pool.terminate()
+        failed = [r.path for r, result in zip(resources, results) if not result]
+        if failed:
+            self.logger.warning('Could not download: {}'.format(', '.join(failed)))
 
     def exit_with_error(self, message, code=1):
         self.logger.error(message)
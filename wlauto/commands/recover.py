@@ -0,0 +1,71 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+from collections import Counter
+
+from wlauto import Command
+from wlauto.core.result import RESULT_STREAM_FILE, read_result_stream
+from wlauto.exceptions import CommandError
+from wlauto.result_processors.standard import (get_classifier_columns, write_results_csv,
+                                               write_results_json, write_summary_csv)
+from wlauto.utils.misc import write_table
+
+
+class RecoverCommand(Command):
+
+    name = 'recover'
+    description = """
+    Rebuild the results files of a run that did not complete (e.g. because WA crashed
+    or was killed) from the results of the iterations that did.
+
+    The result of each iteration is appended to results.jsonl in the output directory
+    as it is processed. This command reads that file and (re-)writes results.csv,
+    results.json and summary.csv in the output directory, and prints the status of
+    each iteration.
+    """
+
+    def initialize(self, context):
+        self.parser.add_argument('output_directory', metavar='OUTPUT_DIRECTORY',
+                                 help='The output directory of the run.')
+        self.parser.add_argument('-a', '--use-all-classifiers', action='store_true',
+                                 help='Add a column to results.csv for every classifier of any metric.')
+        self.parser.add_argument('-e', '--extra-columns', nargs='*', default=[], metavar='CLASSIFIER',
+                                 help='Classifiers to add as columns to results.csv.')
+
+    def execute(self, args):
+        stream_file = os.path.join(args.output_directory, RESULT_STREAM_FILE)
+        if not os.path.isfile(stream_file):
+            raise CommandError('{} does not exist; cannot recover results.'.format(stream_file))
+        records = list(read_result_stream(stream_file))
+        if not records:
+            raise CommandError('No results found in {}'.format(stream_file))
+
+        columns = get_classifier_columns(records) if args.use_all_classifiers else args.extra_columns
+        with open(os.path.join(args.output_directory, 'results.csv'), 'wb') as wfh:
+            write_results_csv(records, wfh, columns)
+        with open(os.path.join(args.output_directory, 'results.json'), 'wb') as wfh:
+            write_results_json(records, wfh)
+        with open(os.path.join(args.output_directory, 'summary.csv'), 'wb') as wfh:
+            write_summary_csv(records, wfh)
+
+        counter = Counter(r['status'] for r in records)
+        sys.stdout.write('{}/{} iterations completed without error\n\n'.format(counter['OK'], len(records)))
+        rows = [map(str, [r['id'], r['label'], r['iteration'], r['status'],
+                          r['events'] and r['events'][0]['message'].split('\n')[0] or ''])
+                for r in records]
+        write_table(rows, sys.stdout, align='<<>><')
+        self.logger.info('Results written to {}'.format(args.output_directory))
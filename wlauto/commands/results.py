@@ -0,0 +1,173 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+import csv
+import argparse
+import textwrap
+
+from wlauto import Command, settings
+from wlauto.exceptions import CommandError
+from wlauto.utils.cli import init_argument_parser
+from wlauto.utils.doc import format_body
+from wlauto.utils.misc import write_table
+from wlauto.utils.resultindex import ResultIndex, ResultIndexError, FIELDS, CLASSIFIER_PREFIX
+
+
+DEFAULT_DATABASE = os.path.join(settings.environment_root, 'results_index.sqlite')
+
+
+class ResultsSubcommand(object):
+
+    name = None
+    description = None
+
+    def __init__(self, logger, subparsers):
+        self.logger = logger
+        self.parser = subparsers.add_parser(self.name, help=self.description,
+                                            description=format_body(textwrap.dedent(self.description), 80))
+        init_argument_parser(self.parser)  # propagate top-level options
+        self.parser.add_argument('-D', '--database', metavar='FILE', default=DEFAULT_DATABASE,
+                                 help='The results index database. Defaults to "{}".'.format(DEFAULT_DATABASE))
+        self.initialize()
+
+    def initialize(self):
+        pass
+
+    def get_index(self, args):
+        try:
+            return ResultIndex(args.database)
+        except ResultIndexError as e:
+            raise CommandError(str(e))
+
+
+class ResultsIndexSubcommand(ResultsSubcommand):
+
+    name = 'index'
+    description = """
+    Add the results of runs to the index. Each specified path may be the output directory
+    of a run, or a directory containing output directories. Runs whose results have not
+    changed since they were last indexed are skipped.
+    """
+
+    def initialize(self):
+        self.parser.add_argument('paths', nargs='+', metavar='PATH',
+                                 help='Output directories, or directories containing them.')
+
+    def execute(self, args):
+        for path in args.paths:
+            if not os.path.isdir(path):
+                raise CommandError('{} is not a directory.'.format(path))
+        indexed, skipped = self.get_index(args).index(args.paths)
+        self.logger.info('Indexed {} run(s); {} already up to date.'.format(indexed, skipped))
+
+
+class ResultsQuerySubcommand(ResultsSubcommand):
+
+    name = 'query'
+    description = """
+    Query the indexed results. Filters may be glob patterns (e.g. "-m 'score*'") and may be
+    specified multiple times, in which case a metric matching any of them is selected. If
+    --group-by is specified, the count, mean, min and max of the values of the selected metrics
+    in each group are shown; otherwise, each selected metric is shown.
+    """
+
+    def initialize(self):
+        filters = self.parser.add_argument_group('filters')
+        for field, short in [('workload', '-w'), ('label', '-l'), ('metric', '-m'),
+                             ('device', '-d'), ('run', '-r'), ('project', None), ('status', None)]:
+            flags = [short, '--' + field] if short else ['--' + field]
+            filters.add_argument(*flags, action='append', default=[], metavar='PATTERN',
+                                 help='Only select metrics whose {} matches PATTERN.'.format(field))
+        filters.add_argument('-C', '--classifier', action='append', default=[], metavar='NAME=VALUE',
+                             help='Only select metrics with the specified classifier value.')
+        self.parser.add_argument('-g', '--group-by', action='append', default=[], metavar='FIELD',
+                                 help='Aggregate the selected metrics by FIELD, which may be one of: {}, '
+                                      'or "{}<name>" to group by the value of a classifier.'
+                                      .format(', '.join(sorted(FIELDS)), CLASSIFIER_PREFIX))
+        self.parser.add_argument('-f', '--format', choices=['table', 'csv'], default='table',
+                                 help='The format of the output.')
+        self.parser.add_argument('-o', '--output', metavar='FILE',
+                                 help='Write the output to FILE rather than STDOUT.')
+
+    def execute(self, args):
+        filters = dict((field, getattr(args, field))
+                       for field in ['workload', 'label', 'metric', 'device', 'run', 'project', 'status'])
+        classifiers = {}
+        for entry in args.classifier:
+            if '=' not in entry:
+                raise CommandError('Classifiers must be specified as NAME=VALUE; got "{}"'.format(entry))
+            key, value = entry.split('=', 1)
+            classifiers[key] = value
+
+        index = self.get_index(args)
+        try:
+            headers, rows = index.query(filters, classifiers, args.group_by)
+        except ResultIndexError as e:
+            raise CommandError(str(e))
+
+        wfh = open(args.output, 'wb') if args.output else sys.stdout
+        try:
+            if args.format == 'csv':
+                writer = csv.writer(wfh)
+                writer.writerow(headers)
+                writer.writerows(rows)
+            elif rows:
+                # Headers are passed as rows so that they are taken into account
+                # when sizing the columns.
+                formatted = [headers, ['-' * len(h) for h in headers]]
+                formatted.extend([format_value(v) for v in row] for row in rows)
+                align = '<' * (len(headers) - 5) + '>>>><' if args.group_by else '<<<><><'
+                write_table(formatted, wfh, align=align)
+            else:
+                self.logger.info('No matching results.')
+        finally:
+            if args.output:
+                wfh.close()
+
+
+class ResultsCommand(Command):
+
+    name = 'results'
+    description = '''Index the results of runs, and query the indexed results.
+                     \n\nUse "wa results <subcommand> -h" for subcommand-specific arguments.'''
+    formatter_class = argparse.RawDescriptionHelpFormatter
+    subcmd_classes = [
+        ResultsIndexSubcommand,
+        ResultsQuerySubcommand,
+    ]
+
+    def initialize(self, context):
+        subparsers = self.parser.add_subparsers(dest='subcommand')
+        self.subcommands = []  # pylint: disable=W0201
+        for subcmd_cls in self.subcmd_classes:
+            self.subcommands.append(subcmd_cls(self.logger, subparsers))
+
+    def execute(self, args):
+        for subcmd in self.subcommands:
+            if subcmd.name == args.subcommand:
+                subcmd.execute(args)
+                break
+        else:
+            raise CommandError('Not a valid results subcommand: {}'.format(args.subcommand))
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '{:.6g}'.format(value)
+    return unicode(value)
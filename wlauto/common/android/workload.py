@@ -365,6 +365,18 @@ AndroidBenchmark = ApkWorkload  # backward compatibility
 
 class ReventWorkload(Workload):
 
+    parameters = [
+        Parameter('state_detection_scale', kind=float, default=None,
+                  description="""
+                  If specified, state detection first locates each template in a
+                  copy of the screenshot downscaled by this factor (between 0 and 1),
+                  and checks the areas around the best few matches at full
+                  resolution. This is faster for large screenshots. Templates that
+                  are not confirmed there, but that may have been lost in
+                  downscaling, are searched for in the whole screenshot.
+                  """),
+    ]
+
     def __init__(self, device, _call_super=True, **kwargs):
         if _call_super:
             Workload.__init__(self, device, **kwargs)
@@ -430,8 +442,8 @@ class ReventWorkload(Workload):
             raise WorkloadError(message)
 
         self.on_device_revent_binary = self.device.install_executable(revent_binary)
-        self.device.push_file(self.revent_run_file, self.on_device_run_revent)
-        self.device.push_file(self.revent_setup_file, self.on_device_setup_revent)
+        self.device.push_files([(self.revent_run_file, self.on_device_run_revent),
+                                (self.revent_setup_file, self.on_device_setup_revent)])
 
     def _check_statedetection_files(self, context):
         try:
@@ -445,7 +457,12 @@ class ReventWorkload(Workload):
             self.logger.info("\tChecking workload state...")
             screenshotPath = os.path.join(context.output_directory, "screen.png")
             self.device.capture_screen(screenshotPath)
-            stateCheck = state_detector.verify_state(screenshotPath, self.statedefs_dir, phase)
+            start_time = time.time()
+            stateCheck = state_detector.verify_state(screenshotPath, self.statedefs_dir, phase,
+                                                     scale=self.state_detection_scale)
+            context.result.add_metric('state_detection_{}_time'.format(phase),
+                                      time.time() - start_time, 'seconds',
+                                      lower_is_better=True)
             if not stateCheck:
                 raise WorkloadError("Unexpected state after setup")
         except state_detector.StateDefinitionError as e:
@@ -533,11 +550,13 @@ class AndroidUxPerfWorkload(AndroidUiAutoBenchmark):
         return self.device.path.join(dirname, fname)
 
     def push_assets(self, context):
+        files = []
         for f in self.deployable_assets:
             fpath = context.resolver.get(File(self, f))
             device_path = self._path_on_device(fpath)
             if self.force_push_assets or not self.device.file_exists(device_path):
-                self.device.push_file(fpath, device_path, timeout=300)
+                files.append((fpath, device_path))
+        self.device.push_files(files, timeout=300)
 
     def delete_assets(self):
         for f in self.deployable_assets:
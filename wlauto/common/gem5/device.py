@@ -17,6 +17,8 @@
 
 # pylint: disable=E1101
 
+import hashlib
+import json
 import logging
 import os
 import re
@@ -31,9 +33,11 @@ from pexpect import EOF, TIMEOUT, pxssh
 from wlauto import settings, Parameter
 from wlauto.core.resource import NO_ONE
 from wlauto.common.resources import Executable
+from wlauto.common.linux.device import BaseLinuxDevice
 from wlauto.core import signal as sig
 from wlauto.exceptions import DeviceError
 from wlauto.utils import ssh, types
+from wlauto.utils.misc import format_duration
 
 
 class BaseGem5Device(object):
@@ -98,7 +102,29 @@ class BaseGem5Device(object):
                   "When this is combined with the checkpoint_post_boot"
                   " option, it allows the checkpoint to be created post-sleep,"
                   " and therefore the set of workloads resuming from this "
-                  "checkpoint will not be required to sleep.")
+                  "checkpoint will not be required to sleep."),
+        Parameter('reuse_checkpoint', kind=bool, default=False,
+                  description="If set, a checkpoint of the simulated system is "
+                  "taken once it has booted (and slept for run_delay), and is "
+                  "stored in checkpoint_cache. Subsequent simulations with the "
+                  "same gem5 binary, gem5_args (including the kernel, disk "
+                  "images and any other files they refer to) and run_delay are "
+                  "restored from this checkpoint rather than booted, both at "
+                  "the start of the run and whenever the device is rebooted "
+                  "according to the reboot_policy. As this discards any state "
+                  "created since the checkpoint was taken, the device is "
+                  "re-initialized after each restore."),
+        Parameter('checkpoint_cache', kind=str, default=None,
+                  description="Directory in which post-boot checkpoints are "
+                  "cached when reuse_checkpoint is set. Defaults to "
+                  "gem5_checkpoints under ~/.workload_automation."),
+        Parameter('checkpoint_restore_args', kind=types.arguments,
+                  default='--checkpoint-dir={} --checkpoint-restore=1',
+                  constraint=lambda x: "{}" in str(x),
+                  description="gem5 command line used to restore the cached "
+                  "checkpoint, which is appended to gem5_args. {} will be "
+                  "replaced with the directory containing the checkpoint. The "
+                  "default is suitable for fs.py and similar scripts."),
     ]
 
     @property
@@ -119,6 +145,13 @@ class BaseGem5Device(object):
         self.stderr_file = None
         self.stderr_filename = None
         self.sckt = None
+        self.gem5_start_time = None
+        self.restored = False
+        self.restore_count = 0
+        # Set once the system has booted (or been restored), and cleared when it
+        # is first used by a job, so that it is not immediately rebooted.
+        self._post_boot = False
+        self._init_context = None
 
         # Find the first one that does not exist. Ensures that we do not re-use
         # the directory used by someone else.
@@ -139,6 +172,14 @@ class BaseGem5Device(object):
         # Assemble the virtio args
         self.gem5_vio_args = str(self.gem5_vio_args).format(self.temp_dir)  # pylint: disable=W0201
         self.logger.debug("gem5 VirtIO command: {}".format(self.gem5_vio_args))
+        if self.reuse_checkpoint:
+            if not self.checkpoint_cache:
+                self.checkpoint_cache = os.path.join(settings.environment_root, 'gem5_checkpoints')
+            self.logger.debug("gem5 checkpoint directory: {}".format(self.cached_checkpoint_dir))
+
+    def initialize(self, context, *args, **kwargs):
+        self._init_context = context
+        super(BaseGem5Device, self).initialize(context, *args, **kwargs)
 
     def init_gem5(self, _):
         """
@@ -151,30 +192,26 @@ class BaseGem5Device(object):
         """
         self.logger.info("Creating temporary directory: {}".format(self.temp_dir))
         os.mkdir(self.temp_dir)
-        os.mkdir(self.gem5outdir)
+        self.start_gem5(restore=self.has_cached_checkpoint())
 
-        # We need to redirect the standard output and standard error for the
-        # gem5 process to a file so that we can debug when things go wrong.
-        f = os.path.join(self.gem5outdir, 'stdout')
-        self.stdout_file = open(f, 'w')
-        f = os.path.join(self.gem5outdir, 'stderr')
-        self.stderr_file = open(f, 'w')
-        # We need to keep this so we can check which port to use for the telnet
-        # connection.
-        self.stderr_filename = f
-
-        self.start_gem5()
-
-    def start_gem5(self):
+    def start_gem5(self, restore=False):
         """
         Starts the gem5 simulator, and parses the output to get the telnet port.
+        If ``restore`` is ``True``, the simulation is restored from the cached
+        post-boot checkpoint.
         """
+        self.create_gem5_outdir()
         self.logger.info("Starting the gem5 simulator")
 
-        command_line = "{} --outdir={}/gem5 {} {}".format(self.gem5_binary,
-                                                          settings.output_directory,
-                                                          self.gem5_args,
-                                                          self.gem5_vio_args)
+        command_line = "{} --outdir={} {} {}".format(self.gem5_binary,
+                                                     self.gem5outdir,
+                                                     self.gem5_args,
+                                                     self.gem5_vio_args)
+        if restore:
+            self.logger.info("Restoring from checkpoint in {}".format(self.cached_checkpoint_dir))
+            command_line += ' ' + str(self.checkpoint_restore_args).format(self.cached_checkpoint_dir)
+        self.restored = restore
+        self.gem5_start_time = time.time()
         self.logger.debug("gem5 command line: {}".format(command_line))
         self.gem5 = subprocess.Popen(command_line.split(),
                                      stdout=self.stdout_file,
@@ -199,6 +236,27 @@ class BaseGem5Device(object):
                 time.sleep(1)
             f.close()
 
+    def create_gem5_outdir(self):
+        """
+        Create the gem5 output directory and the files for the standard output
+        and error of the gem5 process. Each time gem5 is restarted from a
+        checkpoint, a new output directory is used, so that the stats from
+        earlier simulations are not overwritten.
+        """
+        name = 'gem5' if not self.restore_count else 'gem5_{}'.format(self.restore_count)
+        self.gem5outdir = os.path.join(settings.output_directory, name)
+        os.mkdir(self.gem5outdir)
+
+        # We need to redirect the standard output and standard error for the
+        # gem5 process to a file so that we can debug when things go wrong.
+        f = os.path.join(self.gem5outdir, 'stdout')
+        self.stdout_file = open(f, 'w')
+        f = os.path.join(self.gem5outdir, 'stderr')
+        self.stderr_file = open(f, 'w')
+        # We need to keep this so we can check which port to use for the telnet
+        # connection.
+        self.stderr_filename = f
+
     def connect(self):  # pylint: disable=R0912,W0201
         """
         Connect to the gem5 simulation and wait for Android to boot. Then,
@@ -206,20 +264,77 @@ class BaseGem5Device(object):
         """
         self.connect_gem5()
 
-        self.wait_for_boot()
+        if self.restored:
+            duration = time.time() - self.gem5_start_time
+            self.logger.info("Restored from checkpoint in {}".format(format_duration(duration)))
+        else:
+            self.wait_for_boot()
 
-        if self.run_delay:
-            self.logger.info("Sleeping for {} seconds in the guest".format(self.run_delay))
-            self.gem5_shell("sleep {}".format(self.run_delay))
+            if self.run_delay:
+                self.logger.info("Sleeping for {} seconds in the guest".format(self.run_delay))
+                self.gem5_shell("sleep {}".format(self.run_delay))
 
-        if self.checkpoint:
-            self.checkpoint_gem5()
+            duration = time.time() - self.gem5_start_time
+            self.logger.info("Booted in {}".format(format_duration(duration)))
+
+            if self.reuse_checkpoint:
+                self.cache_checkpoint()
+            elif self.checkpoint:
+                self.checkpoint_gem5()
 
         self.mount_virtio()
         self.logger.info("Creating the working directory in the simulated system")
         self.gem5_shell('mkdir -p {}'.format(self.working_directory))
         self._is_ready = True  # pylint: disable=W0201
 
+        if self.restored and self._init_context:
+            # Anything set up by initialize() since the checkpoint was taken
+            # has been lost.
+            self.logger.info("Re-initializing the restored system")
+            self.reinitialize(self._init_context)
+        self._post_boot = True
+
+    def reinitialize(self, context):
+        """
+        Repeat the initialization of the simulated system, e.g. after it has
+        been restored from a checkpoint taken before it was initialized.
+
+        ``initialize()`` cannot simply be called again, as it is globally
+        virtual, i.e. each implementation is only executed once per WA
+        execution. Instead, the implementations of the classes that set up the
+        simulated system (as opposed to WA's own state, such as the device's
+        modules) are invoked directly, base classes first.
+        """
+        for cls in reversed(type(self).__mro__):
+            if not issubclass(cls, (BaseLinuxDevice, BaseGem5Device)):
+                continue
+            method = cls.__dict__.get('initialize')
+            method = getattr(method, 'implementation', method)
+            if method:
+                method(self, context)
+
+    def start(self):
+        self._post_boot = False  # the system is about to be used by a job
+        super(BaseGem5Device, self).start()
+
+    def boot(self, hard=False, **kwargs):
+        """
+        Reboot the simulated system by restarting gem5 from the cached post-boot
+        checkpoint. This is only possible if reuse_checkpoint is set.
+        """
+        if self._post_boot:
+            self.logger.debug("The system has only just booted; not rebooting.")
+            return
+        if not self.has_cached_checkpoint():
+            self.logger.warn("Rebooting the gem5 device is only supported when "
+                             "restoring from a checkpoint (see reuse_checkpoint).")
+            return
+        self.stop_gem5()
+        self._is_ready = False  # pylint: disable=W0201
+        self.gem5_port = -1
+        self.restore_count += 1
+        self.start_gem5(restore=True)
+
     def wait_for_boot(self):
         pass
 
@@ -289,23 +404,25 @@ class BaseGem5Device(object):
 
     def get_properties(self, context):  # pylint: disable=R0801
         """ Get the property files from the device """
+        files = []
         for propfile in self.property_files:
             try:
                 normname = propfile.lstrip(self.path.sep).replace(self.path.sep, '.')
                 outfile = os.path.join(context.host_working_directory, normname)
                 if self.is_file(propfile):
                     self.execute('cat {} > {}'.format(propfile, normname))
-                    self.pull_file(normname, outfile)
+                    files.append((normname, outfile))
                 elif self.is_directory(propfile):
                     self.get_directory(context, propfile)
-                    continue
-                else:
-                    continue
             except DeviceError:
                 # We pull these files "opportunistically", so if a pull fails
                 # (e.g. we don't have permissions to read the file), just note
                 # it quietly (not as an error/warning) and move on.
                 self.logger.debug('Could not pull property file "{}"'.format(propfile))
+        try:
+            self.pull_files(files)
+        except DeviceError:
+            self.logger.debug('Could not pull property files')
         return {}
 
     def get_directory(self, context, directory):
@@ -370,8 +487,9 @@ class BaseGem5Device(object):
 
         The file to push to the device is copied to the temporary directory on
         the host, before being copied within the simulation to the destination.
-        Checks, in the form of 'ls' with error code checking, are performed to
-        ensure that the file is copied to the destination.
+        The copy is performed with a single command in the simulated system,
+        whose exit code is checked to ensure that the file has been copied to
+        the destination.
         """
         filename = os.path.basename(source)
         self.logger.debug("Pushing {} to device.".format(source))
@@ -383,14 +501,46 @@ class BaseGem5Device(object):
         self.move_to_temp_dir(source)
 
         # Back to the gem5 world
-        self.gem5_shell("ls -al /mnt/obb/{}".format(filename))
         if self.busybox:
-            self.gem5_shell("{} cp /mnt/obb/{} {}".format(self.busybox, filename, dest))
+            self.gem5_shell("{} cp /mnt/obb/{} {} && sync".format(self.busybox, filename, dest))
         else:
-            self.gem5_shell("cat /mnt/obb/{} > {}".format(filename, dest))
-        self.gem5_shell("sync")
-        self.gem5_shell("ls -al {}".format(dest))
-        self.gem5_shell("ls -al /mnt/obb/")
+            self.gem5_shell("cat /mnt/obb/{} > {} && sync".format(filename, dest))
+        self.logger.debug("Push complete.")
+
+    def push_files(self, files, **kwargs):
+        """
+        Push several files to the gem5 device. ``files`` is a list of
+        ``(source, dest)`` pairs, where ``dest`` is the full path of the file on
+        the device.
+
+        The files are archived on the host under their destination paths, and
+        the archive is extracted at the root of the simulated file system, so
+        the number of commands executed in the simulation does not depend on the
+        number of files. This requires busybox on the device; without it (or for
+        destinations that are not absolute paths), the files are pushed one at
+        a time.
+        """
+        if not self.busybox:
+            return super(BaseGem5Device, self).push_files(files, **kwargs)
+        batched = [(source, dest) for source, dest in files if self.path.isabs(dest)]
+        for source, dest in files:
+            if not self.path.isabs(dest):
+                self.push_file(source, dest)
+        if len(batched) < 2:
+            for source, dest in batched:
+                self.push_file(source, dest)
+            return
+
+        archive_name = 'wa_push.tar'
+        self.logger.debug("Pushing {} files as {}".format(len(batched), archive_name))
+        archive_path = os.path.join(self.temp_dir, archive_name)
+        with tarfile.open(archive_path, 'w') as tar:
+            for source, dest in batched:
+                tar.add(source, arcname=self.path.normpath(dest).lstrip(self.path.sep))
+        try:
+            self.gem5_shell("{} tar -xf /mnt/obb/{} -C / && sync".format(self.busybox, archive_name))
+        finally:
+            os.remove(archive_path)
         self.logger.debug("Push complete.")
 
     # pylint: disable=unused-argument
@@ -407,22 +557,120 @@ class BaseGem5Device(object):
 
         self.logger.debug("pull_file {} {}".format(source, filename))
         # We don't check the exit code here because it is non-zero if the source
-        # and destination are the same. The ls below will cause an error if the
-        # file was not where we expected it to be.
-        self.gem5_shell("{} cp {} {}".format(self.busybox, source, filename),
-                        check_exit_code=False)
-        self.gem5_shell("sync")
-        self.gem5_shell("ls -la {}".format(filename))
+        # and destination are the same. The size of the file is output so that
+        # we know when it has been fully written out on the host.
+        output = self.gem5_shell("{} cp {} {}; sync; {}".format(self._busybox_prefix(), source, filename,
+                                                               self._size_command(filename)),
+                                 check_exit_code=False)
         self.logger.debug('Finished the copy in the simulator')
+        self._write_out(filename, output, dest)
+        self.logger.debug("Pull complete.")
+
+    def pull_files(self, files, **kwargs):
+        """
+        Pull several files from the gem5 device. ``files`` is a list of
+        ``(source, dest)`` pairs, where ``dest`` is the path of the file on the
+        host.
+
+        The files are archived in the simulated system, keeping their paths, and
+        written out with a single m5 writefile; each file is then extracted from
+        the archive to its destination on the host. The archive is removed from
+        both the simulated system and the host afterwards. This requires busybox
+        on the device; without it, the files are pulled one at a time.
+        """
+        # tar strips the leading separator from member names, so these are the
+        # names the files will have in the archive.
+        names = [self.path.normpath(source).lstrip(self.path.sep) for source, _ in files]
+        if (not self.busybox or len(files) < 2 or len(set(names)) < len(names) or
+                any(name.startswith('..') for name in names)):
+            return super(BaseGem5Device, self).pull_files(files, **kwargs)
+
+        archive_name = 'wa_pull.tar'
+        self.logger.debug("Pulling {} files as {}".format(len(files), archive_name))
+        archive_path = os.path.join(self.temp_dir, archive_name)
+        destinations = dict(zip(names, [dest for _, dest in files]))
+        try:
+            output = self.gem5_shell("{} tar -cf {} {} && sync && {}".format(self.busybox, archive_name,
+                                                                           ' '.join(source for source, _ in files),
+                                                                           self._size_command(archive_name)))
+            self._write_out(archive_name, output, archive_path)
+        finally:
+            self.gem5_shell("rm -f {}".format(archive_name))
+        try:
+            with tarfile.open(archive_path) as tar:
+                for member in tar:
+                    dest = destinations.pop(member.name, None)
+                    if dest is None or not member.isfile():
+                        continue
+                    with open(dest, 'wb') as wfh:
+                        shutil.copyfileobj(tar.extractfile(member), wfh)
+        finally:
+            os.remove(archive_path)
+        if destinations:
+            raise DeviceError('Could not pull {}'.format(', '.join(sorted(destinations))))
+        self.logger.debug("Pull complete.")
+
+    def _busybox_prefix(self):
+        return '{} '.format(self.busybox) if self.busybox else ''
+
+    def _size_command(self, filename):
+        return '{}wc -c < {}'.format(self._busybox_prefix(), filename)
+
+    def _write_out(self, filename, size_output, dest):
+        """
+        Write out a file in the working directory of the simulated system to
+        ``dest`` on the host using m5 writefile. ``size_output`` is the output of
+        ``_size_command()`` for the file.
+        """
+        try:
+            size = int(size_output.split()[-1])
+        except (ValueError, IndexError):
+            # Either the file does not exist, in which case the ls will cause an
+            # error, or we have no way of telling its size.
+            self.gem5_shell("ls -la {}".format(filename))
+            size = None
         self.gem5_util("writefile {}".format(filename))
 
+        host_file = os.path.join(self.gem5outdir, filename)
         if 'cpu' not in filename:
-            while not os.path.exists(os.path.join(self.gem5outdir, filename)):
-                time.sleep(1)
+            self.wait_for_host_file(host_file, size)
 
         # Perform the local move
-        shutil.move(os.path.join(self.gem5outdir, filename), dest)
-        self.logger.debug("Pull complete.")
+        shutil.move(host_file, dest)
+
+    def wait_for_host_file(self, filepath, size=None, timeout=None):
+        """
+        Wait for a file written out by the simulation to appear on the host.
+
+        If the expected size of the file is known, wait until the file has
+        reached that size; otherwise, wait until its size stops changing. The
+        file is polled at short (but increasing) intervals, as simulated time
+        is very expensive.
+
+        A DeviceError is raised if gem5 exits, or if the file does not appear or
+        grow for ``timeout`` seconds (by default, ``delay``).
+        """
+        if timeout is None:
+            timeout = self.delay
+        interval = 0.01
+        last_size = None
+        last_change = time.time()
+        while True:
+            if os.path.exists(filepath):
+                current_size = os.path.getsize(filepath)
+                if size is not None and current_size >= size:
+                    return
+                if size is None and current_size == last_size:
+                    return
+                if current_size != last_size:
+                    last_size = current_size
+                    last_change = time.time()
+            if self.gem5 is not None and self.gem5.poll() is not None:
+                raise DeviceError('gem5 exited while writing out {}'.format(filepath))
+            if time.time() - last_change > timeout:
+                raise DeviceError('Timed out waiting for {} to be written out by gem5'.format(filepath))
+            time.sleep(interval)
+            interval = min(interval * 2, 0.5)
 
     # pylint: disable=unused-argument
     def delete_file(self, filepath, **kwargs):
@@ -442,17 +690,24 @@ class BaseGem5Device(object):
             pass
         return False
 
-    def disconnect(self):
-        """
-        Close and disconnect from the gem5 simulation. Additionally, we remove
-        the temporary directory used to pass files into the simulation.
-        """
+    def stop_gem5(self):
+        """ Gracefully terminate the gem5 simulation. """
         self.logger.info("Gracefully terminating the gem5 simulation.")
         try:
             self.gem5_util("exit")
             self.gem5.wait()
         except EOF:
             pass
+        self.sckt.close()
+        self.stdout_file.close()
+        self.stderr_file.close()
+
+    def disconnect(self):
+        """
+        Close and disconnect from the gem5 simulation. Additionally, we remove
+        the temporary directory used to pass files into the simulation.
+        """
+        self.stop_gem5()
         self.logger.info("Removing the temporary directory")
         try:
             shutil.rmtree(self.temp_dir)
@@ -641,6 +896,57 @@ class BaseGem5Device(object):
         if end_simulation:
             self.disconnect()
 
+    @property
+    def cached_checkpoint_dir(self):
+        """
+        The directory in which the post-boot checkpoint for the current
+        configuration is cached. This is keyed on the gem5 binary, gem5_args
+        (along with the size and modification time of any files, such as the
+        kernel and disk images, that they refer to) and run_delay.
+        """
+        key_files = {}
+        for arg in [self.gem5_binary] + str(self.gem5_args).split():
+            path = os.path.expanduser(arg.split('=', 1)[-1])
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                key_files[os.path.abspath(path)] = [stat.st_size, stat.st_mtime]
+        key = json.dumps([self.gem5_binary, str(self.gem5_args), self.run_delay, key_files],
+                         sort_keys=True)
+        return os.path.join(self.checkpoint_cache, hashlib.sha1(key).hexdigest())
+
+    def has_cached_checkpoint(self):
+        if not self.reuse_checkpoint:
+            return False
+        return os.path.isfile(os.path.join(self.cached_checkpoint_dir, 'info.json'))
+
+    def cache_checkpoint(self):
+        """
+        Take a checkpoint of the simulated system, and copy it into the checkpoint
+        cache so that it may be restored by subsequent simulations.
+        """
+        existing = set(f for f in os.listdir(self.gem5outdir) if f.startswith('cpt.'))
+        self.checkpoint_gem5()
+        new = [f for f in os.listdir(self.gem5outdir) if f.startswith('cpt.') and f not in existing]
+        if len(new) != 1:
+            self.logger.warn("Could not find the checkpoint in {}; it will not be cached.".format(self.gem5outdir))
+            return
+        cache_dir = self.cached_checkpoint_dir
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        # Copy to a temporary location first, so that an interrupted copy is
+        # never mistaken for a valid checkpoint.
+        temp_dir = cache_dir + '.tmp'
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        shutil.copytree(os.path.join(self.gem5outdir, new[0]), os.path.join(temp_dir, new[0]))
+        with open(os.path.join(temp_dir, 'info.json'), 'w') as wfh:
+            json.dump({'gem5_binary': self.gem5_binary,
+                       'gem5_args': str(self.gem5_args),
+                       'run_delay': self.run_delay,
+                       'created': time.time()}, wfh, indent=4)
+        os.rename(temp_dir, cache_dir)
+        self.logger.info("Cached the post-boot checkpoint in {}".format(cache_dir))
+
     def mount_virtio(self):
         """
         Mount the VirtIO device in the simulated system.
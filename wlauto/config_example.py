@@ -57,6 +57,11 @@ max_retries = 3
 # If WA should delete its files from the device after the run is completed
 clean_up = False
 
+# A phase of execution to profile with cProfile (e.g. 'workload_setup', or 'run'
+# for the entire run). The stats are written to run_profile.pstats in the output
+# directory. Timings for every run are always written to run_profile.json.
+#profile_phase = 'workload_setup'
+
 ####################################################################################################
 ######################################### Device Settings ##########################################
 ####################################################################################################
@@ -19,6 +19,7 @@ import json
 from copy import copy
 from collections import OrderedDict
 
+from wlauto.core.profiling import PROFILE_PHASES
 from wlauto.exceptions import ConfigError
 from wlauto.utils.misc import merge_dicts, merge_lists, load_struct_from_file
 from wlauto.utils.types import regex_type, identifier
@@ -482,6 +483,7 @@ class RunConfiguration(object):
         RunConfigurationItem('retry_on_status', 'list', 'replace'),
         RunConfigurationItem('max_retries', 'scalar', 'replace'),
         RunConfigurationItem('clean_up', 'scalar', 'replace'),
+        RunConfigurationItem('profile_phase', 'scalar', 'replace'),
     ]
 
     # Configuration specified for each workload spec. "workload_parameters"
@@ -538,6 +540,7 @@ class RunConfiguration(object):
         self.other_config = {}  # keeps track of used config for extensions other than of the four main kinds.
         self.retry_on_status = status_list(['FAILED', 'PARTIAL'])
         self.max_retries = 3
+        self.profile_phase = None
         self._used_config_items = []
         self._global_instrumentation = []
         self._reboot_policy = None
@@ -617,6 +620,9 @@ class RunConfiguration(object):
         if not self.device:
             raise ConfigError('Device not specified in the config.')
         self._finalize_device_config()
+        if self.profile_phase and self.profile_phase not in PROFILE_PHASES:
+            message = 'Unexpected profile_phase "{}"; must be one of: {}'
+            raise ConfigError(message.format(self.profile_phase, ', '.join(PROFILE_PHASES)))
         if not self.reboot_policy.reboot_on_each_spec:
             for spec in self.workload_specs:
                 if spec.boot_parameters:
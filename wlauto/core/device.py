@@ -335,6 +335,28 @@ class Device(Extension):
         """ Pull a file from device system onto the host file system. """
         raise NotImplementedError()
 
+    def push_files(self, files, **kwargs):
+        """
+        Push several files from the host file system onto the device. ``files``
+        is a list of ``(source, dest)`` pairs; any keyword arguments are passed
+        on to ``push_file()``. Devices for which each transfer is expensive may
+        override this to transfer the files together.
+
+        """
+        for source, dest in files:
+            self.push_file(source, dest, **kwargs)
+
+    def pull_files(self, files, **kwargs):
+        """
+        Pull several files from the device onto the host file system. ``files``
+        is a list of ``(source, dest)`` pairs; any keyword arguments are passed
+        on to ``pull_file()``. Devices for which each transfer is expensive may
+        override this to transfer the files together.
+
+        """
+        for source, dest in files:
+            self.pull_file(source, dest, **kwargs)
+
     def delete_file(self, filepath):
         """ Delete the specified file on the device. """
         raise NotImplementedError()
@@ -48,7 +48,7 @@ from collections import Counter, defaultdict, OrderedDict
 from itertools import izip_longest
 
 import wlauto.core.signal as signal
-from wlauto.core import instrumentation
+from wlauto.core import instrumentation, profiling
 from wlauto.core.bootstrap import settings
 from wlauto.core.extension import Artifact
 from wlauto.core.configuration import RunConfiguration
@@ -57,6 +57,7 @@ from wlauto.core.resolver import ResourceResolver
 from wlauto.core.result import ResultManager, IterationResult, RunResult
 from wlauto.exceptions import (WAError, ConfigError, TimeoutError, InstrumentError,
                                DeviceError, DeviceNotRespondingError)
+from wlauto.utils.log import flush_logs
 from wlauto.utils.misc import ensure_directory_exists as _d, get_traceback, merge_dicts, format_duration
 
 
@@ -306,6 +307,8 @@ class Executor(object):
             raise ConfigError('Make sure a device is specified in the config.')
         self.device = self.ext_loader.get_device(self.config.device, **self.config.device_config)
         self.device.validate()
+        profiling.reset(self.config.profile_phase)
+        profiling.wrap_device(self.device)
 
         self.context = ExecutionContext(self.device, self.config)
 
@@ -343,7 +346,12 @@ class Executor(object):
         self.logger.info('Running workloads')
         runner = self._get_runner(result_manager)
         runner.init_queue(self.config.workload_specs)
-        runner.run()
+        try:
+            with profiling.phase('run'):
+                runner.run()
+        finally:
+            profile_file = profiling.write(self.context.run_output_directory)
+            self.logger.debug('Run profile written to {}'.format(profile_file))
 
         if getattr(self.config, "clean_up", False):
             self.logger.info('Clearing WA files from device')
@@ -577,6 +585,8 @@ class Runner(object):
     def _init_job(self):
         self.current_job.result.status = IterationResult.RUNNING
         self.context.next_job(self.current_job)
+        profiling.start_job(self.current_job.spec.id, self.current_job.spec.label,
+                            self.context.current_iteration, self.current_job.retry)
 
     def _run_job(self):   # pylint: disable=too-many-branches
         spec = self.current_job.spec
@@ -636,7 +646,9 @@ class Runner(object):
             self.device.stop()
 
     def _finalize_job(self):
+        profiling.end_job(self.current_job.result.status)
         self.context.run_result.iteration_results.append(self.current_job.result)
+        self.result_manager.record_result(self.current_job.result)
         job = self.job_queue.pop(0)
         job.iteration = self.context.current_iteration
         if job.result.status in self.config.retry_on_status:
@@ -675,7 +687,8 @@ class Runner(object):
         self.logger.info('\tSetting up')
         with self._signal_wrap('WORKLOAD_SETUP'):
             try:
-                workload.setup(self.context)
+                with profiling.timed('workload', '{}.setup'.format(workload.name)):
+                    workload.setup(self.context)
             except:
                 self.logger.info('\tSkipping the rest of the iterations for this spec.')
                 self.current_job.spec.enabled = False
@@ -685,7 +698,8 @@ class Runner(object):
             self.logger.info('\tExecuting')
             with self._handle_errors('Running workload'):
                 with self._signal_wrap('WORKLOAD_EXECUTION'):
-                    workload.run(self.context)
+                    with profiling.timed('workload', '{}.run'.format(workload.name)):
+                        workload.run(self.context)
 
             self.logger.info('\tProcessing result')
             self._send(signal.BEFORE_WORKLOAD_RESULT_UPDATE)
@@ -693,7 +707,8 @@ class Runner(object):
                 if self.current_job.result.status != IterationResult.FAILED:
                     with self._handle_errors('Processing workload result',
                                              on_error_status=IterationResult.PARTIAL):
-                        workload.update_result(self.context)
+                        with profiling.timed('workload', '{}.update_result'.format(workload.name)):
+                            workload.update_result(self.context)
                         self._send(signal.SUCCESSFUL_WORKLOAD_RESULT_UPDATE)
 
                 if self.current_job.result.status == IterationResult.RUNNING:
@@ -706,7 +721,8 @@ class Runner(object):
             with self._handle_errors('Tearing down workload',
                                      on_error_status=IterationResult.NONCRITICAL):
                 with self._signal_wrap('WORKLOAD_TEARDOWN'):
-                    workload.teardown(self.context)
+                    with profiling.timed('workload', '{}.teardown'.format(workload.name)):
+                        workload.teardown(self.context)
             self.result_manager.add_result(self.current_job.result, self.context)
 
     def _flash_device(self, flashing_params):
@@ -727,7 +743,8 @@ class Runner(object):
             self.device.connect()
 
     def _send(self, s):
-        signal.send(s, self, self.context)
+        with profiling.timed('signal', s.name):
+            signal.send(s, self, self.context)
 
     def _take_screenshot(self, filename):
         if self.context.output_directory:
@@ -784,15 +801,19 @@ class Runner(object):
     def _signal_wrap(self, signal_name):
         """Wraps the suite in before/after signals, ensuring
         that after signal is always sent."""
+        # Make sure that output logged so far has been written out, so that it
+        # does not compete with the stage for I/O.
+        flush_logs()
         before_signal = getattr(signal, 'BEFORE_' + signal_name)
         success_signal = getattr(signal, 'SUCCESSFUL_' + signal_name)
         after_signal = getattr(signal, 'AFTER_' + signal_name)
-        try:
-            self._send(before_signal)
-            yield
-            self._send(success_signal)
-        finally:
-            self._send(after_signal)
+        with profiling.phase(signal_name.lower()):
+            try:
+                self._send(before_signal)
+                yield
+                self._send(success_signal)
+            finally:
+                self._send(after_signal)
 
 
 class BySpecRunner(Runner):
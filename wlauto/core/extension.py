@@ -489,7 +489,11 @@ class ExtensionMeta(type):
                                 dm(self, *args, **kwargs)
                     return wrapper
 
-                setattr(cls, vmname, generate_method_wrapper(vmname))
+                wrapper = generate_method_wrapper(vmname)
+                # The class's own implementation (if it has one), so that it may
+                # be invoked without propagation to the bases.
+                wrapper.implementation = cls.__dict__.get(vmname)
+                setattr(cls, vmname, wrapper)
 
 
 class Extension(object):
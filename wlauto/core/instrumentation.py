@@ -98,11 +98,13 @@ and the code to clear these file goes in teardown method. ::
 
 """
 
+import time
 import logging
 import inspect
 from collections import OrderedDict
 
 import wlauto.core.signal as signal
+from wlauto.core import profiling
 from wlauto.core.extension import Extension
 from wlauto.exceptions import WAError, DeviceNotRespondingError, TimeoutError
 from wlauto.utils.misc import get_traceback, isiterable
@@ -233,9 +235,11 @@ class ManagedCallback(object):
     def __init__(self, instrument, callback):
         self.instrument = instrument
         self.callback = callback
+        self.name = '{}.{}'.format(instrument.name, getattr(callback, '__name__', callback))
 
     def __call__(self, context):
         if self.instrument.is_enabled:
+            start = time.time()
             try:
                 self.callback(context)
             except (KeyboardInterrupt, DeviceNotRespondingError, TimeoutError):  # pylint: disable=W0703
@@ -257,6 +261,8 @@ class ManagedCallback(object):
                     # it doesn't get re-enabled for subsequent iterations.
                     self.instrument.is_broken = True
                 disable(self.instrument)
+            finally:
+                profiling.record('instrument', self.name, time.time() - start)
 
 
 # Need this to keep track of callbacks, because the dispatcher only keeps
@@ -0,0 +1,293 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+Keeps track of where the wall time of a run goes.
+
+The framework times the parts of a run that are not the workload itself --
+instrument callbacks, result processors, signal dispatch, reboots, resource
+resolution and device commands -- as well as the workload's own setup, run,
+update_result and teardown. Timings are accumulated per category (e.g.
+``"instrument"``) and name (e.g. ``"trace-cmd.start"``), both for the run as a
+whole and for each job, and are written out at the end of the run as
+``run_profile.json`` and ``run_profile.csv`` in the output directory.
+
+Timings are inclusive, so e.g. the time for a signal includes the time spent in
+the instrument callbacks it invoked, which in turn includes the time taken by any
+device commands they executed.
+
+Additionally, one of the phases of execution may be profiled in detail using
+``cProfile`` by setting ``profile_phase`` in the run configuration (see
+``PROFILE_PHASES``). The statistics for all occurrences of that phase are written
+to ``run_profile.pstats``.
+
+"""
+import os
+import csv
+import json
+import time
+import logging
+import cProfile
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+logger = logging.getLogger('profiling')
+
+# Phases that may be profiled using cProfile. Apart from "run", which covers
+# the entire run execution, these are the stages of execution wrapped in
+# before/successful/after signals by the runner.
+PROFILE_PHASES = [
+    'run',
+    'initial_boot',
+    'boot',
+    'flashing',
+    'workload_setup',
+    'workload_execution',
+    'workload_teardown',
+    'overall_results_processing',
+]
+
+# Device methods that are timed by wrap_device(). Calls to execute() are
+# timed per command (i.e. the name of the executable that was invoked).
+DEVICE_METHODS = ['execute', 'push_file', 'pull_file', 'install', 'uninstall']
+
+
+class TimingStats(object):
+
+    __slots__ = ['count', 'total', 'max']
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean, 'max': self.max}
+
+
+class Timings(object):
+    """Timing stats for a set of (category, name) pairs."""
+
+    def __init__(self):
+        self.categories = defaultdict(lambda: defaultdict(TimingStats))
+
+    def add(self, category, name, duration):
+        self.categories[category][name].add(duration)
+
+    def iter_stats(self):
+        for category, stats in sorted(self.categories.iteritems()):
+            for name, entry in sorted(stats.iteritems(), key=lambda x: x[1].total, reverse=True):
+                yield category, name, entry
+
+    def to_dict(self):
+        return {category: {name: entry.to_dict() for name, entry in stats.iteritems()}
+                for category, stats in self.categories.iteritems()}
+
+
+class JobProfile(object):
+
+    def __init__(self, spec_id, label, iteration, retry):
+        self.spec_id = spec_id
+        self.label = label
+        self.iteration = iteration
+        self.retry = retry
+        self.status = None
+        self.start_time = time.time()
+        self.duration = None
+        self.timings = Timings()
+
+    def to_dict(self):
+        return {
+            'id': self.spec_id,
+            'label': self.label,
+            'iteration': self.iteration,
+            'retry': self.retry,
+            'status': self.status,
+            'duration': self.duration,
+            'timings': self.timings.to_dict(),
+        }
+
+
+class RunProfile(object):
+
+    def __init__(self, profile_phase=None):
+        self.start_time = time.time()
+        self.timings = Timings()
+        self.jobs = []
+        self.current_job = None
+        self.profile_phase = profile_phase
+        self.profiler = cProfile.Profile() if profile_phase else None
+
+    def record(self, category, name, duration):
+        self.timings.add(category, name, duration)
+        if self.current_job is not None:
+            self.current_job.timings.add(category, name, duration)
+
+    def to_dict(self):
+        return {
+            'duration': time.time() - self.start_time,
+            'profile_phase': self.profile_phase,
+            'timings': self.timings.to_dict(),
+            'jobs': [job.to_dict() for job in self.jobs],
+        }
+
+
+_profile = RunProfile()
+
+
+def reset(profile_phase=None):
+    """Start a new profile, discarding any timings recorded so far."""
+    global _profile  # pylint: disable=global-statement
+    if profile_phase is not None and profile_phase not in PROFILE_PHASES:
+        message = 'Unexpected profile_phase "{}"; must be one of: {}'
+        raise ValueError(message.format(profile_phase, ', '.join(PROFILE_PHASES)))
+    _profile = RunProfile(profile_phase)
+
+
+def get_profile():
+    return _profile
+
+
+def record(category, name, duration):
+    """Record that ``duration`` seconds were spent in the specified category and name."""
+    _profile.record(category, name, duration)
+
+
+@contextmanager
+def timed(category, name):
+    """Time the wrapped block, recording it under the specified category and name."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        _profile.record(category, name, time.time() - start)
+
+
+@contextmanager
+def phase(name):
+    """
+    Time the wrapped phase of execution (under the ``"phase"`` category), profiling it
+    with cProfile if it is the ``profile_phase`` of the current profile.
+
+    """
+    profiler = _profile.profiler if _profile.profile_phase == name else None
+    start = time.time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        _profile.record('phase', name, time.time() - start)
+
+
+def start_job(spec_id, label, iteration, retry=0):
+    _profile.current_job = JobProfile(spec_id, label, iteration, retry)
+
+
+def end_job(status=None):
+    job = _profile.current_job
+    if job is None:
+        return
+    job.status = status
+    job.duration = time.time() - job.start_time
+    _profile.current_job = None
+    _profile.jobs.append(job)
+    _profile.record('job', '{}_{}_{}'.format(job.label, job.spec_id, job.iteration), job.duration)
+
+
+def wrap_device(device):
+    """
+    Replaces the device's ``DEVICE_METHODS`` with versions that record how long
+    each call takes (under the ``"device"`` category).
+
+    """
+    for method_name in DEVICE_METHODS:
+        method = getattr(device, method_name, None)
+        if method is None or hasattr(method, '_profiled'):
+            continue
+        if method_name == 'execute':
+            wrapper = _wrap_execute(method)
+        else:
+            wrapper = _wrap_device_method(method_name, method)
+        wrapper._profiled = True  # pylint: disable=protected-access
+        setattr(device, method_name, wrapper)
+
+
+def _wrap_execute(method):
+    def execute(command, *args, **kwargs):
+        start = time.time()
+        try:
+            return method(command, *args, **kwargs)
+        finally:
+            _profile.record('device', 'execute: ' + _get_command_name(command), time.time() - start)
+    return execute
+
+
+def _wrap_device_method(name, method):
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _profile.record('device', name, time.time() - start)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _get_command_name(command):
+    parts = command.split(None, 1) if isinstance(command, basestring) else None
+    if not parts:
+        return str(command)
+    return os.path.basename(parts[0])
+
+
+def write(output_directory):
+    """
+    Write the current profile to ``run_profile.json``, a summary of its timings
+    to ``run_profile.csv`` and, if a phase was profiled, its ``cProfile`` stats to
+    ``run_profile.pstats`` in the specified directory. Returns the path to the
+    JSON file.
+
+    """
+    profile = _profile
+    json_path = os.path.join(output_directory, 'run_profile.json')
+    with open(json_path, 'w') as wfh:
+        json.dump(profile.to_dict(), wfh, indent=4)
+
+    with open(os.path.join(output_directory, 'run_profile.csv'), 'wb') as wfh:
+        writer = csv.writer(wfh)
+        writer.writerow(['category', 'name', 'count', 'total', 'mean', 'max'])
+        for category, name, entry in profile.timings.iter_stats():
+            writer.writerow([category, name, entry.count, entry.total, entry.mean, entry.max])
+
+    if profile.profiler:
+        pstats_path = os.path.join(output_directory, 'run_profile.pstats')
+        profile.profiler.dump_stats(pstats_path)
+        logger.debug('Profile of phase "{}" written to {}'.format(profile.profile_phase, pstats_path))
+    return json_path
@@ -19,6 +19,7 @@ Defines infrastructure for resource resolution. This is used to find
 various dependencies/assets/etc that WA objects rely on in a flexible way.
 
 """
+import time
 import logging
 from collections import defaultdict
 
@@ -26,7 +27,9 @@ from collections import defaultdict
 #       prioritylist does not exist in vanilla louie.
 from louie.prioritylist import PriorityList  # pylint: disable=E0611,F0401
 
+from wlauto.core import profiling
 from wlauto.exceptions import ResourceError
+from wlauto.utils.assets import save_asset_indexes
 
 
 class ResourceResolver(object):
@@ -60,10 +63,19 @@ class ResourceResolver(object):
         ``None``.
 
         """
+        with profiling.timed('resource', resource.name):
+            try:
+                return self._get(resource, strict, *args, **kwargs)
+            finally:
+                save_asset_indexes()  # save whatever the getters added to the indexes in one go
+
+    def _get(self, resource, strict, *args, **kwargs):
         self.logger.debug('Resolving {}'.format(resource))
         for getter in self.getters[resource.name]:
             self.logger.debug('Trying {}'.format(getter))
+            start = time.time()
             result = getter.get(resource, *args, **kwargs)
+            profiling.record('resource_getter', getter.name, time.time() - start)
             if result is not None:
                 self.logger.debug('Resource {} found using {}:'.format(resource, getter))
                 self.logger.debug('\t{}'.format(result))
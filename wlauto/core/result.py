@@ -32,21 +32,31 @@ Which result processors will be active is defined by the ``result_processors``
 list in the ``~/.workload_automation/config.py``. Only the result_processors
 who's names appear in this list will be used.
 
-A :class:`ResultsManager`  keeps track of active results processors.
+A :class:`ResultsManager`  keeps track of active results processors. It also
+appends the final result of each iteration, once it has been processed (or
+skipped), to ``results.jsonl`` in the run's output directory (see :class:`ResultStream`), so
+that the results collected so far are available even if the run does not
+complete.
 
 """
+import os
+import json
 import logging
 import traceback
 from copy import copy
 from contextlib import contextmanager
 from datetime import datetime
 
+from wlauto.core import profiling
 from wlauto.core.extension import Extension
 from wlauto.exceptions import WAError
 from wlauto.utils.types import numeric
 from wlauto.utils.misc import enum_metaclass, merge_dicts
 
 
+RESULT_STREAM_FILE = 'results.jsonl'
+
+
 class ResultManager(object):
     """
     Keeps track of result processors and passes on the results onto the individual processors.
@@ -56,6 +66,7 @@ class ResultManager(object):
     def __init__(self):
         self.logger = logging.getLogger('ResultsManager')
         self.processors = []
+        self.stream = None
         self._bad = []
 
     def install(self, processor):
@@ -74,37 +85,52 @@ class ResultManager(object):
         # Errors aren't handled at this stage, because this gets executed
         # before workload execution starts and we just want to propagte them
         # and terminate (so that error can be corrected and WA restarted).
+        self.stream = ResultStream(os.path.join(context.run_output_directory, RESULT_STREAM_FILE))
         for processor in self.processors:
-            processor.initialize(context)
+            with profiling.timed('result_processor', '{}.initialize'.format(processor.name)):
+                processor.initialize(context)
 
     def add_result(self, result, context):
         with self._manage_processors(context):
-            for processor in self.processors:
-                with self._handle_errors(processor):
-                    processor.process_iteration_result(result, context)
-            for processor in self.processors:
-                with self._handle_errors(processor):
-                    processor.export_iteration_result(result, context)
+            self._call_processors('process_iteration_result', result, context)
+            self._call_processors('export_iteration_result', result, context)
+
+    def record_result(self, result):
+        """
+        Appends the final result of an iteration to the results stream. This is
+        done for every iteration, including those that were skipped or that
+        failed before their result could be processed.
+
+        """
+        if self.stream is not None:
+            try:
+                self.stream.append(result)
+            except (IOError, OSError, TypeError, ValueError) as e:
+                self.logger.error('Could not write result to {}: {}'.format(self.stream.path, e))
 
     def process_run_result(self, result, context):
+        if self.stream is not None:
+            context.add_artifact('run_result_stream', RESULT_STREAM_FILE, 'export')
         with self._manage_processors(context):
-            for processor in self.processors:
-                with self._handle_errors(processor):
-                    processor.process_run_result(result, context)
-            for processor in self.processors:
-                with self._handle_errors(processor):
-                    processor.export_run_result(result, context)
+            self._call_processors('process_run_result', result, context)
+            self._call_processors('export_run_result', result, context)
 
     def finalize(self, context):
         with self._manage_processors(context):
-            for processor in self.processors:
-                with self._handle_errors(processor):
-                    processor.finalize(context)
+            self._call_processors('finalize', context)
+        if self.stream is not None:
+            self.stream.close()
 
     def validate(self):
         for processor in self.processors:
             processor.validate()
 
+    def _call_processors(self, method_name, *args):
+        for processor in self.processors:
+            with self._handle_errors(processor):
+                with profiling.timed('result_processor', '{}.{}'.format(processor.name, method_name)):
+                    getattr(processor, method_name)(*args)
+
     @contextmanager
     def _manage_processors(self, context, finalize_bad=True):
         yield
@@ -131,6 +157,63 @@ class ResultManager(object):
             self._bad.append(processor)
 
 
+class ResultStream(object):
+    """
+    Appends iteration results to a JSON Lines file (i.e. one JSON object, as
+    returned by ``iteration_result_to_record()``, per line). The file is synced to
+    disk after each result, so that, if the run crashes or is killed, the file
+    contains every result processed up to that point.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, 'a')
+
+    def append(self, result):
+        line = json.dumps(iteration_result_to_record(result), default=str)
+        self._fh.write(line + '\n')
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+
+def iteration_result_to_record(result):
+    """Returns a JSON-serializable ``dict`` with the contents of an ``IterationResult``."""
+    return {
+        'id': result.id,
+        'workload': result.workload.name,
+        'label': result.spec.label,
+        'iteration': result.iteration,
+        'status': result.status,
+        'summary_metrics': list(result.workload.summary_metrics or []),
+        'events': [e.to_dict() for e in result.events],
+        'metrics': [dict([(k, v) for k, v in m.__dict__.iteritems() if not k.startswith('_')])
+                    for m in result.metrics],
+    }
+
+
+def read_result_stream(path):
+    """
+    Yields the records (see ``iteration_result_to_record()``) in a results stream
+    file. A partially written final line (e.g. if WA was killed while writing it)
+    is ignored.
+
+    """
+    logger = logging.getLogger('ResultStream')
+    with open(path) as fh:
+        for i, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning('Ignoring incomplete result on line {} of {}'.format(i, path))
+
+
 class ResultProcessor(Extension):
     """
     Base class for result processors. Defines an interface that should be implemented
@@ -18,8 +18,19 @@
 This module wraps louie signalling mechanism. It relies on modified version of loiue
 that has prioritization added to handler invocation.
 
+Connections are managed by louie, however signals are not sent through
+``louie.dispatcher.send``, as that rebuilds the list of receivers and inspects each
+receiver's signature every time a signal is sent. Instead, the first time a signal is
+sent by a particular sender, the receivers, in priority order, and the arguments each
+of them accepts are worked out once and stored in a dispatch table. Dispatch tables are
+discarded whenever a handler is connected or disconnected, and when their sender is
+garbage-collected.
+
 """
-from louie import dispatcher  # pylint: disable=F0401
+import weakref
+from functools import partial
+
+from louie import dispatcher, robustapply  # pylint: disable=F0401
 
 
 class Signal(object):
@@ -152,6 +163,7 @@ def connect(handler, signal, sender=dispatcher.Any, priority=0):
         dispatcher.connect(handler, signal, sender, priority=-priority)  # pylint: disable=E1123
     else:
         dispatcher.connect(handler, signal, sender, priority=priority)  # pylint: disable=E1123
+    _dispatch_tables.clear()
 
 
 def disconnect(handler, signal, sender=dispatcher.Any):
@@ -169,6 +181,7 @@ def disconnect(handler, signal, sender=dispatcher.Any):
 
     """
     dispatcher.disconnect(handler, signal, sender)
+    _dispatch_tables.clear()
 
 
 def send(signal, sender, *args, **kwargs):
@@ -185,4 +198,82 @@ def send(signal, sender, *args, **kwargs):
         The rest of the parameters will be passed on as aruments to the handler.
 
     """
-    dispatcher.send(signal, sender, *args, **kwargs)
+    if dispatcher.plugins:  # plugins may wrap or filter receivers on each send
+        dispatcher.send(signal, sender, *args, **kwargs)
+        return
+    key = (signal, id(sender), len(args), tuple(sorted(kwargs)))
+    table = _dispatch_tables.get(key)
+    if table is None or table.sender_ref() is not sender:
+        try:
+            # The table is dropped as soon as the sender is garbage-collected,
+            # before its id can be reused.
+            sender_ref = weakref.ref(sender, partial(_discard_dispatch_table, key))
+        except TypeError:  # the table could outlive the sender, so don't cache it
+            dispatcher.send(signal, sender, *args, **kwargs)
+            return
+        table = DispatchTable(signal, sender_ref, len(args), kwargs)
+        _dispatch_tables[key] = table
+    kwargs['signal'] = signal
+    kwargs['sender'] = sender
+    table.dispatch(args, kwargs)
+
+
+class DispatchTable(object):
+    """
+    The receivers for a signal sent by a particular sender with a particular set
+    of arguments, in the order they should be invoked, along with names of the
+    keyword arguments each of them accepts.
+
+    """
+
+    def __init__(self, signal, sender_ref, num_args, kwargs):
+        self.sender_ref = sender_ref
+        self.entries = []
+        kwargs = dict(kwargs, signal=signal, sender=sender_ref())
+        for receiver in dispatcher.get_all_receivers(sender_ref(), signal):
+            live_receiver = _dereference(receiver)
+            if live_receiver is None:
+                continue
+            self.entries.append((receiver, _get_accepted_kwargs(live_receiver, num_args, kwargs)))
+
+    def dispatch(self, args, kwargs):
+        for receiver, accepted in self.entries:
+            receiver = _dereference(receiver)
+            if receiver is None:  # has been garbage-collected since the table was built
+                continue
+            if accepted is None:
+                robustapply.robust_apply(receiver, receiver, *args, **kwargs)
+            else:
+                receiver(*args, **dict((name, kwargs[name]) for name in accepted))
+
+
+def _discard_dispatch_table(key, sender_ref):
+    table = _dispatch_tables.get(key)
+    if table is not None and table.sender_ref is sender_ref:
+        _dispatch_tables.pop(key, None)
+
+
+def _dereference(receiver):
+    if isinstance(receiver, dispatcher.WEAKREF_TYPES):
+        return receiver()
+    return receiver
+
+
+def _get_accepted_kwargs(receiver, num_args, kwargs):
+    """
+    Returns the names of keyword arguments that would be passed to the receiver by
+    ``louie.robustapply``, or ``None`` if ``robust_apply`` needs to be used (i.e.
+    it would raise an error).
+
+    """
+    _, code, start_index = robustapply.function(receiver)
+    for name in code.co_varnames[start_index:start_index + num_args]:
+        if name in kwargs:
+            return None  # specified both positionally and as a keyword
+    if code.co_flags & 8:  # accepts **kwargs
+        return tuple(kwargs)
+    acceptable = code.co_varnames[start_index + num_args:code.co_argcount]
+    return tuple(name for name in kwargs if name in acceptable)
+
+
+_dispatch_tables = {}
@@ -45,6 +45,9 @@ class Gem5AndroidDevice(BaseGem5Device, AndroidDevice):
     possible to resume from a checkpoint when starting the simulation. To do
     this, please append the relevant checkpoint commands from the gem5
     simulation script to the gem5_discription argument in the agenda.
+    Alternatively, set reuse_checkpoint to have WA take a post-boot checkpoint
+    the first time the system is booted, and restore from it in later runs and
+    whenever the device is rebooted.
 
     Host system requirements:
         * VirtIO support. We rely on diod on the host system. This can be
@@ -208,5 +211,6 @@ class Gem5AndroidDevice(BaseGem5Device, AndroidDevice):
         AndroidDevice.capture_screen(self, filepath)
 
     def initialize(self, context):
+        super(Gem5AndroidDevice, self).initialize(context)
         self.resize_shell()
         self.deploy_m5(context, force=False)
@@ -0,0 +1,449 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# pylint: disable=W0201
+import os
+import re
+import glob
+import gzip
+import time
+import shlex
+import shutil
+import tarfile
+import tempfile
+
+from wlauto import Parameter
+from wlauto.common.linux.device import BaseLinuxDevice
+from wlauto.exceptions import DeviceError
+from wlauto.utils.types import list_of_integers, list_of_strings
+
+
+CPU_ROOT = '/sys/devices/system/cpu'
+
+GOVERNOR_TUNABLES = {
+    'ondemand': {'sampling_rate': 20000, 'up_threshold': 95},
+    'interactive': {'hispeed_freq': None, 'go_hispeed_load': 99, 'above_hispeed_delay': 20000,
+                    'timer_rate': 20000, 'min_sample_time': 80000},
+}
+
+FILE_TEST_REGEX = re.compile(r"^if \[ -([efd]) '?(.*?)'? \]; then echo 1; else echo 0; fi$")
+ECHO_REGEX = re.compile(r"^echo (.*?) > '?(.*?)'?$")
+
+
+class FakeDevice(BaseLinuxDevice):
+
+    name = 'fake'
+    platform = 'linux'
+    description = """
+    A device that exists entirely on the host, for measuring the overhead of WA
+    itself (e.g. signal dispatch, instrument callbacks, result processing) without
+    real hardware.
+
+    The device's file system is a directory on the host (a temporary directory,
+    unless ``root_directory`` is specified), populated on connection with a
+    simulated sysfs, including a cpufreq tree for each core. Writes to the
+    cpufreq files behave as they would on a real device: invalid governors and
+    frequencies are rejected, and changing the governor or the frequency limits
+    updates the current frequency.
+
+    Commands passed to ``execute()`` are not run; the file operations WA uses
+    (``cat``, ``echo``, ``ls``, ``mkdir``, ``rm``, ``cp``, ``tar``, ``gzip``
+    and file tests) are emulated on the host file system, and any other command
+    succeeds with no output. Each command, and each file transfer, takes
+    ``command_latency`` seconds, to simulate the round trip to a real device.
+
+    """
+
+    has_gpu = False
+
+    parameters = [
+        Parameter('core_names', default=['a53', 'a53', 'a53', 'a53', 'a72', 'a72'], override=True),
+        Parameter('core_clusters', default=[0, 0, 0, 0, 1, 1], override=True),
+        Parameter('root_directory',
+                  description="""
+                  The host directory used as the device's file system. If not specified,
+                  a temporary directory is created when the device is connected, and is
+                  removed when it is disconnected.
+                  """),
+        Parameter('command_latency', kind=float, default=0.0,
+                  description="""
+                  The time, in seconds, each command and file transfer takes, in addition to
+                  the time taken to emulate it.
+                  """),
+        Parameter('frequencies', kind=list_of_integers,
+                  default=[200000, 400000, 600000, 800000, 1000000, 1200000],
+                  description='The frequencies (in KHz) available on every core.'),
+        Parameter('governors', kind=list_of_strings,
+                  default=['performance', 'powersave', 'userspace', 'ondemand', 'interactive'],
+                  description='The cpufreq governors available on every core; the first is the default.'),
+        Parameter('architecture', default='aarch64',
+                  description='The machine architecture reported by ``uname -m``.'),
+    ]
+
+    @property
+    def is_rooted(self):
+        return True
+
+    def __init__(self, **kwargs):
+        super(FakeDevice, self).__init__(**kwargs)
+        self.command_count = 0
+        self.simulated_latency = 0.0
+        self._created_root = False
+
+    def validate(self):
+        super(FakeDevice, self).validate()
+        if self.working_directory is None:  # pylint: disable=access-member-before-definition
+            self.working_directory = '/root/wa'
+        if not self.governors:
+            raise DeviceError('At least one governor must be specified.')
+
+    # Power control and connection
+
+    def reset(self):
+        self._is_ready = False
+
+    def boot(self, hard=False, **kwargs):
+        pass
+
+    def connect(self):
+        if not self.root_directory:
+            self.root_directory = tempfile.mkdtemp(prefix='wa-fake-device-')
+            self._created_root = True
+        if not os.path.isdir(self.get_host_path(CPU_ROOT)):
+            self._populate_file_system()
+        self._is_ready = True
+
+    def disconnect(self):
+        self._is_ready = False
+        if self._created_root:
+            shutil.rmtree(self.root_directory, ignore_errors=True)
+            self.root_directory = None
+            self._created_root = False
+
+    def ping(self):
+        if not self._is_ready:
+            raise DeviceError('Fake device is not connected.')
+
+    # Execution
+
+    def execute(self, command, timeout=None, check_exit_code=True, background=False,
+                as_root=False, **kwargs):
+        self._check_ready()
+        self._simulate_latency()
+        output = []
+        for part in command.split(' && '):
+            result = self._emulate(part.strip(), check_exit_code)
+            if result:
+                output.append(result)
+        return '\n'.join(output)
+
+    def kick_off(self, command, as_root=None):
+        return self.execute(command, check_exit_code=False)
+
+    def get_pids_of(self, process_name):
+        return []
+
+    def ps(self, **kwargs):
+        return []
+
+    # File management
+
+    def get_host_path(self, path):
+        """Returns the path on the host of the specified path on the device."""
+        return os.path.join(self.root_directory, self.path.normpath(path).lstrip('/'))
+
+    def push_file(self, source, dest, as_root=False, timeout=None):  # pylint: disable=W0221
+        self._check_ready()
+        self._simulate_latency()
+        self._copy(source, self.get_host_path(dest))
+
+    def pull_file(self, source, dest, as_root=False, timeout=None):  # pylint: disable=W0221
+        self._check_ready()
+        self._simulate_latency()
+        host_source = self.get_host_path(source)
+        if not os.path.exists(host_source):
+            raise DeviceError('{} does not exist on the device.'.format(source))
+        self._copy(host_source, dest)
+
+    def delete_file(self, filepath, as_root=False):  # pylint: disable=W0221
+        self.execute('rm -rf {}'.format(filepath))
+
+    def file_exists(self, filepath):
+        output = self.execute('if [ -e \'{}\' ]; then echo 1; else echo 0; fi'.format(filepath))
+        return output == '1'
+
+    def listdir(self, path, as_root=False, **kwargs):
+        contents = self.execute('ls -1 {}'.format(path))
+        return contents.split('\n') if contents else []
+
+    def install(self, filepath, timeout=None, with_name=None):  # pylint: disable=W0221
+        destpath = self.path.join(self.binaries_directory, with_name or os.path.basename(filepath))
+        self.push_file(filepath, destpath)
+        return destpath
+
+    install_executable = install
+
+    def uninstall(self, executable_name):
+        self.delete_file(self.path.join(self.binaries_directory, executable_name))
+
+    uninstall_executable = uninstall
+
+    # misc
+
+    def capture_screen(self, filepath):
+        pass
+
+    def is_screen_on(self):
+        return True
+
+    def ensure_screen_is_on(self):
+        pass
+
+    # internal methods
+
+    def _simulate_latency(self):
+        self.command_count += 1
+        if self.command_latency:
+            time.sleep(self.command_latency)
+            self.simulated_latency += self.command_latency
+
+    def _emulate(self, command, check_exit_code):  # pylint: disable=too-many-return-statements
+        match = FILE_TEST_REGEX.match(command)
+        if match:
+            test, path = match.groups()
+            host_path = self.get_host_path(path)
+            checks = {'e': os.path.exists, 'f': os.path.isfile, 'd': os.path.isdir}
+            return '1' if checks[test](host_path) else '0'
+        match = ECHO_REGEX.match(command)
+        if match:
+            value, path = match.groups()
+            self._write_file(path, value.strip('\'"'), check_exit_code)
+            return ''
+
+        try:
+            args = shlex.split(command)
+        except ValueError:
+            return ''
+        if not args:
+            return ''
+        if args[0] == self.busybox and len(args) > 1:
+            args = args[1:]
+        name, args = args[0], args[1:]
+        paths = [a for a in args if not a.startswith('-')]
+        if name == 'cat' and paths:
+            return '\n'.join(self._read_file(p) for p in paths)
+        elif name == 'ls':
+            return '\n'.join(self._ls(paths[0] if paths else self.working_directory))
+        elif name == 'mkdir':
+            for path in paths:
+                host_path = self.get_host_path(path)
+                if not os.path.isdir(host_path):
+                    os.makedirs(host_path)
+        elif name == 'rm':
+            for path in paths:
+                host_path = self.get_host_path(path)
+                if os.path.isdir(host_path):
+                    shutil.rmtree(host_path)
+                elif os.path.exists(host_path):
+                    os.remove(host_path)
+        elif name == 'cp' and len(paths) >= 2:
+            dest = self.get_host_path(paths[-1])
+            for path in paths[:-1]:
+                sources = glob.glob(self.get_host_path(path))
+                if not sources and check_exit_code:
+                    raise DeviceError('cp: {}: No such file or directory'.format(path))
+                for source in sources:
+                    self._copy(source, dest if len(sources) == 1 else os.path.join(dest, ''))
+        elif name == 'tar' and '-C' in args and len(paths) >= 2:
+            # Only "tar cf ARCHIVE -C DIRECTORY ." is supported.
+            directory = args[args.index('-C') + 1]
+            with tarfile.open(self.get_host_path(paths[1]), 'w') as tf:
+                tf.add(self.get_host_path(directory), arcname='.')
+        elif name == 'gzip' and paths:
+            host_path = self.get_host_path(paths[0])
+            with open(host_path, 'rb') as fh:
+                with gzip.open(host_path + '.gz', 'wb') as wfh:
+                    shutil.copyfileobj(fh, wfh)
+            os.remove(host_path)
+        elif name == 'which' and paths:
+            path = self.path.join(self.binaries_directory, paths[0])
+            if not os.path.isfile(self.get_host_path(path)):
+                raise DeviceError('{} not found on the device.'.format(paths[0]))
+            return path
+        elif name == 'uname':
+            return self.architecture
+        elif name == 'sleep' and paths:
+            time.sleep(float(paths[0]))
+        return ''
+
+    def _read_file(self, path):
+        host_path = self.get_host_path(path)
+        if not os.path.isfile(host_path):
+            raise DeviceError('cat: {}: No such file or directory'.format(path))
+        with open(host_path) as fh:
+            return fh.read().rstrip('\n')
+
+    def _write_file(self, path, value, check_exit_code=True):
+        host_path = self.get_host_path(path)
+        if not os.path.isdir(os.path.dirname(host_path)):
+            if check_exit_code:
+                raise DeviceError('echo: {}: No such file or directory'.format(path))
+            return
+        dirname, filename = self.path.split(self.path.normpath(path))
+        if dirname.endswith('/cpufreq'):
+            if not self._update_cpufreq(dirname, filename, value):
+                if check_exit_code:
+                    raise DeviceError('echo: write error: Invalid argument')
+                return
+        elif filename == 'online' and re.match(CPU_ROOT + r'/cpu\d+$', dirname):
+            self._write_host_file(host_path, value)
+            self._update_online_cpus()
+            return
+        self._write_host_file(host_path, value)
+
+    def _update_cpufreq(self, cpufreq, filename, value):
+        # Returns False if the value would be rejected by the kernel.
+        def read(name):
+            with open(self.get_host_path(self.path.join(cpufreq, name))) as fh:
+                return fh.read().strip()
+
+        def write(name, new_value):
+            self._write_host_file(self.get_host_path(self.path.join(cpufreq, name)), new_value)
+
+        governor = read('scaling_governor')
+        if filename == 'scaling_governor':
+            if value not in self.governors:
+                return False
+            governor = value
+        elif filename in ['scaling_min_freq', 'scaling_max_freq', 'scaling_setspeed']:
+            try:
+                frequency = int(value)
+            except ValueError:
+                return False
+            if not min(self.frequencies) <= frequency <= max(self.frequencies):
+                return False
+            if filename == 'scaling_setspeed':
+                if governor != 'userspace':
+                    return False
+                write('scaling_cur_freq', frequency)
+                return True
+        write(filename, value)
+
+        min_freq, max_freq = int(read('scaling_min_freq')), int(read('scaling_max_freq'))
+        cur_freq = int(read('scaling_cur_freq'))
+        if governor == 'performance':
+            cur_freq = max_freq
+        elif governor == 'powersave':
+            cur_freq = min_freq
+        write('scaling_cur_freq', max(min_freq, min(cur_freq, max_freq)))
+        return True
+
+    def _update_online_cpus(self):
+        online = []
+        for i in xrange(len(self.core_names)):
+            with open(self.get_host_path('{}/cpu{}/online'.format(CPU_ROOT, i))) as fh:
+                if fh.read().strip() == '1':
+                    online.append(str(i))
+        self._write_host_file(self.get_host_path(CPU_ROOT + '/online'), ','.join(online))
+
+    def _ls(self, path):
+        host_path = self.get_host_path(path)
+        if os.path.isdir(host_path):
+            return sorted(os.listdir(host_path))
+        elif os.path.exists(host_path):
+            return [path]
+        raise DeviceError('ls: {}: No such file or directory'.format(path))
+
+    def _copy(self, source, dest):
+        if os.path.isdir(dest) or dest.endswith(os.sep):
+            dest = os.path.join(dest, os.path.basename(source))
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        if os.path.isdir(source):
+            if os.path.exists(dest):
+                shutil.rmtree(dest)
+            shutil.copytree(source, dest)
+        else:
+            shutil.copy(source, dest)
+
+    def _write_host_file(self, host_path, value):
+        if not os.path.isdir(os.path.dirname(host_path)):
+            os.makedirs(os.path.dirname(host_path))
+        with open(host_path, 'w') as wfh:
+            wfh.write('{}\n'.format(value))
+
+    def _populate_file_system(self):
+        files = {
+            CPU_ROOT + '/online': '0-{}'.format(len(self.core_names) - 1),
+            CPU_ROOT + '/possible': '0-{}'.format(len(self.core_names) - 1),
+            '/proc/version': 'Linux version 4.4.0-fake (wa@fake) #1 SMP PREEMPT',
+            '/proc/cmdline': 'console=ttyAMA0 root=/dev/fake',
+            '/proc/cpuinfo': self._get_cpuinfo(),
+            '/proc/interrupts': self._get_interrupts(),
+        }
+        governor = self.governors[0]
+        for i, cluster in enumerate(self.core_clusters):
+            cpufreq = '{}/cpu{}/cpufreq'.format(CPU_ROOT, i)
+            related_cpus = ' '.join(str(j) for j, c in enumerate(self.core_clusters) if c == cluster)
+            files.update({
+                '{}/cpu{}/online'.format(CPU_ROOT, i): 1,
+                cpufreq + '/affected_cpus': related_cpus,
+                cpufreq + '/related_cpus': related_cpus,
+                cpufreq + '/scaling_available_frequencies': ' '.join(map(str, self.frequencies)),
+                cpufreq + '/scaling_available_governors': ' '.join(self.governors),
+                cpufreq + '/scaling_governor': governor,
+                cpufreq + '/scaling_driver': 'fake-cpufreq',
+                cpufreq + '/cpuinfo_min_freq': min(self.frequencies),
+                cpufreq + '/cpuinfo_max_freq': max(self.frequencies),
+                cpufreq + '/scaling_min_freq': min(self.frequencies),
+                cpufreq + '/scaling_max_freq': max(self.frequencies),
+                cpufreq + '/scaling_cur_freq': (min(self.frequencies) if governor == 'powersave'
+                                                else max(self.frequencies)),
+                cpufreq + '/scaling_setspeed': '<unsupported>',
+            })
+            for name in self.governors:
+                for tunable, value in GOVERNOR_TUNABLES.get(name, {}).iteritems():
+                    files['{}/{}/{}'.format(cpufreq, name, tunable)] = value or max(self.frequencies)
+        for path, value in files.iteritems():
+            self._write_host_file(self.get_host_path(path), value)
+        for path in [self.working_directory, '/tmp']:
+            host_path = self.get_host_path(path)
+            if not os.path.isdir(host_path):
+                os.makedirs(host_path)
+
+    def _get_interrupts(self):
+        cpus = range(len(self.core_names))
+        lines = [' ' * 5 + ''.join('{:>11}'.format('CPU{}'.format(i)) for i in cpus)]
+        for irq, name in [(3, 'arch_timer'), (33, 'uart-pl011')]:
+            counts = ''.join('{:>11}'.format(1000 * (i + 1)) for i in cpus)
+            lines.append('{:>4}:{}     GICv2  {}'.format(irq, counts, name))
+        return '\n'.join(lines)
+
+    def _get_cpuinfo(self):
+        parts = {'a53': '0xd03', 'a57': '0xd07', 'a72': '0xd08', 'a7': '0xc07', 'a15': '0xc0f'}
+        lines = []
+        for i, core in enumerate(self.core_names):
+            lines.extend([
+                'processor\t: {}'.format(i),
+                'BogoMIPS\t: 38.40',
+                'CPU implementer\t: 0x41',
+                'CPU architecture: 8',
+                'CPU variant\t: 0x0',
+                'CPU part\t: {}'.format(parts.get(core, '0xd03')),
+                'CPU revision\t: 4',
+                '',
+            ])
+        lines.append('Hardware\t: Fake device')
+        return '\n'.join(lines)
@@ -43,6 +43,9 @@ class Gem5LinuxDevice(BaseGem5Device, LinuxDevice):
     possible to resume from a checkpoint when starting the simulation. To do
     this, please append the relevant checkpoint commands from the gem5
     simulation script to the gem5_discription argument in the agenda.
+    Alternatively, set reuse_checkpoint to have WA take a post-boot checkpoint
+    the first time the system is booted, and restore from it in later runs and
+    whenever the device is rebooted.
 
     Host system requirements:
         * VirtIO support. We rely on diod on the host system. This can be
@@ -116,5 +119,6 @@ class Gem5LinuxDevice(BaseGem5Device, LinuxDevice):
         LinuxDevice.capture_screen(self, filepath)
 
     def initialize(self, context):
+        super(Gem5LinuxDevice, self).initialize(context)
         self.resize_shell()
         self.deploy_m5(context, force=False)
@@ -0,0 +1,201 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# pylint: disable=attribute-defined-outside-init,unused-argument
+import os
+import csv
+import time
+import tempfile
+
+from wlauto import Instrument, Parameter
+from wlauto.exceptions import ConfigError
+from wlauto.modules.cpuidle import parse_cpuidle_snapshot
+
+
+SAMPLER_SCRIPT = """
+while [ ! -e {stop_file} ]; do
+    echo "@ $(cat /proc/uptime)"
+    {snapshot_command}
+    {busybox} usleep {interval}
+done > {output_file}
+touch {done_file}
+"""
+
+
+class CpuidleSampler(Instrument):
+
+    name = 'cpuidle_sampler'
+    description = """
+    Samples the ``usage`` and ``time`` counters of all cpuidle states of all CPUs at a
+    fixed rate during workload execution, and reports, for each state, the change in
+    those counters over the iteration, and the proportion of the iteration's duration
+    the CPU spent in that state (its residency).
+
+    The counters are sampled by a shell loop on the device, with all counters read by
+    a single command each time. The samples are written to ``cpuidle_samples.csv`` in
+    the iteration's output directory, with a column (in microseconds for ``time``) for
+    each counter, and the device's uptime (in seconds) at the time of the sample.
+
+    The device must have the ``cpuidle`` module installed.
+
+    """
+
+    parameters = [
+        Parameter('sample_interval', kind=int, default=100,
+                  description="""The interval between samples in mS."""),
+    ]
+
+    def validate(self):
+        if not self.device.has('cpuidle'):
+            raise ConfigError('Device does not appear to have cpuidle capability; is the right module installed?')
+        if self.sample_interval <= 0:
+            raise ConfigError('sample_interval must be positive')
+
+    def initialize(self, context):
+        self.on_device_script = self.device.path.join(self.device.working_directory, 'cpuidle_sampler.sh')
+        self.on_device_output = self.device.path.join(self.device.working_directory, 'cpuidle_samples.txt')
+        self.stop_file = self.device.path.join(self.device.working_directory, 'cpuidle_sampler.stop')
+        self.done_file = self.device.path.join(self.device.working_directory, 'cpuidle_sampler.done')
+        self.state_names = {}
+        for cpu, states in self.device.get_cpuidle_snapshot(attributes=['name']).iteritems():
+            for state, values in states.iteritems():
+                self.state_names[(cpu, state)] = values['name']
+
+        script = SAMPLER_SCRIPT.format(stop_file=self.stop_file,
+                                       done_file=self.done_file,
+                                       output_file=self.on_device_output,
+                                       busybox=self.device.busybox,
+                                       interval=self.sample_interval * 1000,
+                                       snapshot_command=self._get_snapshot_command())
+        fd, host_script = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as wfh:
+            wfh.write(script)
+        self.device.push_file(host_script, self.on_device_script)
+        os.remove(host_script)
+
+    def setup(self, context):
+        self.before = None
+        self.after = None
+        self.device.execute('rm -f {} {} {}'.format(self.stop_file, self.done_file, self.on_device_output),
+                            as_root=self.device.is_rooted)
+
+    def start(self, context):
+        self.before = self._take_snapshot()
+        self.device.kick_off('sh {}'.format(self.on_device_script), as_root=self.device.is_rooted)
+
+    def stop(self, context):
+        self.device.execute('touch {}'.format(self.stop_file), as_root=self.device.is_rooted)
+        self.after = self._take_snapshot()
+
+    def update_result(self, context):
+        if self.before is None or self.after is None:
+            return  # workload execution did not complete
+        duration = self.after[0] - self.before[0]
+        for (cpu, state), (usage, time_us) in sorted(get_counter_deltas(self.before[1], self.after[1]).items()):
+            name = '{}_{}'.format(cpu, self.state_names.get((cpu, state), state).replace(' ', '_'))
+            context.result.add_metric(name + '_usage', usage)
+            context.result.add_metric(name + '_time', time_us / 1000.0, 'milliseconds')
+            if duration > 0:
+                residency = time_us / 1e6 / duration * 100
+                context.result.add_metric(name + '_residency', residency, 'percent')
+
+        self._wait_for_sampler()
+        if not self.device.file_exists(self.on_device_output):
+            self.logger.warning('cpuidle sampler did not produce any output')
+            return
+        raw_file = os.path.join(context.output_directory, 'cpuidle_samples.txt')
+        self.device.pull_file(self.on_device_output, raw_file)
+        with open(raw_file) as fh:
+            samples = parse_cpuidle_samples(fh.read())
+        os.remove(raw_file)
+        output_file = os.path.join(context.output_directory, 'cpuidle_samples.csv')
+        with open(output_file, 'wb') as wfh:
+            write_samples_csv(samples, wfh)
+        context.add_artifact('cpuidle_samples', output_file, kind='data')
+
+    def teardown(self, context):
+        self.device.execute('rm -f {} {} {}'.format(self.stop_file, self.done_file, self.on_device_output),
+                            as_root=self.device.is_rooted)
+
+    def finalize(self, context):
+        self.device.delete_file(self.on_device_script)
+
+    def _get_snapshot_command(self):
+        return self.device.get_cpuidle_snapshot_command(attributes=['usage', 'time'])
+
+    def _take_snapshot(self):
+        output = self.device.execute(self._get_snapshot_command(), as_root=self.device.is_rooted,
+                                     check_exit_code=False)
+        return time.time(), parse_cpuidle_snapshot(output)
+
+    def _wait_for_sampler(self):
+        # The sampler finishes within a sample interval of the stop file being created.
+        timeout = time.time() + self.sample_interval / 1000.0 + 5
+        while not self.device.file_exists(self.done_file):
+            if time.time() > timeout:
+                self.logger.warning('cpuidle sampler did not stop; samples may be incomplete')
+                break
+            time.sleep(0.1)
+
+
+def get_counter_deltas(before, after):
+    """
+    Returns a dict mapping ``(cpu, state)`` to the changes in the ``usage`` and
+    ``time`` counters of the state between two snapshots (as returned by
+    ``parse_cpuidle_snapshot``).
+
+    """
+    deltas = {}
+    for cpu, states in after.iteritems():
+        for state, values in states.iteritems():
+            before_values = before.get(cpu, {}).get(state)
+            if not before_values:
+                continue  # e.g. the CPU was hotplugged in during execution
+            deltas[(cpu, state)] = (int(values['usage']) - int(before_values['usage']),
+                                    int(values['time']) - int(before_values['time']))
+    return deltas
+
+
+def parse_cpuidle_samples(text):
+    """
+    Parses the output of the sampler script into a list of ``(uptime, snapshot)``
+    tuples.
+
+    """
+    samples = []
+    for chunk in text.split('@ ')[1:]:
+        header, _, body = chunk.partition('\n')
+        try:
+            uptime = float(header.split()[0])
+        except (IndexError, ValueError):
+            continue
+        samples.append((uptime, parse_cpuidle_snapshot(body)))
+    return samples
+
+
+def write_samples_csv(samples, wfh):
+    columns = []
+    seen = set()
+    for _, snapshot in samples:
+        for cpu, states in snapshot.iteritems():
+            for state in states:
+                for counter in ['usage', 'time']:
+                    if (cpu, state, counter) not in seen:
+                        seen.add((cpu, state, counter))
+                        columns.append((cpu, state, counter))
+    writer = csv.writer(wfh)
+    writer.writerow(['uptime'] + ['{}_{}_{}'.format(*c) for c in columns])
+    for uptime, snapshot in samples:
+        writer.writerow([uptime] + [snapshot.get(cpu, {}).get(state, {}).get(counter, '')
+                                    for cpu, state, counter in columns])
@@ -28,6 +28,7 @@ from multiprocessing import Process, Queue
 from wlauto import Instrument, Parameter
 from wlauto.core import signal
 from wlauto.exceptions import ConfigError, InstrumentError, DeviceError
+from wlauto.utils.energy import PowerStreamReducer
 from wlauto.utils.misc import ensure_directory_exists as _d
 from wlauto.utils.types import list_of_ints, list_of_strs, boolean
 
@@ -254,19 +255,21 @@ class Daq(Instrument):
                 self._metrics |= set(metrics)
 
                 rows = _get_rows(reader, writer, self.negative_samples)
-                data = zip(*rows)
+                stats = PowerStreamReducer(metrics).process(rows)
 
                 if writer:
                     wfh.close()
                     shutil.move(temp_file, os.path.join(output_directory, entry))
 
-                n = len(data[0])
-                means = [s / n for s in map(sum, data)]
-                for metric, value in zip(metrics, means):
+                if not all(channel_stats.count for channel_stats in stats.itervalues()):
+                    self.logger.warning('No samples were collected for {}; not reporting it.'.format(port))
+                    continue
+                for metric, channel_stats in stats.iteritems():
                     metric_name = '{}_{}'.format(port, metric)
+                    value = channel_stats.mean
                     context.result.add_metric(metric_name, round(value, 3), UNITS[metric])
                     self._results[key][metric_name] = round(value, 3)
-                energy = sum(data[metrics.index('power')]) * (self.sampling_rate / 1000000)
+                energy = stats['power'].total * (self.sampling_rate / 1000000)
                 context.result.add_metric('{}_energy'.format(port), round(energy, 3), UNITS['energy'])
 
     def teardown(self, context):
@@ -383,7 +386,7 @@ class Daq(Instrument):
                 with open(path) as fh:
                     reader = csv.reader(fh)
                     metrics = reader.next()
-                    rows = _get_rows(reader, None, self.negative_samples)
+                    rows = list(_get_rows(reader, None, self.negative_samples))
                     if summed:
                         summed = [[x + y for x, y in zip(a, b)] for a, b in zip(rows, summed)]
                     else:
@@ -402,22 +405,19 @@ def _send_daq_command(q, *args, **kwargs):
 
 
 def _get_rows(reader, writer, negative_samples):
-    rows = []
     for row in reader:
         row = map(float, row)
         if negative_samples == 'keep':
-            rows.append(row)
+            pass
         elif negative_samples == 'zero':
-            def nonneg(v):
-                return v if v >= 0 else 0
-            rows.append([nonneg(v) for v in row])
+            row = [v if v >= 0 else 0 for v in row]
         elif negative_samples == 'drop':
-            if all(v >= 0 for v in row):
-                rows.append(row)
+            if not all(v >= 0 for v in row):
+                continue
         elif negative_samples == 'abs':
-            rows.append([abs(v) for v in row])
+            row = [abs(v) for v in row]
         else:
             raise AssertionError(negative_samples)  # should never get here
         if writer:
             writer.writerow(row)
-    return rows
+        yield row
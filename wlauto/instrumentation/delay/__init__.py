@@ -15,6 +15,7 @@
 
 
 #pylint: disable=W0613,E1101,E0203,W0201
+import math
 import time
 
 from wlauto import Instrument, Parameter
@@ -35,6 +36,16 @@ class DelayInstrument(Instrument):
     Optionally, if an active cooling solution is employed to speed up temperature drop between
     runs, it may be controlled using this instrument.
 
+    If ``temperature_prediction`` is enabled, rather than polling the temperature every
+    ``temperature_poll_period`` seconds until it reaches the threshold, the instrument fits
+    an exponential cooling curve to the readings taken so far, and sleeps for most of the
+    time the curve predicts it will take to reach the threshold before reading it again.
+
+    Whenever the instrument waits for a temperature threshold, the time spent waiting and the
+    temperatures at the start and end of the wait are reported as ``cooldown_time``,
+    ``cooldown_start_temperature`` and ``cooldown_end_temperature`` metrics of the following
+    iteration (classified by the point at which the wait happened).
+
     """
 
     parameters = [
@@ -114,8 +125,26 @@ class DelayInstrument(Instrument):
                   to drop to the threshold. The solution involves an mbed controlling a fan. The mbed is signaled
                   over a serial port. If this solution is present in the setup, this should be set to ``True``.
                   """),
+        Parameter('temperature_prediction', kind=boolean, default=False,
+                  global_alias='thermal_prediction',
+                  description="""
+                  Predict how long it will take the device to cool down to the temperature threshold,
+                  based on the readings taken so far, and sleep for most of that time in one step,
+                  rather than polling the temperature every ``temperature_poll_period`` seconds.
+                  """),
+        Parameter('prediction_sleep_fraction', kind=float, default=0.8,
+                  constraint=(lambda x: 0 < x <= 1, 'must be in (0, 1]'),
+                  description="""
+                  The fraction of the predicted time to reach the temperature threshold that the
+                  instrument will sleep for before reading the temperature again (if
+                  ``temperature_prediction`` is enabled).
+                  """),
     ]
 
+    def __init__(self, device, **kwargs):
+        super(DelayInstrument, self).__init__(device, **kwargs)
+        self.cooldowns = []
+
     def initialize(self, context):
         if self.temperature_between_iterations == 0:
             temp = self.device.get_sysfile_value(self.temperature_file, int)
@@ -134,7 +163,7 @@ class DelayInstrument(Instrument):
             time.sleep(self.fixed_between_iterations)
         elif self.temperature_between_iterations:
             self.logger.debug('Waiting for temperature drop before iteration...')
-            self.wait_for_temperature(self.temperature_between_iterations)
+            self.wait_for_temperature(self.temperature_between_iterations, 'iteration')
 
     def very_slow_on_spec_start(self, context):
         if self.active_cooling:
@@ -144,7 +173,7 @@ class DelayInstrument(Instrument):
             time.sleep(self.fixed_between_specs)
         elif self.temperature_between_specs:
             self.logger.debug('Waiting for temperature drop before spec execution...')
-            self.wait_for_temperature(self.temperature_between_specs)
+            self.wait_for_temperature(self.temperature_between_specs, 'spec')
 
     def very_slow_start(self, context):
         if self.active_cooling:
@@ -154,26 +183,50 @@ class DelayInstrument(Instrument):
             time.sleep(self.fixed_before_start)
         elif self.temperature_before_start:
             self.logger.debug('Waiting for temperature drop before commencing execution...')
-            self.wait_for_temperature(self.temperature_before_start)
-
-    def wait_for_temperature(self, temperature):
+            self.wait_for_temperature(self.temperature_before_start, 'start')
+
+    def update_result(self, context):
+        for before, duration, start_temperature, end_temperature in self.cooldowns:
+            classifiers = {'before': before}
+            context.result.add_metric('cooldown_time', duration, 'seconds', classifiers=classifiers)
+            context.result.add_metric('cooldown_start_temperature', start_temperature, classifiers=classifiers)
+            context.result.add_metric('cooldown_end_temperature', end_temperature, classifiers=classifiers)
+        self.cooldowns = []
+
+    def wait_for_temperature(self, temperature, before=None):
+        start_time = time.time()
+        start_temperature = self.device.get_sysfile_value(self.temperature_file, int)
         if self.active_cooling:
             self.device.start_active_cooling()
-            self.do_wait_for_temperature(temperature)
+            end_temperature = self.do_wait_for_temperature(temperature, start_temperature)
             self.device.stop_active_cooling()
         else:
-            self.do_wait_for_temperature(temperature)
+            end_temperature = self.do_wait_for_temperature(temperature, start_temperature)
+        if before:
+            self.cooldowns.append((before, time.time() - start_time, start_temperature, end_temperature))
 
-    def do_wait_for_temperature(self, temperature):
-        reading = self.device.get_sysfile_value(self.temperature_file, int)
+    def do_wait_for_temperature(self, temperature, reading=None):
+        if reading is None:
+            reading = self.device.get_sysfile_value(self.temperature_file, int)
         waiting_start_time = time.time()
+        model = CoolingModel() if self.temperature_prediction else None
         while reading > temperature:
             self.logger.debug('Device temperature: {}'.format(reading))
-            if time.time() - waiting_start_time > self.temperature_timeout:
+            elapsed = time.time() - waiting_start_time
+            if elapsed > self.temperature_timeout:
                 self.logger.warning('Reached timeout; current temperature: {}'.format(reading))
                 break
-            time.sleep(self.temperature_poll_period)
+            sleep_time = self.temperature_poll_period
+            if model is not None:
+                model.add_sample(elapsed, reading)
+                predicted = model.predict_time(temperature)
+                if predicted is not None:
+                    self.logger.debug('Predicted to reach {} in {:.1f}s'.format(temperature, predicted - elapsed))
+                    sleep_time = max(sleep_time, (predicted - elapsed) * self.prediction_sleep_fraction)
+                    sleep_time = min(sleep_time, self.temperature_timeout - elapsed)
+            time.sleep(max(sleep_time, 0))
             reading = self.device.get_sysfile_value(self.temperature_file, int)
+        return reading
 
     def validate(self):
         if (self.temperature_between_specs is not None and
@@ -196,3 +249,85 @@ class DelayInstrument(Instrument):
         if self.active_cooling and not self.device.has('active_cooling'):
             message = 'Your device does not support active cooling. Did you configure it with an approprite module?'
             raise InstrumentError(message)
+
+
+class CoolingModel(object):
+    """
+    Fits Newton's law of cooling, ::
+
+        T(t) = ambient + (T(0) - ambient) * exp(-rate * t)
+
+    to temperature readings taken while a device cools down, in order to predict
+    when it will reach a given temperature. ``ambient``, ``T(0)`` and ``rate`` are
+    all fitted (in the least squares sense): for a given ``rate``, the other two
+    are found by linear regression, and ``rate`` is then found by searching for the
+    value with the smallest residual.
+
+    """
+
+    min_samples = 3
+    min_rate = 1e-4  # per second
+    max_rate = 1.0
+    search_points = 50
+
+    def __init__(self):
+        self.samples = []
+        self.ambient = None
+        self.amplitude = None
+        self.rate = None
+
+    def add_sample(self, timestamp, temperature):
+        self.samples.append((float(timestamp), float(temperature)))
+        self.ambient = self.amplitude = self.rate = None
+
+    def fit(self):
+        """Fit the model to the samples so far; returns ``False`` if there are not enough."""
+        if len(self.samples) < self.min_samples:
+            return False
+        log_min, log_max = math.log(self.min_rate), math.log(self.max_rate)
+        step = (log_max - log_min) / (self.search_points - 1)
+        grid = [log_min + i * step for i in xrange(self.search_points)]
+        best = min(xrange(len(grid)), key=lambda i: self._fit_rate(math.exp(grid[i]))[0])
+        # Refine with a golden section search between the neighbours of the best grid point.
+        low, high = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in xrange(40):
+            a = high - ratio * (high - low)
+            b = low + ratio * (high - low)
+            if self._fit_rate(math.exp(a))[0] < self._fit_rate(math.exp(b))[0]:
+                high = b
+            else:
+                low = a
+        self.rate = math.exp((low + high) / 2)
+        _, self.ambient, self.amplitude = self._fit_rate(self.rate)
+        return True
+
+    def predict_time(self, temperature):
+        """
+        Returns the time (on the same scale as the samples' timestamps) at which the
+        temperature is predicted to reach ``temperature``, or ``None`` if it cannot be
+        predicted (e.g. because the temperature is not falling, or is expected to settle
+        above ``temperature``).
+
+        """
+        if self.rate is None and not self.fit():
+            return None
+        if self.amplitude <= 0 or temperature <= self.ambient:
+            return None
+        origin = self.samples[0][0]
+        return origin + math.log(self.amplitude / (temperature - self.ambient)) / self.rate
+
+    def _fit_rate(self, rate):
+        """Returns ``(sse, ambient, amplitude)`` of the best fit for ``rate``."""
+        origin = self.samples[0][0]
+        xs = [math.exp(-rate * (t - origin)) for t, _ in self.samples]
+        ys = [temperature for _, temperature in self.samples]
+        n = len(xs)
+        mean_x, mean_y = sum(xs) / n, sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if not var_x:
+            return float('inf'), None, None
+        amplitude = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        ambient = mean_y - amplitude * mean_x
+        sse = sum((y - ambient - amplitude * x) ** 2 for x, y in zip(xs, ys))
+        return sse, ambient, amplitude
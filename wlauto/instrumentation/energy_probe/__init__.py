@@ -19,17 +19,23 @@ import os
 import subprocess
 import signal
 import struct
-import csv
 try:
-    import pandas
+    import numpy as np
 except ImportError:
-    pandas = None
+    np = None
 
 from wlauto import Instrument, Parameter, Executable
 from wlauto.exceptions import InstrumentError, ConfigError
 from wlauto.utils.types import list_of_numbers
 
 
+# Each sample in caiman raw data consists of an unsigned 32-bit value for each
+# of these attributes, for each channel.
+ATTRIBUTES = ['power', 'voltage', 'current']
+BYTES_PER_SAMPLE = len(ATTRIBUTES) * 4
+ROW_FORMAT = ','.join(['%.3f'] * len(ATTRIBUTES)) + '\n'
+
+
 class EnergyProbe(Instrument):
 
     name = 'energy_probe'
@@ -45,7 +51,11 @@ class EnergyProbe(Instrument):
                      range of 5 to 20 mOhm. The resistance of the shunt resistors is a mandatory parameter
                      ``resistor_values``.
 
-                    .. note:: This instrument can process results a lot faster if python pandas is installed.
+                     Average power and energy for each rail are reported as metrics, and the power,
+                     voltage and current samples for each rail are written to a CSV file named after
+                     its label.
+
+                    .. note:: This instrument can process results a lot faster if numpy is installed.
                     """
 
     parameters = [
@@ -59,11 +69,11 @@ class EnergyProbe(Instrument):
 
     MAX_CHANNELS = 3
 
+    # The energy probe produces samples at a fixed rate.
+    SAMPLE_RATE_HZ = 10000
+
     def __init__(self, device, **kwargs):
         super(EnergyProbe, self).__init__(device, **kwargs)
-        self.attributes_per_sample = 3
-        self.bytes_per_sample = self.attributes_per_sample * 4
-        self.attributes = ['power', 'voltage', 'current']
         for i, val in enumerate(self.resistor_values):
             self.resistor_values[i] = int(1000 * float(val))
 
@@ -75,9 +85,9 @@ class EnergyProbe(Instrument):
         if len(self.resistor_values) > self.MAX_CHANNELS:
             raise ConfigError('{} Channels where specified when Energy Probe supports up to {}'
                               .format(len(self.resistor_values), self.MAX_CHANNELS))
-        if pandas is None:
-            self.logger.warning("pandas package will significantly speed up this instrument")
-            self.logger.warning("to install it try: pip install pandas")
+        if np is None:
+            self.logger.warning("numpy package will significantly speed up this instrument")
+            self.logger.warning("to install it try: pip install numpy")
 
     def setup(self, context):
         if not self.labels:
@@ -101,46 +111,89 @@ class EnergyProbe(Instrument):
     def stop(self, context):
         os.killpg(self.caiman.pid, signal.SIGTERM)
 
-    def update_result(self, context):  # pylint: disable=too-many-locals
-        num_of_channels = len(self.resistor_values)
-        processed_data = [[] for _ in xrange(num_of_channels)]
+    def update_result(self, context):
         filenames = [os.path.join(self.output_directory, '{}.csv'.format(label)) for label in self.labels]
-        struct_format = '{}I'.format(num_of_channels * self.attributes_per_sample)
-        not_a_full_row_seen = False
-        with open(os.path.join(self.output_directory, "0000000000"), "rb") as bfile:
-            while True:
-                data = bfile.read(num_of_channels * self.bytes_per_sample)
-                if data == '':
-                    break
-                try:
-                    unpacked_data = struct.unpack(struct_format, data)
-                except struct.error:
-                    if not_a_full_row_seen:
-                        self.logger.warn('possibly missaligned caiman raw data, row contained {} bytes'.format(len(data)))
-                        continue
-                    else:
-                        not_a_full_row_seen = True
-                for i in xrange(num_of_channels):
-                    index = i * self.attributes_per_sample
-                    processed_data[i].append({attr: val for attr, val in
-                                              zip(self.attributes, unpacked_data[index:index + self.attributes_per_sample])})
-        for i, path in enumerate(filenames):
-            with open(path, 'w') as f:
-                if pandas is not None:
-                    self._pandas_produce_csv(processed_data[i], f)
+        raw_file = os.path.join(self.output_directory, "0000000000")
+        stats = process_raw_file(raw_file, filenames, self.SAMPLE_RATE_HZ, logger=self.logger)
+        for label, (average_power, energy) in zip(self.labels, stats):
+            context.result.add_metric('{}_power'.format(label), round(average_power, 3), 'milliwatts')
+            context.result.add_metric('{}_energy'.format(label), round(energy, 3), 'millijoules')
+
+
+def process_raw_file(raw_file, csv_files, sample_rate, chunk_size=100000, logger=None):
+    """
+    Decodes a caiman raw capture containing one channel per entry in ``csv_files``.
+    The scaled power, voltage and current samples for each channel are written to
+    the corresponding CSV file, ``chunk_size`` samples at a time so that memory
+    use does not grow with the length of the capture.
+
+    Returns a list with an ``(average_power, energy)`` tuple for each channel.
+
+    """
+    num_of_channels = len(csv_files)
+    row_size = num_of_channels * BYTES_PER_SAMPLE
+    if np is not None:
+        chunks = _read_raw_chunks_numpy(raw_file, num_of_channels, chunk_size)
+    else:
+        chunks = _read_raw_chunks(raw_file, num_of_channels, chunk_size)
+
+    power_sums = [0.0] * num_of_channels
+    sample_count = 0
+    files = [open(path, 'w') for path in csv_files]
+    try:
+        for f in files:
+            f.write(','.join(ATTRIBUTES) + '\n')
+        for chunk in chunks:
+            sample_count += len(chunk)
+            for i, f in enumerate(files):
+                if np is not None:
+                    channel_data = chunk[:, i, :] / 1000.0
+                    power_sums[i] += channel_data[:, 0].sum()
+                    values = channel_data.ravel().tolist()
                 else:
-                    self._slow_produce_csv(processed_data[i], f)
-
-    # pylint: disable=R0201
-    def _pandas_produce_csv(self, data, f):
-        dframe = pandas.DataFrame(data)
-        dframe = dframe / 1000.0
-        dframe.to_csv(f)
-
-    def _slow_produce_csv(self, data, f):
-        new_data = []
-        for entry in data:
-            new_data.append({key: val / 1000.0 for key, val in entry.items()})
-        writer = csv.DictWriter(f, self.attributes)
-        writer.writeheader()
-        writer.writerows(new_data)
+                    values = [v / 1000.0 for row in chunk for v in row[i]]
+                    power_sums[i] += sum(values[::len(ATTRIBUTES)])
+                # A single format operation per chunk is much faster than
+                # formatting (or csv-writing) each row separately.
+                f.write(ROW_FORMAT * (len(values) // len(ATTRIBUTES)) % tuple(values))
+    finally:
+        for f in files:
+            f.close()
+
+    leftover = os.path.getsize(raw_file) % row_size
+    if leftover and logger:
+        logger.warning('Ignoring {} bytes at the end of caiman raw data (incomplete sample)'.format(leftover))
+
+    stats = []
+    for power_sum in power_sums:
+        average_power = power_sum / sample_count if sample_count else 0.0
+        stats.append((average_power, power_sum / sample_rate))
+    return stats
+
+
+def _read_raw_chunks_numpy(raw_file, num_of_channels, chunk_size):
+    # Values are read as a flat array and then reshaped, as reading with a
+    # subarray dtype corrupts the last row when the final read is short.
+    values_per_row = num_of_channels * len(ATTRIBUTES)
+    with open(raw_file, 'rb') as f:
+        while True:
+            values = np.fromfile(f, dtype='<u4', count=chunk_size * values_per_row)
+            rows = len(values) // values_per_row
+            if not rows:
+                break
+            yield values[:rows * values_per_row].reshape(rows, num_of_channels, len(ATTRIBUTES))
+
+
+def _read_raw_chunks(raw_file, num_of_channels, chunk_size):
+    row_size = num_of_channels * BYTES_PER_SAMPLE
+    with open(raw_file, 'rb') as f:
+        while True:
+            data = f.read(row_size * chunk_size)
+            rows = len(data) // row_size
+            if not rows:
+                break
+            values = struct.unpack('<{}I'.format(rows * num_of_channels * len(ATTRIBUTES)),
+                                   data[:rows * row_size])
+            yield [[values[j:j + len(ATTRIBUTES)]
+                    for j in xrange(r, r + num_of_channels * len(ATTRIBUTES), len(ATTRIBUTES))]
+                   for r in xrange(0, len(values), num_of_channels * len(ATTRIBUTES))]
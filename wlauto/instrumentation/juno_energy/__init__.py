@@ -24,6 +24,7 @@ from operator import itemgetter
 
 from wlauto import Instrument, File, Parameter
 from wlauto.exceptions import InstrumentError
+from wlauto.utils.energy import reduce_power_csv
 
 UNIT_MAP = {
     'curr': 'Amps',
@@ -61,6 +62,13 @@ class JunoEnergy(Instrument):
                   ``"juno"``. This is useful if the underlying board is actually Juno
                   but WA connects via a different interface (e.g. ``generic_linux``).
                   """),
+        Parameter('timeline_downsample', kind=int, default=None,
+                  description="""
+                  If specified, a timeline of the measurements, downsampled by this
+                  factor (i.e. each row is the average of this many samples), will be
+                  written to ``energy_timeline.csv`` in the iteration's output
+                  directory.
+                  """),
     ]
 
     def on_run_init(self, context):
@@ -84,19 +92,27 @@ class JunoEnergy(Instrument):
         self.device.pull_file(self.device_output_file, self.host_output_file)
         context.add_artifact('junoenergy', self.host_output_file, 'data')
 
+        timeline_file = None
+        if self.timeline_downsample:
+            timeline_file = os.path.join(context.output_directory, 'energy_timeline.csv')
+
         with open(self.host_output_file) as fh:
-            reader = csv.reader(fh)
-            headers = reader.next()
-            columns = zip(*reader)
-            for header, data in zip(headers, columns):
-                data = map(float, data)
-                if header.endswith('cenr'):
-                    value = data[-1] - data[0]
-                    if value < 0:  # counter wrapped
-                        value = JUNO_MAX_INT + value
-                else:  # not cumulative energy
-                    value = sum(data) / len(data)
-                context.add_metric(header, value, UNIT_MAP[header.split('_')[-1]])
+            headers = csv.reader(fh).next()
+        cumulative = [h for h in headers if h.endswith('cenr')]
+        stats = reduce_power_csv(self.host_output_file, cumulative, JUNO_MAX_INT,
+                                 timeline_file, self.timeline_downsample or 1)
+        for header, channel_stats in stats.iteritems():
+            if not channel_stats.count:
+                self.logger.warning('No samples were recorded for {}; not reporting it.'.format(header))
+                continue
+            if channel_stats.cumulative:
+                value = channel_stats.delta
+            else:  # not cumulative energy
+                value = channel_stats.mean
+            context.add_metric(header, value, UNIT_MAP[header.split('_')[-1]])
+
+        if timeline_file:
+            context.add_artifact('junoenergy_timeline', timeline_file, 'data')
 
     def teardown(self, conetext):
         self.device.delete_file(self.device_output_file)
@@ -30,21 +30,25 @@ import re
 import logging
 import time
 import tarfile
-from itertools import izip, izip_longest
+from itertools import izip
+from collections import OrderedDict
 from subprocess import CalledProcessError
 
 from wlauto import Instrument, Parameter
 from wlauto.core import signal
 from wlauto.exceptions import DeviceError, ConfigError
-from wlauto.utils.misc import diff_tokens, write_table, check_output, as_relative
+from wlauto.utils.misc import check_output, as_relative
 from wlauto.utils.misc import ensure_file_directory_exists as _f
 from wlauto.utils.misc import ensure_directory_exists as _d
 from wlauto.utils.android import ApkInfo
+from wlauto.utils.sysdiff import SysfsDiffer, parse_interrupts, diff_interrupts
 from wlauto.utils.types import list_of_strings
 
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_HEADER_REGEX = re.compile(r'(?:\A|\n)==> (.*) <==\n')
+
 
 class SysfsExtractor(Instrument):
 
@@ -53,11 +57,26 @@ class SysfsExtractor(Instrument):
     Collects the contest of a set of directories, before and after workload execution
     and diffs the result.
 
+    If ``use_manifest`` is set, rather than copying the directory trees, the values of
+    all the files under the specified paths are dumped on the device into a single
+    manifest file before and after workload execution. Only the manifests are pulled
+    from the device (they are saved as ``before/<manifest>`` and ``after/<manifest>``),
+    and the diffs are computed from them. Paths listed in ``raw_paths`` are still copied
+    in full.
+
+    The files whose contents changed are also listed, with their before and after
+    values, in ``<instrument name>_diff.csv`` and ``<instrument name>_diff.json``.
+
     """
 
     mount_command = 'mount -t tmpfs -o size={} tmpfs {}'
     extract_timeout = 30
     tarname = 'sysfs.tar'
+    manifest_name = 'sysfs.manifest'
+    # Dumps the contents of all files under the specified paths. tail prints a
+    # "==> <path> <==" header before each file when given more than one file,
+    # so /dev/null is added in case xargs passes it only one.
+    manifest_command = '{0} find -H {1} -type f 2>/dev/null | {0} xargs {0} tail -n +1 /dev/null > {2} 2>/dev/null'
     DEVICE_PATH = 0
     BEFORE_PATH = 1
     AFTER_PATH = 2
@@ -79,6 +98,17 @@ class SysfsExtractor(Instrument):
                   description="""Mount point for tmpfs partition used to store snapshots of paths."""),
         Parameter('tmpfs_size', default='32m',
                   description="""Size of the tempfs partition."""),
+        Parameter('use_manifest', kind=bool, default=False,
+                  description="""
+                  Specifies whether the values of sysfs files should be dumped into a manifest
+                  on the device, rather than copying the directory trees. Only the manifests are
+                  pulled from the device and diffed, which is much faster for large trees.
+                  """),
+        Parameter('raw_paths', kind=list_of_strings, default=[],
+                  description="""
+                  Entries of ``paths`` that should still be copied in full (and diffed file by file)
+                  when ``use_manifest`` is set, e.g. because the raw before/after files are needed.
+                  """),
     ]
 
     def initialize(self, context):
@@ -87,7 +117,7 @@ class SysfsExtractor(Instrument):
         elif self.use_tmpfs is None:  # pylint: disable=access-member-before-definition
             self.use_tmpfs = self.device.is_rooted
 
-        if self.use_tmpfs:
+        if self.use_tmpfs and (not self.use_manifest or self.raw_paths):
             self.on_device_before = self.device.path.join(self.tmpfs_mount_point, 'before')
             self.on_device_after = self.device.path.join(self.tmpfs_mount_point, 'after')
 
@@ -97,22 +127,42 @@ class SysfsExtractor(Instrument):
                                     as_root=True)
 
     def setup(self, context):
+        if self.use_manifest:
+            self.copy_paths = [d for d in self.paths if d in self.raw_paths]
+            self.manifest_paths = [d for d in self.paths if d not in self.raw_paths]
+        else:
+            self.copy_paths = self.paths
+            self.manifest_paths = []
+
         before_dirs = [
             _d(os.path.join(context.output_directory, 'before', self._local_dir(d)))
-            for d in self.paths
+            for d in self.copy_paths
         ]
         after_dirs = [
             _d(os.path.join(context.output_directory, 'after', self._local_dir(d)))
-            for d in self.paths
+            for d in self.copy_paths
         ]
         diff_dirs = [
             _d(os.path.join(context.output_directory, 'diff', self._local_dir(d)))
-            for d in self.paths
+            for d in self.copy_paths
         ]
-        self.device_and_host_paths = zip(self.paths, before_dirs, after_dirs, diff_dirs)
+        self.device_and_host_paths = zip(self.copy_paths, before_dirs, after_dirs, diff_dirs)
+
+        if self.manifest_paths:
+            self.on_device_manifests = [
+                self.device.path.join(self.device.working_directory, '{}-{}'.format(stage, self.manifest_name))
+                for stage in ('before', 'after')
+            ]
+            self.host_manifests = [
+                os.path.join(context.output_directory, stage, self.manifest_name)
+                for stage in ('before', 'after')
+            ]
+            for manifest in self.host_manifests:
+                if os.path.isfile(manifest):
+                    os.remove(manifest)
 
         if self.use_tmpfs:
-            for d in self.paths:
+            for d in self.copy_paths:
                 before_dir = self.device.path.join(self.on_device_before,
                                                    self.device.path.dirname(as_relative(d)))
                 after_dir = self.device.path.join(self.on_device_after,
@@ -125,8 +175,10 @@ class SysfsExtractor(Instrument):
                 self.device.execute('mkdir -p {}'.format(after_dir), as_root=True)
 
     def slow_start(self, context):
+        if self.manifest_paths:
+            self._dump_manifest(self.on_device_manifests[0])
         if self.use_tmpfs:
-            for d in self.paths:
+            for d in self.copy_paths:
                 dest_dir = self.device.path.join(self.on_device_before, as_relative(d))
                 if '*' in dest_dir:
                     dest_dir = self.device.path.dirname(dest_dir)
@@ -137,8 +189,10 @@ class SysfsExtractor(Instrument):
                 self.device.pull_file(dev_dir, before_dir)
 
     def slow_stop(self, context):
+        if self.manifest_paths:
+            self._dump_manifest(self.on_device_manifests[1])
         if self.use_tmpfs:
-            for d in self.paths:
+            for d in self.copy_paths:
                 dest_dir = self.device.path.join(self.on_device_after, as_relative(d))
                 if '*' in dest_dir:
                     dest_dir = self.device.path.dirname(dest_dir)
@@ -149,7 +203,11 @@ class SysfsExtractor(Instrument):
                 self.device.pull_file(dev_dir, after_dir)
 
     def update_result(self, context):
-        if self.use_tmpfs:
+        differ = SysfsDiffer()
+        if self.manifest_paths:
+            self._diff_manifests(context, differ)
+
+        if self.use_tmpfs and self.copy_paths:
             on_device_tarball = self.device.path.join(self.device.working_directory, self.tarname)
             on_host_tarball = self.device.path.join(context.output_directory, self.tarname + ".gz")
             self.device.execute('{} tar cf {} -C {} .'.format(self.device.busybox,
@@ -173,14 +231,20 @@ class SysfsExtractor(Instrument):
                     self.device.listdir(dev_dir)):
                 self.logger.error('sysfs files were not pulled from the device.')
                 self.device_and_host_paths.remove(paths)  # Path is removed to skip diffing it
-        for _, before_dir, after_dir, diff_dir in self.device_and_host_paths:
-            _diff_sysfs_dirs(before_dir, after_dir, diff_dir)
+        for dev_dir, before_dir, after_dir, diff_dir in self.device_and_host_paths:
+            _diff_sysfs_dirs(before_dir, after_dir, diff_dir, differ, self.device.path.dirname(dev_dir))
+
+        # Structured versions of the diffs, listing only the files that changed.
+        with open(os.path.join(context.output_directory, '{}_diff.csv'.format(self.name)), 'wb') as wfh:
+            differ.write_csv(wfh)
+        with open(os.path.join(context.output_directory, '{}_diff.json'.format(self.name)), 'w') as wfh:
+            differ.write_json(wfh)
 
     def teardown(self, context):
         self._one_time_setup_done = []
 
     def finalize(self, context):
-        if self.use_tmpfs:
+        if self.use_tmpfs and (not self.use_manifest or self.raw_paths):
             try:
                 self.device.execute('umount {}'.format(self.tmpfs_mount_point), as_root=True)
             except (DeviceError, CalledProcessError):
@@ -192,10 +256,33 @@ class SysfsExtractor(Instrument):
     def validate(self):
         if not self.tmpfs_mount_point:  # pylint: disable=access-member-before-definition
             self.tmpfs_mount_point = self.device.path.join(self.device.working_directory, 'temp-fs')
+        for path in self.raw_paths:
+            if path not in self.paths:
+                raise ConfigError('raw_paths entry "{}" is not in paths.'.format(path))
 
     def _local_dir(self, directory):
         return os.path.dirname(as_relative(directory).replace(self.device.path.sep, os.sep))
 
+    def _dump_manifest(self, on_device_manifest):
+        command = self.manifest_command.format(self.device.busybox, ' '.join(self.manifest_paths),
+                                               on_device_manifest)
+        self.device.execute(command, as_root=self.device.is_rooted, check_exit_code=False)
+
+    def _diff_manifests(self, context, differ):
+        for on_device_manifest, host_manifest in zip(self.on_device_manifests, self.host_manifests):
+            if self.device.file_exists(on_device_manifest):
+                self.device.pull_file(on_device_manifest, _f(host_manifest))
+                self.device.delete_file(on_device_manifest)
+        if not all(os.path.isfile(m) for m in self.host_manifests):
+            self.logger.error('sysfs manifests were not pulled from the device.')
+            return
+        before, after = [_read_sysfs_manifest(m) for m in self.host_manifests]
+        if not after:
+            self.logger.error('sysfs manifest is empty; were the paths readable?')
+            return
+        diff_dir = os.path.join(context.output_directory, 'diff')
+        _diff_sysfs_manifests(before, after, diff_dir, self.device.path.sep, differ)
+
 
 class ExecutionTimeInstrument(Instrument):
 
@@ -232,7 +319,8 @@ class InterruptStatsInstrument(Instrument):
     name = 'interrupts'
     description = """
     Pulls the ``/proc/interrupts`` file before and after workload execution and diffs them
-    to show what interrupts  occurred during that time.
+    to show what interrupts  occurred during that time. As well as the text diff, the
+    per-CPU interrupt counts are written to ``interrupts_diff.csv`` and ``interrupts_diff.json``.
 
     """
 
@@ -258,7 +346,11 @@ class InterruptStatsInstrument(Instrument):
     def update_result(self, context):
         # If workload execution failed, the after_file may not have been created.
         if os.path.isfile(self.after_file):
-            _diff_interrupt_files(self.before_file, self.after_file, _f(self.diff_file))
+            diff = _diff_interrupt_files(self.before_file, self.after_file, _f(self.diff_file))
+            with open(os.path.join(context.output_directory, 'interrupts_diff.csv'), 'wb') as wfh:
+                diff.write_csv(wfh)
+            with open(os.path.join(context.output_directory, 'interrupts_diff.json'), 'w') as wfh:
+                diff.write_json(wfh)
 
 
 class DynamicFrequencyInstrument(SysfsExtractor):
@@ -270,6 +362,7 @@ class DynamicFrequencyInstrument(SysfsExtractor):
     """
 
     tarname = 'cpufreq.tar'
+    manifest_name = 'cpufreq.manifest'
 
     parameters = [
         Parameter('paths', mandatory=False, override=True),
@@ -277,7 +370,7 @@ class DynamicFrequencyInstrument(SysfsExtractor):
 
     def setup(self, context):
         self.paths = ['/sys/devices/system/cpu']
-        if self.use_tmpfs:
+        if self.use_tmpfs or self.use_manifest:
             self.paths.append('/sys/class/devfreq/*')  # the '*' would cause problems for adb pull.
         super(DynamicFrequencyInstrument, self).setup(context)
 
@@ -287,81 +380,84 @@ class DynamicFrequencyInstrument(SysfsExtractor):
             self.tmpfs_mount_point += '-cpufreq'
 
 
-def _diff_interrupt_files(before, after, result):  # pylint: disable=R0914
-    output_lines = []
-    with open(before) as bfh:
-        with open(after) as ofh:
-            for bline, aline in izip(bfh, ofh):
-                bchunks = bline.strip().split()
-                while True:
-                    achunks = aline.strip().split()
-                    if achunks[0] == bchunks[0]:
-                        diffchunks = ['']
-                        diffchunks.append(achunks[0])
-                        diffchunks.extend([diff_tokens(b, a) for b, a
-                                           in zip(bchunks[1:], achunks[1:])])
-                        output_lines.append(diffchunks)
-                        break
-                    else:  # new category appeared in the after file
-                        diffchunks = ['>'] + achunks
-                        output_lines.append(diffchunks)
-                        try:
-                            aline = ofh.next()
-                        except StopIteration:
-                            break
-
-    # Offset heading columns by one to allow for row labels on subsequent
-    # lines.
-    output_lines[0].insert(0, '')
-
-    # Any "columns" that do not have headings in the first row are not actually
-    # columns -- they are a single column where space-spearated words got
-    # split. Merge them back together to prevent them from being
-    # column-aligned by write_table.
-    table_rows = [output_lines[0]]
-    num_cols = len(output_lines[0])
-    for row in output_lines[1:]:
-        table_row = row[:num_cols]
-        table_row.append(' '.join(row[num_cols:]))
-        table_rows.append(table_row)
+def _diff_interrupt_files(before, after, result):
+    """
+    Writes a diff of the ``before`` and ``after`` copies of ``/proc/interrupts`` to
+    the ``result`` file, and returns it as an ``InterruptTable``.
 
+    """
+    with open(before) as bfh:
+        before_table = parse_interrupts(bfh.read())
+    with open(after) as afh:
+        after_table = parse_interrupts(afh.read())
+    diff = diff_interrupts(before_table, after_table)
     with open(result, 'w') as wfh:
-        write_table(table_rows, wfh)
-
-
-def _diff_sysfs_dirs(before, after, result):  # pylint: disable=R0914
-    before_files = []
-    os.path.walk(before,
-                 lambda arg, dirname, names: arg.extend([os.path.join(dirname, f) for f in names]),
-                 before_files
-                 )
-    before_files = filter(os.path.isfile, before_files)
-    files = [os.path.relpath(f, before) for f in before_files]
-    after_files = [os.path.join(after, f) for f in files]
-    diff_files = [os.path.join(result, f) for f in files]
-
-    for bfile, afile, dfile in zip(before_files, after_files, diff_files):
-        if not os.path.isfile(afile):
-            logger.debug('sysfs_diff: {} does not exist or is not a file'.format(afile))
-            continue
+        diff.write_text(wfh)
+    return diff
 
-        with open(bfile) as bfh, open(afile) as afh:  # pylint: disable=C0321
-            with open(_f(dfile), 'w') as dfh:
-                for i, (bline, aline) in enumerate(izip_longest(bfh, afh), 1):
-                    if aline is None:
-                        logger.debug('Lines missing from {}'.format(afile))
-                        break
-                    bchunks = re.split(r'(\W+)', bline)
-                    achunks = re.split(r'(\W+)', aline)
-                    if len(bchunks) != len(achunks):
-                        logger.debug('Token length mismatch in {} on line {}'.format(bfile, i))
-                        dfh.write('xxx ' + bline)
-                        continue
-                    if ((len([c for c in bchunks if c.strip()]) == len([c for c in achunks if c.strip()]) == 2) and
-                            (bchunks[0] == achunks[0])):
-                        # if there are only two columns and the first column is the
-                        # same, assume it's a "header" column and do not diff it.
-                        dchunks = [bchunks[0]] + [diff_tokens(b, a) for b, a in zip(bchunks[1:], achunks[1:])]
-                    else:
-                        dchunks = [diff_tokens(b, a) for b, a in zip(bchunks, achunks)]
-                    dfh.write(''.join(dchunks))
+
+def _diff_sysfs_dirs(before, after, result, differ=None, prefix=''):
+    """
+    Writes diffs of the files under the ``before`` directory and their counterparts
+    under ``after`` to the ``result`` directory. Files are recorded by the
+    ``SysfsDiffer`` (a new one, unless one is specified) under their path relative
+    to ``before``, joined onto ``prefix``. Returns the ``SysfsDiffer``.
+
+    """
+    if differ is None:
+        differ = SysfsDiffer()
+    for dirname, _, names in os.walk(before):
+        for name in names:
+            bfile = os.path.join(dirname, name)
+            if not os.path.isfile(bfile):
+                continue
+            relpath = os.path.relpath(bfile, before)
+            afile = os.path.join(after, relpath)
+            if not os.path.isfile(afile):
+                logger.debug('sysfs_diff: {} does not exist or is not a file'.format(afile))
+                continue
+            with open(bfile) as bfh, open(afile) as afh:  # pylint: disable=C0321
+                bvalue, avalue = bfh.read(), afh.read()
+            path = '/'.join([prefix.rstrip('/')] + relpath.split(os.sep)) if prefix else relpath
+            with open(_f(os.path.join(result, relpath)), 'w') as dfh:
+                dfh.write(differ.diff(path, bvalue, avalue))
+    return differ
+
+
+def _read_sysfs_manifest(filepath):
+    """
+    Parses a manifest created by ``SysfsExtractor.manifest_command`` into an
+    ``OrderedDict`` mapping device file paths to their contents.
+
+    """
+    with open(filepath) as fh:
+        text = fh.read()
+    # Each file is preceded by a header line; tail also separates files with a
+    # newline, which is consumed along with the following header.
+    parts = MANIFEST_HEADER_REGEX.split(text)
+    manifest = OrderedDict()
+    for path, value in izip(parts[1::2], parts[2::2]):
+        if path != '/dev/null':
+            manifest[path] = value
+    return manifest
+
+
+def _diff_sysfs_manifests(before, after, result, sep='/', differ=None):
+    """
+    Writes diffs of the values in the ``before`` and ``after`` manifests (as returned
+    by ``_read_sysfs_manifest``) to files under the ``result`` directory, laid out
+    the same way as their device paths (using ``sep`` as the device path separator).
+    Returns the ``SysfsDiffer`` used (a new one, unless one is specified).
+
+    """
+    if differ is None:
+        differ = SysfsDiffer()
+    for path, bvalue in before.iteritems():
+        avalue = after.get(path)
+        if avalue is None:
+            logger.debug('sysfs_diff: {} is not in the after manifest'.format(path))
+            continue
+        dfile = os.path.join(result, as_relative(path.replace(sep, os.sep)))
+        with open(_f(dfile), 'w') as dfh:
+            dfh.write(differ.diff(path, bvalue, avalue))
+    return differ
@@ -17,21 +17,51 @@
 # pylint: disable=W0613,E1101,W0201
 import os
 import re
+import csv
+import math
+import time
 import itertools
+import subprocess
+from collections import OrderedDict, defaultdict
 
 
 from wlauto import Instrument, Executable, Parameter
-from wlauto.exceptions import ConfigError
-from wlauto.utils.misc import ensure_file_directory_exists as _f
+from wlauto.exceptions import ConfigError, InstrumentError
+from wlauto.utils.misc import ensure_file_directory_exists as _f, which
 from wlauto.utils.types import list_or_string, list_of_strs
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 PERF_COMMAND_TEMPLATE = '{} stat {} {} sleep 1000 > {} 2>&1 '
+PERF_RECORD_COMMAND_TEMPLATE = '{} record {} {} -o {} sleep 1000 > {} 2>&1 '
+PERF_SCRIPT_COMMAND_TEMPLATE = '{} script -i {} > {} 2>/dev/null'
 
 DEVICE_RESULTS_FILE = '/data/local/perf_results.txt'
 HOST_RESULTS_FILE_BASENAME = 'perf.txt'
 
 PERF_COUNT_REGEX = re.compile(r'^(CPU\d+)?\s*(\d+)\s*(.*?)\s*(\[\s*\d+\.\d+%\s*\])?\s*$')
 
+# In interval mode, perf's output is in CSV (with this separator), as that is
+# much more straight-forward to parse than the human-readable format.
+INTERVAL_OPTIONS_TEMPLATE = '-I {} -x {}'
+INTERVAL_SEPARATOR = ','
+
+# perf script output: a header line for each sample, followed (if call graphs
+# were recorded) by a line for each frame of the stack, leaf first, e.g. ::
+#
+#     surfaceflinger   412/415  [002]  1234.567890:     250000 cpu-clock:
+#                 ffffffc0000864b4 __do_softirq+0x114 ([kernel.kallsyms])
+#                 0000007f8a6c1b20 [unknown] (/system/lib64/libc.so)
+#
+SAMPLE_HEADER_REGEX = re.compile(r'^(?P<comm>\S.*?)\s+-?\d+(?:/\d+)?\s+(?:\[\d+\]\s+)?\d+\.\d+:\s*(?P<rest>.*)$')
+FRAME_REGEX = re.compile(r'\s*(?P<address>[0-9a-f]+)\s+(?P<symbol>.+?)\s+\((?P<dso>[^()]*)\)\s*$')
+# Without call graphs, the sampled frame follows the (optional period and) event.
+HEADER_FRAME_REGEX = re.compile(r'^(?:\d+\s+)?\S+:\s+(?P<frame>\S.*)$')
+SYMBOL_OFFSET_REGEX = re.compile(r'\+0x[0-9a-f]+$')
+
 
 class PerfInstrument(Instrument):
 
@@ -65,6 +95,24 @@ class PerfInstrument(Instrument):
     Options can be obtained by running the following in the command line ::
 
         man perf-record
+
+    If ``interval`` is specified, counters are also sampled periodically (using
+    ``perf stat -I``). The values for each interval are written, for each label,
+    to ``perf/<label>_intervals.csv`` (and ``.npz``, if numpy is installed), with
+    a column for each event (on each CPU, if per-CPU counts were requested with
+    ``-A``), and the mean, 95th percentile and maximum of each counter's
+    per-interval values are reported as metrics alongside its total.
+
+    If ``mode`` is ``"record"``, rather than counting events, perf samples the
+    stacks of running processes during each iteration (using ``perf record``).
+    The samples are converted to text with ``perf script`` (on the device or on
+    the host, depending on ``script_location``) and aggregated into
+    ``perf/<label>.folded``, which has a line for each distinct stack, in the
+    format expected by FlameGraph's ``flamegraph.pl``. The proportions of samples
+    in the ``top`` symbols and DSOs (i.e. the ones in which most samples were
+    taken) are reported as metrics. ``events`` are not used in this mode; perf
+    samples its default event (usually CPU cycles), unless another is specified
+    in ``optionstring``.
     """
 
     parameters = [
@@ -88,6 +136,39 @@ class PerfInstrument(Instrument):
                   description="""
                   always install perf binary even if perf is already present on the device.
                   """),
+        Parameter('interval', kind=int, default=None,
+                  constraint=(lambda x: x >= 10, 'must be at least 10 (ms)'),
+                  description="""
+                  If specified, counters will be sampled every ``interval`` milliseconds, and
+                  the per-interval values will be reported as well as the totals. This
+                  requires a version of perf that supports ``perf stat -I``.
+                  """),
+        Parameter('mode', default='stat', allowed_values=['stat', 'record'],
+                  description="""
+                  ``"stat"`` counts ``events`` using ``perf stat``; ``"record"`` samples
+                  stacks using ``perf record`` (see above).
+                  """),
+        Parameter('frequency', kind=int, default=99,
+                  description="""
+                  The frequency (in Hz) at which stacks are sampled in ``"record"`` mode.
+                  """),
+        Parameter('call_graph', kind=bool, default=True,
+                  description="""
+                  Record call graphs in ``"record"`` mode (``perf record -g``). If this is
+                  ``False``, only the sampled function is recorded.
+                  """),
+        Parameter('script_location', default='device', allowed_values=['device', 'host'],
+                  description="""
+                  Where to run ``perf script`` in ``"record"`` mode. On the device, symbols
+                  are resolved against the device's binaries, and the (text) output is
+                  pulled. On the host, ``perf.data`` is pulled instead, and a host ``perf``
+                  must be in ``PATH`` (and able to find the device's symbols, e.g. via
+                  ``~/.debug``).
+                  """),
+        Parameter('top', kind=int, default=10,
+                  description="""
+                  The number of symbols and DSOs reported as metrics in ``"record"`` mode.
+                  """),
     ]
 
     def on_run_init(self, context):
@@ -110,12 +191,20 @@ class PerfInstrument(Instrument):
         self.device.killall('sleep', as_root=as_root)
 
     def update_result(self, context):
+        if self.mode == 'record':
+            self._wait_for_perf()
+            for label in self.labels:
+                self._process_samples(context, label)
+            return
         for label in self.labels:
             device_file = self._get_device_outfile(label)
             host_relpath = os.path.join('perf', os.path.basename(device_file))
             host_file = _f(os.path.join(context.output_directory, host_relpath))
             self.device.pull_file(device_file, host_file)
             context.add_iteration_artifact(label, kind='raw', path=host_relpath)
+            if self.interval:
+                self._process_intervals(context, label, host_file)
+                continue
             with open(host_file) as fh:
                 in_results_section = False
                 for line in fh:
@@ -138,6 +227,81 @@ class PerfInstrument(Instrument):
                                 metric = '{}_{}'.format(label, match.group(3))
                                 context.result.add_metric(metric, count, classifiers=classifiers)
 
+    def _process_intervals(self, context, label, host_file):
+        with open(host_file) as fh:
+            series = parse_interval_output(fh, INTERVAL_SEPARATOR)
+        if not series.times:
+            self.logger.warning('No interval counts found in {}'.format(host_file))
+            return
+
+        csv_relpath = os.path.join('perf', '{}_intervals.csv'.format(label))
+        with open(os.path.join(context.output_directory, csv_relpath), 'wb') as wfh:
+            series.write_csv(wfh)
+        context.add_iteration_artifact('{}_intervals'.format(label), kind='data', path=csv_relpath)
+        if np is not None:
+            npz_relpath = os.path.join('perf', '{}_intervals.npz'.format(label))
+            series.write_npz(os.path.join(context.output_directory, npz_relpath))
+            context.add_iteration_artifact('{}_intervals_npz'.format(label), kind='data', path=npz_relpath)
+
+        for cpu, event, stats in series.iter_stats():
+            classifiers = {'cpu': cpu} if cpu is not None else {}
+            metric = '{}_{}'.format(label, event)
+            context.result.add_metric(metric, stats.total, classifiers=classifiers)
+            context.result.add_metric(metric + '_mean', stats.mean, classifiers=classifiers)
+            context.result.add_metric(metric + '_p95', stats.p95, classifiers=classifiers)
+            context.result.add_metric(metric + '_max', stats.max, classifiers=classifiers)
+
+    def _wait_for_perf(self, timeout=60):
+        # perf record writes out its data after its workload (sleep) is killed,
+        # which may take a while for large captures.
+        end_time = time.time() + timeout
+        while self.device.get_pids_of(os.path.basename(self.binary)):
+            if time.time() > end_time:
+                self.logger.warning('perf did not exit; samples may be incomplete')
+                break
+            time.sleep(0.5)
+
+    def _process_samples(self, context, label):
+        device_data_file = self._get_device_datafile(label)
+        if self.script_location == 'device':
+            device_script_file = self._get_device_scriptfile(label)
+            self.device.execute(PERF_SCRIPT_COMMAND_TEMPLATE.format(self.binary, device_data_file,
+                                                                    device_script_file),
+                                timeout=600, check_exit_code=False)
+            host_script_file = _f(os.path.join(context.output_directory, 'perf',
+                                               os.path.basename(device_script_file)))
+            self.device.pull_file(device_script_file, host_script_file)
+            with open(host_script_file) as fh:
+                aggregator = FoldedStackAggregator().update(fh).finalize()
+            os.remove(host_script_file)
+        else:
+            host_data_relpath = os.path.join('perf', os.path.basename(device_data_file))
+            host_data_file = _f(os.path.join(context.output_directory, host_data_relpath))
+            self.device.pull_file(device_data_file, host_data_file)
+            context.add_iteration_artifact('{}_data'.format(label), kind='raw', path=host_data_relpath)
+            with open(os.devnull, 'w') as devnull:
+                process = subprocess.Popen(['perf', 'script', '-i', host_data_file],
+                                           stdout=subprocess.PIPE, stderr=devnull)
+                aggregator = FoldedStackAggregator().update(process.stdout).finalize()
+            if process.wait():
+                raise InstrumentError('perf script failed on {}'.format(host_data_file))
+
+        if not aggregator.total:
+            self.logger.warning('No samples found for {}'.format(label))
+            return
+        folded_relpath = os.path.join('perf', '{}.folded'.format(label))
+        with open(os.path.join(context.output_directory, folded_relpath), 'w') as wfh:
+            aggregator.write_folded(wfh)
+        context.add_iteration_artifact('{}_folded'.format(label), kind='data', path=folded_relpath)
+
+        context.result.add_metric('{}_samples'.format(label), aggregator.total)
+        for rank, ((symbol, dso), count) in enumerate(aggregator.get_top_symbols(self.top), 1):
+            context.result.add_metric('{}_symbol'.format(label), 100.0 * count / aggregator.total, 'percent',
+                                      classifiers={'rank': rank, 'symbol': symbol, 'dso': dso})
+        for rank, (dso, count) in enumerate(aggregator.get_top_dsos(self.top), 1):
+            context.result.add_metric('{}_dso'.format(label), 100.0 * count / aggregator.total, 'percent',
+                                      classifiers={'rank': rank, 'dso': dso})
+
     def teardown(self, context):  # pylint: disable=R0201
         self._clean_device()
 
@@ -154,6 +318,11 @@ class PerfInstrument(Instrument):
             self.labels = ['perf_{}'.format(i) for i in xrange(len(self.optionstrings))]
         if len(self.labels) != len(self.optionstrings):
             raise ConfigError('The number of labels must match the number of optstrings provided for perf.')
+        if self.mode == 'record':
+            if self.interval:
+                raise ConfigError('interval cannot be used in "record" mode.')
+            if self.script_location == 'host' and not which('perf'):
+                raise InstrumentError('perf not in PATH; cannot run perf script on the host.')
 
     def _build_commands(self):
         events = itertools.cycle(self.events)
@@ -164,16 +333,247 @@ class PerfInstrument(Instrument):
 
     def _clean_device(self):
         for label in self.labels:
-            filepath = self._get_device_outfile(label)
-            self.device.delete_file(filepath)
+            self.device.delete_file(self._get_device_outfile(label))
+            if self.mode == 'record':
+                self.device.delete_file(self._get_device_datafile(label))
+                self.device.delete_file(self._get_device_scriptfile(label))
 
     def _get_device_outfile(self, label):
         return self.device.path.join(self.device.working_directory, '{}.out'.format(label))
 
+    def _get_device_datafile(self, label):
+        return self.device.path.join(self.device.working_directory, '{}.data'.format(label))
+
+    def _get_device_scriptfile(self, label):
+        return self.device.path.join(self.device.working_directory, '{}.script'.format(label))
+
     def _build_perf_command(self, options, events, label):
+        if self.mode == 'record':
+            record_options = '-F {} {}'.format(self.frequency, '-g' if self.call_graph else '')
+            return PERF_RECORD_COMMAND_TEMPLATE.format(self.binary,
+                                                       options or '',
+                                                       record_options,
+                                                       self._get_device_datafile(label),
+                                                       self._get_device_outfile(label))
         event_string = ' '.join(['-e {}'.format(e) for e in events])
+        if self.interval:
+            interval_options = INTERVAL_OPTIONS_TEMPLATE.format(self.interval, INTERVAL_SEPARATOR)
+            options = '{} {}'.format(interval_options, options or '')
         command = PERF_COMMAND_TEMPLATE.format(self.binary,
                                                options or '',
                                                event_string,
                                                self._get_device_outfile(label))
         return command
+
+
+class IntervalStats(object):
+
+    __slots__ = ['total', 'mean', 'p95', 'max']
+
+    def __init__(self, values):
+        values = sorted(values)
+        self.total = sum(values)
+        self.mean = float(self.total) / len(values) if values else None
+        # nearest-rank percentile
+        self.p95 = values[int(math.ceil(0.95 * len(values))) - 1] if values else None
+        self.max = values[-1] if values else None
+
+
+class PerfIntervalSeries(object):
+    """
+    Counter values collected by ``perf stat -I``. ``times`` are the (relative)
+    times at the ends of the intervals, in seconds, and ``columns`` maps
+    ``(cpu, event)`` (where ``cpu`` is ``None`` for counts aggregated across
+    CPUs) to a list with the counter's value for each interval (or ``None`` if it
+    was not counted in that interval).
+
+    """
+
+    def __init__(self):
+        self.times = []
+        self.columns = OrderedDict()
+
+    def add(self, timestamp, cpu, event, value):
+        if not self.times or self.times[-1] != timestamp:
+            self.times.append(timestamp)
+        column = self.columns.setdefault((cpu, event), [])
+        column.extend([None] * (len(self.times) - 1 - len(column)))
+        column.append(value)
+
+    def iter_columns(self):
+        """Yields ``(cpu, event, values)``, with ``values`` padded to the number of intervals."""
+        for (cpu, event), values in self.columns.iteritems():
+            yield cpu, event, values + [None] * (len(self.times) - len(values))
+
+    def iter_stats(self):
+        """Yields ``(cpu, event, IntervalStats)`` for each counter."""
+        for cpu, event, values in self.iter_columns():
+            values = [v for v in values if v is not None]
+            if values:
+                yield cpu, event, IntervalStats(values)
+
+    def get_column_names(self):
+        return ['{}_{}'.format(cpu, event) if cpu is not None else event
+                for cpu, event in self.columns]
+
+    def write_csv(self, wfh):
+        writer = csv.writer(wfh)
+        writer.writerow(['time'] + self.get_column_names())
+        columns = [values for _, _, values in self.iter_columns()]
+        for i, timestamp in enumerate(self.times):
+            writer.writerow([timestamp] + ['' if c[i] is None else c[i] for c in columns])
+
+    def write_npz(self, filepath):
+        """
+        Writes the series as ``times`` and ``values`` arrays (with a column for each
+        of ``columns``, and ``NaN`` for counters not counted in an interval) to a
+        numpy ``.npz`` archive.
+
+        """
+        values = np.array([[np.nan if v is None else v for v in values]
+                           for _, _, values in self.iter_columns()], dtype=np.float64)
+        np.savez(filepath, times=np.array(self.times), values=values.T,
+                 columns=np.array(self.get_column_names()))
+
+
+class FoldedStackAggregator(object):
+    """
+    Aggregates the samples in ``perf script`` output into "folded" stacks (i.e.
+    the command name and the frames of the stack from the root, separated by
+    ``;``), counting the samples for each distinct stack, as well as the samples
+    taken in each symbol and DSO (i.e. with it at the leaf of the stack).
+
+    The output is processed a line at a time (see ``update()``), so that it may be
+    streamed rather than read into memory; memory use depends only on the number
+    of distinct stacks.
+
+    """
+
+    def __init__(self):
+        self.stacks = defaultdict(int)
+        self.symbols = defaultdict(int)
+        self.dsos = defaultdict(int)
+        self.total = 0
+        self._comm = None
+        self._frames = []
+
+    def update(self, lines):
+        for line in lines:
+            if line.startswith('\t'):  # frames are indented with a tab
+                match = FRAME_REGEX.match(line)
+                if match and self._comm is not None:
+                    self._frames.append(_get_frame(match))
+                continue
+            # Sample headers may be indented, as perf right-aligns the command name.
+            match = SAMPLE_HEADER_REGEX.match(line.strip())
+            if match:
+                self._end_sample()
+                self._comm = match.group('comm').replace(';', ':')
+                header_match = HEADER_FRAME_REGEX.match(match.group('rest'))
+                frame_match = header_match and FRAME_REGEX.match(header_match.group('frame'))
+                if frame_match:
+                    self._frames.append(_get_frame(frame_match))
+            elif not line.strip():
+                self._end_sample()
+            elif self._comm is not None:  # frames indented with spaces by some versions of perf
+                match = FRAME_REGEX.match(line)
+                if match:
+                    self._frames.append(_get_frame(match))
+        return self
+
+    def finalize(self):
+        self._end_sample()
+        return self
+
+    def get_top_symbols(self, n):
+        """Returns a list of the ``n`` ``((symbol, dso), count)`` with the highest counts."""
+        return sorted(self.symbols.iteritems(), key=lambda x: (-x[1], x[0]))[:n]
+
+    def get_top_dsos(self, n):
+        """Returns a list of the ``n`` ``(dso, count)`` with the highest counts."""
+        return sorted(self.dsos.iteritems(), key=lambda x: (-x[1], x[0]))[:n]
+
+    def write_folded(self, wfh):
+        for stack, count in sorted(self.stacks.iteritems()):
+            wfh.write('{} {}\n'.format(stack, count))
+
+    def _end_sample(self):
+        if self._comm is None:
+            return
+        frames = self._frames
+        if frames:
+            stack = ';'.join([self._comm] + [name for name, _, _ in reversed(frames)])
+            _, symbol, dso = frames[0]
+        else:
+            stack = self._comm
+            symbol, dso = '[unknown]', '[unknown]'
+        self.stacks[stack] += 1
+        self.symbols[(symbol, dso)] += 1
+        self.dsos[dso] += 1
+        self.total += 1
+        self._comm = None
+        self._frames = []
+
+
+def _get_frame(match):
+    """Returns ``(name, symbol, dso)`` for a frame, where ``name`` is used in folded stacks."""
+    symbol = SYMBOL_OFFSET_REGEX.sub('', match.group('symbol'))
+    dso = match.group('dso')
+    if symbol == '[unknown]':
+        name = dso if dso.startswith('[') else '[{}]'.format(os.path.basename(dso))
+    else:
+        name = symbol.replace(';', ':')
+    return name, symbol, dso
+
+
+def parse_interval_output(lines, sep=INTERVAL_SEPARATOR):
+    """
+    Parses the CSV output of ``perf stat -I <ms> -x <sep>`` (optionally with
+    ``-A``) into a ``PerfIntervalSeries``. Each line is of the form ::
+
+        <time>[,CPU<n>],<count>,<unit>,<event>[,...]
+
+    (older versions of perf do not output the ``<unit>`` field). Lines that are not
+    in this form (e.g. comments) and counters that could not be counted are skipped.
+
+    """
+    series = PerfIntervalSeries()
+    for line in lines:
+        fields = line.strip().split(sep)
+        if len(fields) < 3 or line.startswith('#'):
+            continue
+        try:
+            timestamp = float(fields[0])
+        except ValueError:
+            continue
+        if fields[1].startswith('CPU'):
+            cpu = int(fields[1][3:])
+            fields = fields[2:]
+        else:
+            cpu = None
+            fields = fields[1:]
+        if len(fields) > 2 and not _is_number(fields[2]):
+            event = fields[2]
+        else:
+            event = fields[1]
+        try:
+            value = _to_number(fields[0])
+        except ValueError:  # e.g. "<not counted>"
+            continue
+        series.add(timestamp, cpu, event, value)
+    return series
+
+
+def _to_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
@@ -87,10 +87,10 @@ class FilePoller(Instrument):
 
     def update_result(self, context):
         host_output_file = os.path.join(context.output_directory, 'poller.csv')
-        self.device.pull_file(self.target_output_path, host_output_file)
-        context.add_artifact('poller_output', host_output_file, kind='data')
         host_log_file = os.path.join(context.output_directory, 'poller.log')
-        self.device.pull_file(self.target_log_path, host_log_file)
+        self.device.pull_files([(self.target_output_path, host_output_file),
+                                (self.target_log_path, host_log_file)])
+        context.add_artifact('poller_output', host_output_file, kind='data')
         context.add_artifact('poller_log', host_log_file, kind='log')
 
         with open(host_log_file) as fh:
@@ -17,6 +17,8 @@
 # pylint: disable=W0613,E1101,attribute-defined-outside-init
 from __future__ import division
 import os
+import math
+import array
 import subprocess
 import signal
 import csv
@@ -146,9 +148,22 @@ class ServoPowerMonitor(Instrument):
         self.stopped = True
 
         timestamps = self.data.pop("timestamp")
+        if len(timestamps) > 1:
+            achieved_rate = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+            context.result.add_metric('servo_achieved_sampling_rate', round(achieved_rate, 3), 'Hz')
+        context.result.add_metric('servo_missed_deadlines', self.poller.missed_deadlines,
+                                  lower_is_better=True)
+        if self.poller.failed_samples:
+            context.result.add_metric('servo_failed_samples', self.poller.failed_samples,
+                                      lower_is_better=True)
+
+        # Each sample is taken to hold until the next one; the last one for a
+        # nominal sampling period.
+        intervals = [t2 - t1 for t1, t2 in zip(timestamps, timestamps[1:])]
+        intervals.append(1.0 / self.sampling_rate)
         for channel, data in self.data.iteritems():
             label = self.label_map[channel]
-            data = [float(v) / 1000.0 for v in data]
+            data = [v / 1000.0 for v in data]
             sample_sum = sum(data)
 
             metric_name = '{}_power'.format(label)
@@ -156,15 +171,17 @@ class ServoPowerMonitor(Instrument):
             context.result.add_metric(metric_name, round(power, 3), 'Watts')
 
             metric_name = '{}_energy'.format(label)
-            energy = sample_sum * (1.0 / self.sampling_rate)
+            energy = sum(v * dt for v, dt in zip(data, intervals))
             context.result.add_metric(metric_name, round(energy, 3), 'Joules')
 
         with open(self.outfile, 'wb') as f:
             c = csv.writer(f)
-            headings = ['timestamp'] + ['{}_power'.format(label) for label in self.labels]
+            headings = ['timestamp'] + ['{}_power'.format(self.label_map[channel])
+                                        for channel in self.poller.channels]
             c.writerow(headings)
-            for row in zip(timestamps, *self.data.itervalues()):
-                c.writerow(row)
+            columns = [self.data[channel] for channel in self.poller.channels]
+            for row in zip(timestamps, *columns):
+                c.writerow([datetime.fromtimestamp(row[0])] + list(row[1:]))
 
     def teardown(self, context):
         if not self.stopped:
@@ -205,26 +222,75 @@ class ServoPowerMonitor(Instrument):
 
 
 class PowerPoller(threading.Thread):
+    """
+    Samples all channels from servod at ``sampling_rate``, using a single XML-RPC
+    multicall per sample where servod supports it. Samples are scheduled on
+    absolute deadlines, so the time taken by the calls does not lower the
+    effective rate; deadlines that have already passed by the time a sample
+    completes are skipped and counted in ``missed_deadlines``. Samples for which
+    servod returns an error for any of the channels are dropped and counted in
+    ``failed_samples``.
+
+    """
 
     def __init__(self, host, port, channels, sampling_rate):
         super(PowerPoller, self).__init__()
         self.proxy = xmlrpclib.ServerProxy("http://{}:{}/".format(host, port))
-        self.proxy.get(channels[1])  # Testing connection
+        self.proxy.get(channels[0])  # Testing connection
         self.channels = channels
-        self.data = {channel: [] for channel in channels}
-        self.data['timestamp'] = []
+        self.data = {channel: array.array('d') for channel in channels}
+        self.data['timestamp'] = array.array('d')
         self.period = 1.0 / sampling_rate
+        self.missed_deadlines = 0
+        self.failed_samples = 0
+        self.use_multicall = True
 
         self.term_signal = threading.Event()
         self.term_signal.set()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def run(self):
+        start_time = time.time()
+        next_sample = 0
         while self.term_signal.is_set():
-            self.data['timestamp'].append(str(datetime.now()))
+            timestamp = time.time()
+            try:
+                values = self.get_values()
+            except xmlrpclib.Fault as e:
+                self.logger.warning('Dropping sample: {}'.format(e.faultString))
+                self.failed_samples += 1
+            else:
+                self.data['timestamp'].append(timestamp)
+                for channel, value in zip(self.channels, values):
+                    self.data[channel].append(float(value))
+
+            next_sample += 1
+            now = time.time()
+            deadline = start_time + next_sample * self.period
+            if now > deadline:
+                missed = int(math.ceil((now - deadline) / self.period))
+                self.missed_deadlines += missed
+                next_sample += missed
+                deadline = start_time + next_sample * self.period
+            time.sleep(deadline - now)
+
+    def get_values(self):
+        if self.use_multicall:
+            multicall = xmlrpclib.MultiCall(self.proxy)
             for channel in self.channels:
-                self.data[channel].append(float(self.proxy.get(channel)))
-            time.sleep(self.period)
+                multicall.get(channel)
+            try:
+                results = multicall()
+            except xmlrpclib.Fault as e:
+                # system.multicall itself is missing or was rejected.
+                self.logger.debug('Multicall not supported by servod ({}); '
+                                  'falling back to individual calls.'.format(e.faultString))
+                self.use_multicall = False
+            else:
+                # A fault for an individual channel is raised when its result
+                # is read; it does not mean that multicall is not supported.
+                return tuple(results)
+        return [self.proxy.get(channel) for channel in self.channels]
 
     def stop(self):
         self.term_signal.clear()
@@ -13,13 +13,82 @@
 # limitations under the License.
 #
 # pylint: disable=attribute-defined-outside-init
+import os
 import logging
+import tempfile
+from collections import namedtuple
 
 import wlauto.core.signal as signal
 from wlauto import Module, Parameter
 from wlauto.utils.misc import list_to_ranges, isiterable
 
 
+# Task IDs are passed to the device in chunks of this many, to keep the length
+# of commands within what adb can handle.
+MAX_TASKS_PER_COMMAND = 500
+
+# Moves tasks into a cgroup, printing "+<tid>" for each task that was moved and
+# "-<tid>" for each task that could not be (e.g. kernel threads). The script is
+# pushed to the device and run as
+#
+#     sh wa_migrate_tasks.sh BUSYBOX DEST PATTERNS SOURCE...
+#
+# where BUSYBOX is the busybox binary (or "-" to use the device's tools), DEST is
+# the tasks file of the destination cgroup, PATTERNS is a file with the regex
+# that the comm of the tasks must match (or "-" to move all tasks), and each
+# SOURCE is either a task ID or the path of a tasks file to read them from. This
+# way, the command line only holds paths and numbers, and nothing in it is
+# expanded by the shells it passes through (e.g. on the host, for adb).
+MIGRATE_TASKS_SCRIPT_NAME = 'wa_migrate_tasks.sh'
+MIGRATE_TASKS_SCRIPT = """\
+bb=$1; dest=$2; patterns=$3; shift 3
+[ "$bb" = - ] && bb=
+tasks=
+for source in "$@"; do
+    case "$source" in
+        /*) tasks="$tasks $(cat "$source")";;
+        *) tasks="$tasks $source";;
+    esac
+done
+if [ "$patterns" != - ]; then
+    matching=" $($bb grep -E -l -f "$patterns" /proc/[0-9]*/task/[0-9]*/comm 2>/dev/null |
+                $bb cut -d/ -f5 | $bb tr '\\n' ' ') "
+fi
+for tid in $tasks; do
+    if [ "$patterns" != - ]; then
+        case "$matching" in *" $tid "*) ;; *) continue;; esac
+    fi
+    if { echo $tid > "$dest"; } 2>/dev/null; then echo "+$tid"; else echo "-$tid"; fi
+done
+"""
+MIGRATE_TASKS_PATTERNS_NAME = 'wa_migrate_tasks.regex'
+
+TaskMigrationResult = namedtuple('TaskMigrationResult', ['moved', 'failed'])
+
+
+def get_migrate_tasks_command(script, dest_tasks_file, sources, patterns_file=None, busybox='busybox'):
+    """
+    Returns the command that runs the task migration script (see
+    ``MIGRATE_TASKS_SCRIPT``) on the device to move the tasks in ``sources`` (task
+    IDs and/or tasks files) into the cgroup with the specified ``tasks`` file.
+
+    """
+    return '{} sh {} {} {} {} {}'.format(busybox, script, busybox or '-', dest_tasks_file,
+                                         patterns_file or '-', ' '.join(map(str, sources))).strip()
+
+
+def parse_migrate_tasks_output(output):
+    moved, failed = [], []
+    for line in output.split():
+        if not line[1:].isdigit():
+            continue  # e.g. an error message from su
+        if line[0] == '+':
+            moved.append(int(line[1:]))
+        elif line[0] == '-':
+            failed.append(int(line[1:]))
+    return TaskMigrationResult(moved, failed)
+
+
 class CgroupController(object):
 
     kind = 'cpuset'
@@ -83,9 +152,21 @@ class CpusetGroup(object):
         task_ids = self.device.get_sysfile_value(self.tasks_file).split()
         return map(int, task_ids)
 
-    def add_tasks(self, tasks):
-        for tid in tasks:
-            self.add_task(tid)
+    def add_tasks(self, tasks, comm_regex=None):
+        """
+        Moves the specified tasks (those whose ``comm`` matches ``comm_regex``, if
+        specified) into this group, and returns a ``TaskMigrationResult`` with the
+        lists of IDs of the tasks that were moved and of those that could not be.
+
+        """
+        tasks = map(str, tasks)
+        moved, failed = [], []
+        for i in xrange(0, len(tasks), MAX_TASKS_PER_COMMAND):
+            result = self.controller.migrate_tasks(self.tasks_file, tasks[i:i + MAX_TASKS_PER_COMMAND],
+                                                   comm_regex)
+            moved.extend(result.moved)
+            failed.extend(result.failed)
+        return TaskMigrationResult(moved, failed)
 
     def add_task(self, tid):
         self.device.set_sysfile_value(self.tasks_file, tid, verify=False)
@@ -96,9 +177,11 @@ class CpusetController(CgroupController):
     def __init__(self, *args, **kwargs):
         super(CpusetController, self).__init__(*args, **kwargs)
         self.groups = {}
+        self._migrate_script = None
 
     def mount(self, device, mount_root):
         super(CpusetController, self).mount(device, mount_root)
+        self._migrate_script = None
         self.create_group('root', self.device.online_cpus, 0)
 
     def create_group(self, name, cpus, mems):
@@ -108,24 +191,59 @@ class CpusetController(CgroupController):
             raise ValueError('Group {} already exists'.format(name))
         self.groups[name] = CpusetGroup(self, name, cpus, mems)
 
-    def move_tasks(self, source, dest):
+    def move_tasks(self, source, dest, comm_regex=None):
+        """
+        Moves the tasks in the ``source`` group (only those whose ``comm`` matches
+        ``comm_regex``, if specified) into the ``dest`` group with a single command.
+        ``source`` may also be a list of groups. Returns a ``TaskMigrationResult``.
+
+        """
+        sources = [source] if isinstance(source, basestring) else source
         try:
-            source_group = self.groups[source]
+            source_files = [self.groups[s].tasks_file for s in sources]
             dest_group = self.groups[dest]
-            command = 'for task in $(cat {}); do echo $task>{}; done'
-            self.device.execute(command.format(source_group.tasks_file, dest_group.tasks_file),
-                                # this will always fail as some of the tasks
-                                # are kthreads that cannot be migrated, but we
-                                # don't care about those, so don't check exit
-                                # code.
-                                check_exit_code=False, as_root=True)
         except KeyError as e:
             raise ValueError('Unkown group: {}'.format(e))
-
-    def move_all_tasks_to(self, target_group):
-        for group in self.groups:
-            if group != target_group:
-                self.move_tasks(group, target_group)
+        # Some of the tasks are kthreads that cannot be migrated; these are
+        # reported in the result rather than treated as errors.
+        result = self.migrate_tasks(dest_group.tasks_file, source_files, comm_regex)
+        self.logger.debug('Moved {} tasks to {}; {} could not be moved'.format(len(result.moved), dest,
+                                                                               len(result.failed)))
+        return result
+
+    def migrate_tasks(self, dest_tasks_file, sources, comm_regex=None):
+        """
+        Moves the tasks in ``sources`` (task IDs and/or tasks files) into the
+        cgroup with the specified ``tasks`` file, with a single command, and
+        returns a ``TaskMigrationResult``.
+
+        """
+        patterns_file = None
+        if comm_regex:
+            patterns_file = self.device.path.join(self.device.working_directory, MIGRATE_TASKS_PATTERNS_NAME)
+            self._push_text(comm_regex + '\n', patterns_file)
+        if self._migrate_script is None:
+            script = self.device.path.join(self.device.working_directory, MIGRATE_TASKS_SCRIPT_NAME)
+            self._push_text(MIGRATE_TASKS_SCRIPT, script)
+            self._migrate_script = script
+        command = get_migrate_tasks_command(self._migrate_script, dest_tasks_file, sources,
+                                            patterns_file, self.device.busybox)
+        return parse_migrate_tasks_output(self.device.execute(command, check_exit_code=False, as_root=True))
+
+    def _push_text(self, text, dest):
+        fd, host_file = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as wfh:
+                wfh.write(text)
+            self.device.push_file(host_file, dest)
+        finally:
+            os.remove(host_file)
+
+    def move_all_tasks_to(self, target_group, comm_regex=None):
+        sources = [group for group in self.groups if group != target_group]
+        if not sources:
+            return TaskMigrationResult([], [])
+        return self.move_tasks(sources, target_group, comm_regex)
 
     def __getattr__(self, name):
         try:
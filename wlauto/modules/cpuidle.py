@@ -13,11 +13,36 @@
 # limitations under the License.
 #
 # pylint: disable=attribute-defined-outside-init
+import re
+from collections import OrderedDict
+
 import wlauto.core.signal as signal
 from wlauto import Module
 from wlauto.exceptions import DeviceError
 
 
+SNAPSHOT_LINE_REGEX = re.compile(r'^(cpu\d+)/cpuidle/(state\d+)/(\w+):(.*)$')
+
+
+def parse_cpuidle_snapshot(text):
+    """
+    Parses the output of the command returned by ``Cpuidle.get_cpuidle_snapshot_command``
+    into a dict mapping CPUs (e.g. ``"cpu0"``) to dicts mapping their idle states (e.g.
+    ``"state1"``, ordered by index) to dicts of attribute values. Lines in other formats
+    are ignored.
+
+    """
+    snapshot = OrderedDict()
+    for line in text.splitlines():
+        match = SNAPSHOT_LINE_REGEX.match(line.strip())
+        if match:
+            cpu, state, attribute, value = match.groups()
+            snapshot.setdefault(cpu, {}).setdefault(state, {})[attribute] = value
+    for cpu, states in snapshot.iteritems():
+        snapshot[cpu] = OrderedDict(sorted(states.iteritems(), key=lambda x: int(x[0][5:])))
+    return snapshot
+
+
 class CpuidleState(object):
 
     @property
@@ -45,16 +70,18 @@ class CpuidleState(object):
                 raise ValueError('invalid idle state name: "{}"'.format(self.id))
         return int(self.id[i:])
 
-    def __init__(self, device, index, path):
+    def __init__(self, device, index, path, values=None):
         self.device = device
         self.index = index
         self.path = path
         self.id = self.device.path.basename(self.path)
         self.cpu = self.device.path.basename(self.device.path.dirname(path))
-        self.desc = self.get('desc')
-        self.name = self.get('name')
-        self.latency = self.get('latency')
-        self.power = self.get('power')
+        if values is None:
+            values = {attr: self.get(attr) for attr in ['desc', 'name', 'latency', 'power']}
+        self.desc = values.get('desc')
+        self.name = values.get('name')
+        self.latency = values.get('latency')
+        self.power = values.get('power')
 
     def get(self, prop):
         property_path = self.device.path.join(self.path, prop)
@@ -104,6 +131,10 @@ class Cpuidle(Module):
         if isinstance(cpu, int):
             cpu = 'cpu{}'.format(cpu)
         states_dir = self.device.path.join(self.device.path.dirname(self.root_path), cpu, 'cpuidle')
+        if getattr(self.device, 'busybox', None):
+            snapshot = self.get_cpuidle_snapshot(cpu, ['desc', 'name', 'latency', 'power'])
+            return [CpuidleState(self.device, int(state[5:]), self.device.path.join(states_dir, state), values)
+                    for state, values in snapshot.get(cpu, {}).iteritems()]
         idle_states = []
         for state in self.device.listdir(states_dir):
             if state.startswith('state'):
@@ -111,6 +142,34 @@ class Cpuidle(Module):
                 idle_states.append(CpuidleState(self.device, index, self.device.path.join(states_dir, state)))
         return idle_states
 
+    def get_cpuidle_snapshot_command(self, cpu=None, attributes=None):
+        """
+        Returns a command that outputs the specified ``attributes`` (e.g. ``"usage"``;
+        all attributes if not specified) of all idle states of the specified CPU (all
+        CPUs if not specified), with each value prefixed by the path to the file it
+        was read from. Requires busybox.
+
+        """
+        if cpu is None:
+            cpu = 'cpu*'
+        elif isinstance(cpu, int):
+            cpu = 'cpu{}'.format(cpu)
+        files = ' '.join('{}/cpuidle/state*/{}'.format(cpu, attr) for attr in (attributes or ['*']))
+        return 'cd {} && {} grep -H \'\' {} 2>/dev/null'.format(self.device.path.dirname(self.root_path),
+                                                                self.device.busybox, files)
+
+    def get_cpuidle_snapshot(self, cpu=None, attributes=None):
+        """
+        Reads the specified ``attributes`` (all of them if not specified) of the idle
+        states of the specified CPU (all CPUs if not specified) with a single command.
+        Returns a dict mapping CPUs (e.g. ``"cpu0"``) to dicts mapping their idle
+        states (e.g. ``"state1"``) to dicts of attribute values.
+
+        """
+        command = self.get_cpuidle_snapshot_command(cpu, attributes)
+        output = self.device.execute(command, as_root=self.device.is_rooted, check_exit_code=False)
+        return parse_cpuidle_snapshot(output)
+
     def _on_device_init(self, context):  # pylint: disable=unused-argument
         if not self.device.file_exists(self.root_path):
             raise DeviceError('Device kernel does not appear to have cpuidle enabled.')
@@ -15,17 +15,21 @@
 
 # pylint: disable=attribute-defined-outside-init
 import os
+import json
 import time
 import tarfile
-import tempfile
 import shutil
 
-from wlauto import Module
+from wlauto import Module, Parameter, settings
+from wlauto.core import profiling
 from wlauto.exceptions import ConfigError, DeviceError
-from wlauto.utils.android import fastboot_flash_partition, fastboot_command
+from wlauto.utils.android import fastboot_flash_partition, fastboot_command, fastboot_list_devices
+from wlauto.utils.assets import get_asset_index, save_asset_indexes
 from wlauto.utils.serial_port import open_serial_connection
 from wlauto.utils.uefi import UefiMenu
 from wlauto.utils.misc import merge_dicts
+from wlauto.utils.misc import ensure_file_directory_exists as _f
+from wlauto.utils.types import list_of_strings
 
 
 class Flasher(Module):
@@ -74,23 +78,70 @@ class FastbootFlasher(Flasher):
         kernel zImage-dtb
         ramdisk ramdisk_image
 
+    Extracted bundles are cached (keyed by the bundle's SHA256 hash) under
+    ``<environment_root>/__flash_cache``, along with a record, for each device, of
+    the hash of the image each partition was last flashed with. If
+    ``skip_unchanged`` is enabled, partitions listed in ``skippable_partitions``
+    whose image has not changed since they were last flashed are skipped, and
+    the time that saved is reported.
+
     """
 
     delay = 0.5
+    poll_period = 0.2
     serial_timeout = 30
     partitions_file_name = 'partitions.txt'
 
+    parameters = [
+        Parameter('skip_unchanged', kind=bool, default=False,
+                  description="""
+                  Do not flash partitions that were last flashed (by this flasher, on this
+                  device) with an identical image. Only enable this if the device is not
+                  flashed by other means.
+                  """),
+        Parameter('skippable_partitions', kind=list_of_strings,
+                  default=['boot', 'kernel', 'ramdisk', 'dtb', 'recovery', 'bootloader', 'radio'],
+                  description="""
+                  Partitions that may be skipped when ``skip_unchanged`` is enabled. These
+                  must not be written to by the device, as the image last flashed is not
+                  then a record of their contents; partitions such as ``system``,
+                  ``userdata`` and ``cache`` are always flashed.
+                  """),
+    ]
+
     def flash(self, image_bundle=None, images=None):
         self.prelude_done = False
+        cache = FlashCache()
         to_flash = {}
         if image_bundle:  # pylint: disable=access-member-before-definition
             image_bundle = expand_path(image_bundle)
-            to_flash = self._bundle_to_images(image_bundle)
+            to_flash = self._bundle_to_images(image_bundle, cache)
         to_flash = merge_dicts(to_flash, images or {}, should_normalize=False)
+        record = cache.get_device_record(getattr(self.owner, 'adb_name', None) or self.owner.name)
+        saved = 0
         for partition, image_path in to_flash.iteritems():
+            image_path = expand_path(image_path)
+            image_hash = cache.get_image_hash(image_path)
+            last_flashed = record.get(partition)
+            if (self.skip_unchanged and partition in self.skippable_partitions and
+                    last_flashed and last_flashed['sha256'] == image_hash):
+                message = 'Skipping {} (image unchanged); saved ~{:.1f} seconds'
+                self.logger.info(message.format(partition, last_flashed['duration']))
+                profiling.record('flash_skipped', partition, last_flashed['duration'])
+                saved += last_flashed['duration']
+                continue
             self.logger.debug('flashing {}'.format(partition))
-            self._flash_image(self.owner, partition, expand_path(image_path))
-        fastboot_command('reboot')
+            record.invalidate(partition)  # in case flashing does not complete
+            start = time.time()
+            self._flash_image(self.owner, partition, image_path)
+            duration = time.time() - start
+            profiling.record('flash', partition, duration)
+            record.update(partition, image_hash, duration)
+        save_asset_indexes()
+        if saved:
+            self.logger.info('Skipping unchanged partitions saved ~{:.1f} seconds'.format(saved))
+        if self.prelude_done:
+            fastboot_command('reboot')
 
     def _validate_image_bundle(self, image_bundle):
         if not tarfile.is_tarfile(image_bundle):
@@ -100,18 +151,18 @@ class FastbootFlasher(Flasher):
             if not any(pf in files for pf in (self.partitions_file_name, '{}/{}'.format(files[0], self.partitions_file_name))):
                 ConfigError('Image bundle does not contain the required partition file (see documentation)')
 
-    def _bundle_to_images(self, image_bundle):
+    def _bundle_to_images(self, image_bundle, cache):
         """
-        Extracts the bundle to a temporary location and creates a mapping between the contents of the bundle
-        and images to be flushed.
+        Extracts the bundle (unless it has been extracted before) and creates a mapping between the contents
+        of the bundle and images to be flushed.
         """
-        self._validate_image_bundle(image_bundle)
-        extract_dir = tempfile.mkdtemp()
-        with tarfile.open(image_bundle) as tar:
-            tar.extractall(path=extract_dir)
-            files = [tf.name for tf in tar.getmembers()]
-            if self.partitions_file_name not in files:
-                extract_dir = os.path.join(extract_dir, files[0])
+        extract_dir = cache.get_extracted_bundle(image_bundle)
+        if extract_dir is None:
+            self._validate_image_bundle(image_bundle)
+            extract_dir = cache.extract_bundle(image_bundle)
+        if not os.path.isfile(os.path.join(extract_dir, self.partitions_file_name)):
+            with tarfile.open(image_bundle) as tar:
+                extract_dir = os.path.join(extract_dir, tar.next().name)
         partition_file = os.path.join(extract_dir, self.partitions_file_name)
         return get_mapping(extract_dir, partition_file)
 
@@ -119,7 +170,6 @@ class FastbootFlasher(Flasher):
         if not self.prelude_done:
             self._fastboot_prelude(device)
         fastboot_flash_partition(partition, image_path)
-        time.sleep(self.delay)
 
     def _fastboot_prelude(self, device):
         with open_serial_connection(port=device.port,
@@ -132,9 +182,16 @@ class FastbootFlasher(Flasher):
             target.sendline(' ')
             time.sleep(self.delay)
             target.sendline('fast')
-            time.sleep(self.delay)
+        self._wait_for_fastboot()
         self.prelude_done = True
 
+    def _wait_for_fastboot(self):
+        timeout = time.time() + self.serial_timeout
+        while not fastboot_list_devices():
+            if time.time() > timeout:
+                raise DeviceError('Device did not enter fastboot mode within {} seconds'.format(self.serial_timeout))
+            time.sleep(self.poll_period)
+
 
 class VersatileExpressFlasher(Flasher):
 
@@ -210,6 +267,98 @@ class VersatileExpressFlasher(Flasher):
             shutil.copy(src, dest)
 
 
+class FlashCache(object):
+    """
+    Extracted image bundles, keyed by the SHA256 hash of the bundle, and per-device
+    records of the images that have been flashed. Only the ``max_bundles`` most
+    recently used bundles are kept.
+
+    """
+
+    max_bundles = 3
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(settings.environment_root, '__flash_cache')
+
+    def get_extracted_bundle(self, bundle):
+        """Returns the directory the bundle has been extracted to, or ``None`` if it has not been."""
+        extract_dir = self._get_bundle_dir(bundle)
+        if not os.path.isdir(extract_dir):
+            return None
+        os.utime(extract_dir, None)  # mark as recently used
+        return extract_dir
+
+    def extract_bundle(self, bundle):
+        extract_dir = self._get_bundle_dir(bundle)
+        temp_dir = extract_dir + '.tmp'
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        with tarfile.open(bundle) as tar:
+            tar.extractall(path=temp_dir)
+        os.rename(temp_dir, extract_dir)
+        self._prune(keep=extract_dir)
+        return extract_dir
+
+    def get_image_hash(self, path):
+        # The asset index re-stats the file on every lookup, and only reuses
+        # the hash if the file's size, modification time and inode are
+        # unchanged (and it was not modified too shortly before it was hashed
+        # for a change to be detectable), so images rewritten in place are
+        # rehashed.
+        location, name = os.path.split(path)
+        return get_asset_index(location).get_sha256(name)
+
+    def get_device_record(self, device_id):
+        return FlashRecord(os.path.join(self.root, 'devices', '{}.json'.format(device_id.replace(os.sep, '_'))))
+
+    def _get_bundle_dir(self, bundle):
+        return os.path.join(self.root, 'bundles', self.get_image_hash(bundle))
+
+    def _prune(self, keep):
+        bundles_dir = os.path.dirname(keep)
+        bundles = [os.path.join(bundles_dir, d) for d in os.listdir(bundles_dir) if not d.endswith('.tmp')]
+        bundles.sort(key=os.path.getmtime, reverse=True)
+        for extract_dir in bundles[self.max_bundles:]:
+            if extract_dir != keep:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+class FlashRecord(object):
+    """
+    The SHA256 hash of the image each partition of a device was last flashed with,
+    and how long flashing it took.
+
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.partitions = {}
+        if os.path.isfile(filepath):
+            try:
+                with open(filepath) as fh:
+                    self.partitions = json.load(fh)
+            except ValueError:
+                pass  # corrupt record; everything will be flashed
+
+    def get(self, partition):
+        return self.partitions.get(partition)
+
+    def update(self, partition, sha256, duration):
+        self.partitions[partition] = {'sha256': sha256, 'duration': duration, 'flashed_at': time.time()}
+        self.save()
+
+    def invalidate(self, partition):
+        if self.partitions.pop(partition, None) is not None:
+            self.save()
+
+    def save(self):
+        temp_file = _f(self.filepath) + '.tmp'
+        with open(temp_file, 'w') as wfh:
+            json.dump(self.partitions, wfh, indent=4)
+        os.rename(temp_file, self.filepath)
+
+
 # utility functions
 
 def get_mapping(base_dir, partition_file):
@@ -25,12 +25,15 @@ import inspect
 import httplib
 import logging
 import json
+import hashlib
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from wlauto import ResourceGetter, GetterPriority, Parameter, NO_ONE, settings, __file__ as __base_filepath
 from wlauto.exceptions import ResourceError
 from wlauto.utils.android import ApkInfo
+from wlauto.utils.assets import get_asset_index, get_apk_version_name
 from wlauto.utils.misc import ensure_directory_exists as _d, ensure_file_directory_exists as _f, sha256, urljoin
 from wlauto.utils.types import boolean
 from wlauto.utils.revent import ReventParser
@@ -95,16 +98,14 @@ class ReventGetter(ResourceGetter):
         for name in [device_model, wa_device_name]:
             if not name:
                 continue
-            filename = '.'.join([name, resource.stage, 'revent']).lower()
             location = _d(os.path.join(self.get_base_location(resource), 'revent_files'))
-            for candidate in os.listdir(location):
-                if candidate.lower() == filename.lower():
-                    path = os.path.join(location, candidate)
-                    try:
-                        ReventParser.check_revent_file(path)
-                        return path
-                    except ValueError as e:
-                        self.logger.warning(e.message)
+            path = get_asset_index(location).find_revent(name, resource.stage)
+            if path:
+                try:
+                    ReventParser.check_revent_file(path)
+                    return path
+                except ValueError as e:
+                    self.logger.warning(e.message)
 
 
 class PackageApkGetter(PackageFileGetter):
@@ -357,13 +358,25 @@ class HttpGetter(ResourceGetter):
         Parameter('always_fetch', kind=boolean, default=False, global_alias='always_fetch_remote_assets',
                   description="""If ``True``, will always attempt to fetch assets from the remote, even if
                                  a local cached copy is available."""),
-        Parameter('chunk_size', kind=int, default=1024,
+        Parameter('chunk_size', kind=int, default=1024 * 1024,
                   description="""Chunk size for streaming large assets."""),
+        Parameter('max_connections', kind=int, default=8,
+                  description="""Maximum number of pooled connections kept open to the assets
+                                 server (this bounds the number of concurrent downloads)."""),
     ]
 
     def __init__(self, resolver, **kwargs):
         super(HttpGetter, self).__init__(resolver, **kwargs)
         self.index = None
+        # A single session is shared between (possibly concurrent) downloads,
+        # so that connections to the server are pooled and reused.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_connections,
+                              pool_maxsize=self.max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if self.username:
+            self.session.auth = (self.username, self.password)
 
     def get(self, resource, **kwargs):
         if not resource.owner:
@@ -390,28 +403,75 @@ class HttpGetter(ResourceGetter):
         url = urljoin(self.url, owner_name, asset['path'])
         local_path = _f(os.path.join(settings.dependencies_directory, '__remote',
                                      owner_name, asset['path'].replace('/', os.sep)))
+        local_index = get_asset_index(os.path.dirname(local_path))
+        local_name = os.path.basename(local_path)
         if os.path.exists(local_path) and not self.always_fetch:
-            local_sha = sha256(local_path)
-            if local_sha == asset['sha256']:
+            # The cached hash is only used if the local copy's size, modification
+            # time and inode are unchanged since it was hashed; otherwise (e.g. if
+            # it was truncated or replaced) it is rehashed.
+            if local_index.get_sha256(local_name) == asset['sha256']:
                 self.logger.debug('Local SHA256 matches; not re-downloading')
                 return local_path
-        self.logger.debug('Downloading {}'.format(url))
-        response = self.geturl(url, stream=True)
-        if response.status_code != httplib.OK:
+
+        # Download into a .part file, resuming from where a previous download
+        # left off if one exists, and only replace the local copy once the
+        # download is complete and its hash has been verified.
+        partial_path = local_path + '.part'
+        if self.always_fetch and os.path.exists(partial_path):
+            os.remove(partial_path)
+        for _ in xrange(2):  # retry once from scratch if a resumed download is corrupt
+            resumed = os.path.exists(partial_path)
+            download_sha = self._download(url, partial_path)
+            if download_sha is None:
+                return
+            if download_sha == asset['sha256']:
+                os.rename(partial_path, local_path)
+                local_index.set_sha256(local_name, download_sha)
+                return local_path
+            os.remove(partial_path)
+            if not resumed:
+                break
+            self.logger.debug('Resumed download of {} does not match SHA256; retrying'.format(url))
+        self.logger.warning('Downloaded asset "{}" does not match the SHA256 in the index'.format(url))
+
+    def _download(self, url, path):
+        """
+        Downloads ``url`` to ``path``, resuming the download if ``path`` already
+        exists. Returns the SHA256 of the downloaded file, or ``None`` if the
+        download failed.
+
+        """
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset:
+            self.logger.debug('Resuming download of {} from byte {}'.format(url, offset))
+            response = self.geturl(url, stream=True, headers={'Range': 'bytes={}-'.format(offset)})
+        else:
+            self.logger.debug('Downloading {}'.format(url))
+            response = self.geturl(url, stream=True)
+        if offset and response.status_code == httplib.REQUESTED_RANGE_NOT_SATISFIABLE:
+            return sha256(path)  # the previous download was, in fact, complete
+        if response.status_code not in (httplib.OK, httplib.PARTIAL_CONTENT):
             message = 'Could not download asset "{}"; recieved "{} {}"'
             self.logger.warning(message.format(url, response.status_code, response.reason))
-            return
-        with open(local_path, 'wb') as wfh:
+            return None
+
+        h = hashlib.sha256()
+        # The server may ignore the range and send the whole file.
+        if response.status_code == httplib.PARTIAL_CONTENT:
+            with open(path, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(self.chunk_size), ''):
+                    h.update(chunk)
+            mode = 'ab'
+        else:
+            mode = 'wb'
+        with open(path, mode) as wfh:
             for chunk in response.iter_content(chunk_size=self.chunk_size):
+                h.update(chunk)
                 wfh.write(chunk)
-        return local_path
+        return h.hexdigest()
 
-    def geturl(self, url, stream=False):
-        if self.username:
-            auth = (self.username, self.password)
-        else:
-            auth = None
-        return requests.get(url, auth=auth, stream=stream)
+    def geturl(self, url, stream=False, headers=None):
+        return self.session.get(url, stream=stream, headers=headers)
 
     def resolve_resource(self, resource):
         # pylint: disable=too-many-branches
@@ -519,20 +579,15 @@ class RemoteFilerGetter(ResourceGetter):
             for name in [device_model, wa_device_name]:
                 if not name:
                     continue
-                filename = '.'.join([name, resource.stage, 'revent']).lower()
                 alternate_location = os.path.join(location, 'revent_files')
                 # There tends to be some confusion as to where revent files should
                 # be placed. This looks both in the extension's directory, and in
                 # 'revent_files' subdirectory under it, if it exists.
                 path = None
                 if os.path.isdir(alternate_location):
-                    for candidate in os.listdir(alternate_location):
-                        if candidate.lower() == filename.lower():
-                            path = os.path.join(alternate_location, candidate)
+                    path = get_asset_index(alternate_location).find_revent(name, resource.stage)
                 if os.path.isdir(location):
-                    for candidate in os.listdir(location):
-                        if candidate.lower() == filename.lower():
-                            path = os.path.join(location, candidate)
+                    path = get_asset_index(location).find_revent(name, resource.stage) or path
                 if path:
                     try:
                         ReventParser.check_revent_file(path)
@@ -548,7 +603,7 @@ class RemoteFilerGetter(ResourceGetter):
 
 def get_from_location_by_extension(resource, location, extension, version=None, variant=None):
     try:
-        found_files = [os.path.join(location, f) for f in os.listdir(location)]
+        found_files = [os.path.join(location, f) for f in get_asset_index(location).listdir()]
     except OSError:
         return None
     try:
@@ -565,7 +620,7 @@ def get_from_list_by_extension(resource, filelist, extension, version=None, vari
         filelist = [ff for ff in filelist if variant.lower() in os.path.basename(ff).lower()]
     if version:
         if extension == 'apk':
-            filelist = [ff for ff in filelist if version.lower() in ApkInfo(ff).version_name.lower()]
+            filelist = [ff for ff in filelist if version.lower() in _get_apk_version_name(ff).lower()]
         else:
             filelist = [ff for ff in filelist if version.lower() in os.path.basename(ff).lower()]
     if len(filelist) == 1:
@@ -578,6 +633,12 @@ def get_from_list_by_extension(resource, filelist, extension, version=None, vari
                                                                            resource.owner.name))
 
 
+def _get_apk_version_name(path):
+    if os.path.isfile(path):
+        return get_apk_version_name(path)
+    return ApkInfo(path).version_name
+
+
 def get_owner_path(resource):
     if resource.owner is NO_ONE:
         return os.path.join(os.path.dirname(__base_filepath), 'common')
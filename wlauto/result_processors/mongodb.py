@@ -19,6 +19,9 @@ import os
 import re
 import string
 import tarfile
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 try:
     import pymongo
@@ -29,7 +32,7 @@ except ImportError:
 
 from wlauto import ResultProcessor, Parameter, Artifact
 from wlauto.exceptions import ResultProcessorError
-from wlauto.utils.misc import as_relative
+from wlauto.utils.misc import as_relative, sha256
 
 
 __bad_chars = '$.'
@@ -45,6 +48,15 @@ class MongodbUploader(ResultProcessor):
 
     MongoDB is a popular document-based data store (NoSQL database).
 
+    Artifacts are uploaded to GridFS by a pool of ``upload_threads`` threads, so that
+    uploads proceed in the background while the run continues, and the results
+    bundle is compressed while the run's other artifacts are being uploaded. If
+    ``deduplicate`` is enabled, the SHA256 of each artifact is stored alongside it,
+    and artifacts whose contents are already in GridFS (e.g. from a previous run)
+    reference the existing file rather than being uploaded again. Iteration results
+    are buffered and added to the run document in batches of ``batch_size``, with
+    a single update for each workload spec in the batch.
+
     """
 
     parameters = [
@@ -63,6 +75,17 @@ class MongodbUploader(ResultProcessor):
         Parameter('authentication', kind=dict, default={},
                   description='''If specified, this will be passed to db.authenticate() upon connection;
                                  please pymongo documentaion authentication examples for detail.'''),
+        Parameter('upload_threads', kind=int, default=4,
+                  constraint=(lambda x: x > 0, 'must be positive'),
+                  description='The number of threads used to upload artifacts concurrently.'),
+        Parameter('batch_size', kind=int, default=50,
+                  constraint=(lambda x: x > 0, 'must be positive'),
+                  description='''The number of iteration results that are buffered before they are
+                                 written to the database. Any remaining results are written at
+                                 the end of the run.'''),
+        Parameter('deduplicate', kind=bool, default=True,
+                  description='''Do not upload artifacts whose contents (identified by their SHA256)
+                                 are already stored in GridFS; reference the existing file instead.'''),
     ]
 
     def initialize(self, context):
@@ -77,6 +100,9 @@ class MongodbUploader(ResultProcessor):
         if self.authentication:
             if not self.dbc.authenticate(**self.authentication):
                 raise ResultProcessorError('Authentication to database {} failed.'.format(self.db))
+        if self.deduplicate:
+            # Each artifact is looked up by its hash before it is uploaded.
+            self.dbc.fs.files.create_index('sha256')
 
         self.run_result_dbid = ObjectId()
         run_doc = context.run_info.to_dict()
@@ -114,6 +140,11 @@ class MongodbUploader(ResultProcessor):
         # as artificats.
         self.artifacts = []
 
+        self.pool = ThreadPool(self.upload_threads)
+        self.pending_results = []
+        self._digest_locks = {}
+        self._digest_locks_lock = threading.Lock()
+
     def export_iteration_result(self, result, context):
         r = {}
         r['iteration'] = context.current_iteration
@@ -124,31 +155,53 @@ class MongodbUploader(ResultProcessor):
             md = m.to_dict()
             md['is_summary'] = m.name in context.workload.summary_metrics
             r['metrics'].append(md)
-        iteration_artefacts = [self.upload_artifact(context, a) for a in context.iteration_artifacts]
-        r['artifacts'] = [e for e in iteration_artefacts if e is not None]
-        self.dbc.runs.update({'_id': self.run_dbid, 'workloads.id': context.spec.id},
-                             {'$push': {'workloads.$.results': r}})
+        # Artifacts are uploaded in the background; the entries are collected
+        # when the results are flushed.
+        r['artifacts'] = [self.upload_artifact(context, a) for a in context.iteration_artifacts]
+        self.pending_results.append((context.spec.id, r))
+        if len(self.pending_results) >= self.batch_size:
+            self.flush_results()
 
     def export_run_result(self, result, context):
-        run_artifacts = [self.upload_artifact(context, a) for a in context.run_artifacts]
+        run_uploads = [self.upload_artifact(context, a) for a in context.run_artifacts]
+        # The bundle is compressed while the run artifacts are being uploaded.
         self.logger.debug('Generating results bundle...')
         bundle = self.generate_bundle(context)
         if bundle:
-            run_artifacts.append(self.upload_artifact(context, bundle))
+            run_uploads.append(self.upload_artifact(context, bundle))
         else:
             self.logger.debug('No untracked files found.')
+        self.flush_results()
         run_stats = {
             'status': result.status,
             'events': [e.to_dict() for e in result.events],
             'end_time': context.run_info.end_time,
             'duration': context.run_info.duration.total_seconds(),
-            'artifacts': [e for e in run_artifacts if e is not None],
+            'artifacts': self._get_uploaded_entries(run_uploads),
         }
         self.dbc.runs.update({'_id': self.run_dbid}, {'$set': run_stats})
 
     def finalize(self, context):
+        self.pool.close()
+        self.pool.join()
         self.client.close()
 
+    def flush_results(self):
+        """
+        Waits for the artifacts of the pending iteration results to be uploaded,
+        and adds the results to the run document, with one update for each
+        workload spec.
+
+        """
+        results_by_spec = OrderedDict()
+        for spec_id, r in self.pending_results:
+            r['artifacts'] = self._get_uploaded_entries(r['artifacts'])
+            results_by_spec.setdefault(spec_id, []).append(r)
+        for spec_id, results in results_by_spec.iteritems():
+            self.dbc.runs.update({'_id': self.run_dbid, 'workloads.id': spec_id},
+                                 {'$push': {'workloads.$.results': {'$each': results}}})
+        self.pending_results = []
+
     def validate(self):
         if self.uri:
             has_warned = False
@@ -163,6 +216,12 @@ class MongodbUploader(ResultProcessor):
                                     'host/port from your config.')
 
     def upload_artifact(self, context, artifact):
+        """
+        Starts uploading the artifact in the background. Returns an ``AsyncResult``
+        for the artifact's entry in the run document, or ``None`` if the artifact
+        is not uploaded.
+
+        """
         artifact_path = os.path.join(context.output_directory, artifact.path)
         self.artifacts.append((artifact_path, artifact))
         if not os.path.exists(artifact_path):
@@ -188,12 +247,32 @@ class MongodbUploader(ResultProcessor):
                                                                    context.spec.label,
                                                                    context.current_iteration),
                                                  as_relative(path))
-            with open(artifact_path, 'rb') as fh:
-                fsid = self.fs.put(fh, **entry)
-                entry['gridfs_id'] = fsid
+            return self.pool.apply_async(self._upload_file, (artifact_path, entry))
 
+    def _upload_file(self, path, entry):
+        if not self.deduplicate:
+            with open(path, 'rb') as fh:
+                entry['gridfs_id'] = self.fs.put(fh, **entry)
             return entry
 
+        entry['sha256'] = sha256(path)
+        with self._digest_locks_lock:
+            # Serialize uploads of the same contents, so that they are only stored once.
+            digest_lock = self._digest_locks.setdefault(entry['sha256'], threading.Lock())
+        with digest_lock:
+            existing = self.fs.find_one({'sha256': entry['sha256']})
+            if existing is not None:
+                self.logger.debug('{} is already stored as {}'.format(path, existing.filename))
+                entry['gridfs_id'] = existing._id  # pylint: disable=protected-access
+                entry['deduplicated'] = True
+            else:
+                with open(path, 'rb') as fh:
+                    entry['gridfs_id'] = self.fs.put(fh, **entry)
+        return entry
+
+    def _get_uploaded_entries(self, uploads):
+        return [u.get() for u in uploads if u is not None]
+
     def gridfs_directory_exists(self, path):
         regex = re.compile('^{}'.format(path))
         return self.fs.exists({'filename': regex})
@@ -19,12 +19,19 @@
 This module contains a few "standard" result processors that write results to
 text files in various formats.
 
+The run-level files are derived from ``results.jsonl``, to which the result of
+each iteration is appended as it is processed (see ``wlauto.core.result``). The
+functions used to do that are also used by the ``recover`` command to rebuild the
+files for runs that did not complete.
+
 """
 import os
 import csv
 import json
+from collections import defaultdict
 
 from wlauto import ResultProcessor, Parameter
+from wlauto.core.result import RESULT_STREAM_FILE, iteration_result_to_record, read_result_stream
 from wlauto.exceptions import ConfigError
 from wlauto.utils.types import list_of_strings
 
@@ -61,6 +68,10 @@ class CsvReportProcessor(ResultProcessor):
     Creates a ``results.csv`` in the output directory containing results for
     all iterations in CSV format, each line containing a single metric.
 
+    The metrics for each iteration are appended to the file (which is synced to
+    disk) as the iteration completes, so the file contains the results of every
+    completed iteration even if the run does not complete.
+
     """
 
     name = 'csv'
@@ -89,39 +100,49 @@ class CsvReportProcessor(ResultProcessor):
             raise ConfigError('extra_columns cannot be specified when use_all_classifiers is True')
 
     def initialize(self, context):
-        self.results_so_far = []  # pylint: disable=attribute-defined-outside-init
+        # pylint: disable=attribute-defined-outside-init
+        self.records_so_far = []
+        self.columns = None
+        self.wfh = None
 
     def process_iteration_result(self, result, context):
-        self.results_so_far.append(result)
-        self._write_results(self.results_so_far, context)
+        record = iteration_result_to_record(result)
+        if self.use_all_classifiers:
+            # The file must be re-written if a new classifier column is needed.
+            self.records_so_far.append(record)
+            columns = get_classifier_columns(self.records_so_far)
+        else:
+            columns = self.extra_columns or []
+        if self.wfh is None or columns != self.columns:
+            self._close()
+            self.wfh = open(os.path.join(context.run_output_directory, 'results.csv'), 'wb')
+            self.columns = columns
+            write_results_csv(self.records_so_far or [record], self.wfh, columns)
+        else:
+            write_results_csv([record], self.wfh, columns, header=False)
+        self.wfh.flush()
+        os.fsync(self.wfh.fileno())
 
     def process_run_result(self, result, context):
-        self._write_results(result.iteration_results, context)
-        context.add_artifact('run_result_csv', 'results.csv', 'export')
-
-    def _write_results(self, results, context):
+        self._close()
+        # Re-write the file from the results stream, which also has any metrics
+        # added to the results by processors that ran after this one.
+        records = get_run_records(result, context)
         if self.use_all_classifiers:
-            classifiers = set([])
-            for ir in results:
-                for metric in ir.metrics:
-                    classifiers.update(metric.classifiers.keys())
-            extra_columns = list(classifiers)
-        elif self.extra_columns:
-            extra_columns = self.extra_columns
+            columns = get_classifier_columns(records)
         else:
-            extra_columns = []
+            columns = self.extra_columns or []
+        with open(os.path.join(context.run_output_directory, 'results.csv'), 'wb') as wfh:
+            write_results_csv(records, wfh, columns)
+        context.add_artifact('run_result_csv', 'results.csv', 'export')
 
-        outfile = os.path.join(context.run_output_directory, 'results.csv')
-        with open(outfile, 'wb') as wfh:
-            writer = csv.writer(wfh)
-            writer.writerow(['id', 'workload', 'iteration', 'metric', ] +
-                            extra_columns + ['value', 'units'])
-            for ir in results:
-                for metric in ir.metrics:
-                    row = ([ir.id, ir.spec.label, ir.iteration, metric.name] +
-                           [str(metric.classifiers.get(c, '')) for c in extra_columns] +
-                           [str(metric.value), metric.units or ''])
-                    writer.writerow(row)
+    def finalize(self, context):
+        self._close()
+
+    def _close(self):
+        if self.wfh is not None:
+            self.wfh.close()
+            self.wfh = None
 
 
 class JsonReportProcessor(ResultProcessor):
@@ -136,17 +157,7 @@ class JsonReportProcessor(ResultProcessor):
     def process_run_result(self, result, context):
         outfile = os.path.join(context.run_output_directory, 'results.json')
         with open(outfile, 'wb') as wfh:
-            output = []
-            for result in result.iteration_results:
-                output.append({
-                    'id': result.id,
-                    'workload': result.workload.name,
-                    'iteration': result.iteration,
-                    'metrics': [dict([(k, v) for k, v in m.__dict__.iteritems()
-                                      if not k.startswith('_')])
-                                for m in result.metrics],
-                })
-            json.dump(output, wfh, indent=4)
+            write_results_json(get_run_records(result, context), wfh)
         context.add_artifact('run_result_json', 'results.json', 'export')
 
 
@@ -161,12 +172,71 @@ class SummaryCsvProcessor(ResultProcessor):
     def process_run_result(self, result, context):
         outfile = os.path.join(context.run_output_directory, 'summary.csv')
         with open(outfile, 'wb') as wfh:
-            writer = csv.writer(wfh)
-            writer.writerow(['id', 'workload', 'iteration', 'metric', 'value', 'units'])
-            for result in result.iteration_results:
-                for metric in result.metrics:
-                    if metric.name in result.workload.summary_metrics:
-                        row = [result.id, result.workload.name, result.iteration,
-                               metric.name, str(metric.value), metric.units or '']
-                        writer.writerow(row)
+            write_summary_csv(get_run_records(result, context), wfh)
         context.add_artifact('run_result_summary', 'summary.csv', 'export')
+
+
+def get_run_records(result, context):
+    """
+    Returns a list of the records of the run's iteration results (see
+    ``wlauto.core.result.iteration_result_to_record``). Records are read from the
+    results stream if there is one; iterations missing from the stream (e.g.
+    because writing to it failed) are taken from ``result``.
+
+    """
+    stream_file = os.path.join(context.run_output_directory, RESULT_STREAM_FILE)
+    if not os.path.isfile(stream_file):
+        return [iteration_result_to_record(ir) for ir in result.iteration_results]
+    streamed = defaultdict(list)
+    for record in read_result_stream(stream_file):
+        streamed[(record['id'], record['iteration'])].append(record)
+    records = []
+    for ir in result.iteration_results:
+        recorded = streamed.get((ir.id, ir.iteration))
+        records.append(recorded.pop(0) if recorded else iteration_result_to_record(ir))
+    return records
+
+
+def get_classifier_columns(records):
+    classifiers = set([])
+    for record in records:
+        for metric in record['metrics']:
+            classifiers.update(metric['classifiers'].keys())
+    return sorted(classifiers)
+
+
+def write_results_csv(records, wfh, extra_columns=None, header=True):
+    extra_columns = extra_columns or []
+    writer = csv.writer(wfh)
+    if header:
+        writer.writerow(['id', 'workload', 'iteration', 'metric', ] +
+                        extra_columns + ['value', 'units'])
+    for record in records:
+        for metric in record['metrics']:
+            row = ([record['id'], record['label'], record['iteration'], metric['name']] +
+                   [str(metric['classifiers'].get(c, '')) for c in extra_columns] +
+                   [str(metric['value']), metric['units'] or ''])
+            writer.writerow(row)
+
+
+def write_results_json(records, wfh):
+    output = []
+    for record in records:
+        output.append({
+            'id': record['id'],
+            'workload': record['workload'],
+            'iteration': record['iteration'],
+            'metrics': record['metrics'],
+        })
+    json.dump(output, wfh, indent=4)
+
+
+def write_summary_csv(records, wfh):
+    writer = csv.writer(wfh)
+    writer.writerow(['id', 'workload', 'iteration', 'metric', 'value', 'units'])
+    for record in records:
+        for metric in record['metrics']:
+            if metric['name'] in record['summary_metrics']:
+                row = [record['id'], record['workload'], record['iteration'],
+                       metric['name'], str(metric['value']), metric['units'] or '']
+                writer.writerow(row)
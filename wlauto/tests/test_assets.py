@@ -0,0 +1,186 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false, raises
+
+from wlauto import settings
+from wlauto.utils import assets
+
+
+class FakeApkInfo(object):
+
+    created = []
+
+    def __init__(self, path):
+        FakeApkInfo.created.append(path)
+        with open(path) as fh:
+            self.package, self.version_name = fh.read().split()
+        self.version_code = None
+        self.native_code = []
+
+
+class SkewedTime(object):
+    """Stands in for the time module, with the host's clock an hour behind the file system's."""
+
+    def __init__(self):
+        self.skew = -3600
+
+    def time(self):
+        return time.time() + self.skew
+
+
+class AssetIndexTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.saved_environment_root = settings.environment_root
+        settings.environment_root = os.path.join(self.tempdir, 'wa')
+        self.location = os.path.join(self.tempdir, 'assets')
+        os.makedirs(self.location)
+        self.saved_functions = assets.sha256, assets.ApkInfo, assets.time
+        self.hashed = []
+        assets.sha256 = self._sha256
+        assets.ApkInfo = FakeApkInfo
+        FakeApkInfo.created = []
+        assets._indexes.clear()
+
+    def tearDown(self):
+        assets.sha256, assets.ApkInfo, assets.time = self.saved_functions
+        settings.environment_root = self.saved_environment_root
+        assets._indexes.clear()
+        shutil.rmtree(self.tempdir)
+
+    def _sha256(self, path):
+        self.hashed.append(os.path.basename(path))
+        return self.saved_functions[0](path)
+
+    def _write(self, name, contents, mtime=None):
+        # Files are rewritten in place, and the directory's modification time
+        # restored, so that only the files themselves show any change.
+        path = os.path.join(self.location, name)
+        with open(path, 'w') as wfh:
+            wfh.write(contents)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        old = time.time() - 3600
+        os.utime(self.location, (old, old))
+        return path
+
+    def test_sha256(self):
+        old = time.time() - 600
+        self._write('a.bin', 'first', mtime=old)
+        index = assets.AssetIndex(self.location)
+        assert_equal(index.listdir(), ['a.bin'])
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('first').hexdigest())
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('first').hexdigest())
+        assert_equal(self.hashed, ['a.bin'])
+
+        # Same size, different modification time.
+        self._write('a.bin', 'other', mtime=old + 10)
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('other').hexdigest())
+        assert_equal(len(self.hashed), 2)
+
+    def test_modified_within_granularity(self):
+        # A file hashed within MTIME_GRANULARITY of being modified is rehashed
+        # on every lookup, as it may have been modified again without its
+        # modification time changing.
+        now = time.time()
+        self._write('a.bin', 'first', mtime=now)
+        index = assets.AssetIndex(self.location)
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('first').hexdigest())
+        self._write('a.bin', 'other', mtime=now)
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('other').hexdigest())
+
+    def test_apk_info(self):
+        old = time.time() - 600
+        self._write('app.apk', 'com.foo 1.0', mtime=old)
+        index = assets.AssetIndex(self.location)
+        assert_equal(index.get_apk_info('app.apk')['version_name'], '1.0')
+        assert_equal(index.get_apk_info('app.apk')['version_name'], '1.0')
+        assert_equal(len(FakeApkInfo.created), 1)
+
+        self._write('app.apk', 'com.foo 2.0', mtime=old + 10)
+        assert_equal(index.get_apk_info('app.apk')['version_name'], '2.0')
+
+    def test_persistence(self):
+        old = time.time() - 600
+        self._write('a.bin', 'first', mtime=old)
+        index = assets.get_asset_index(self.location)
+        index.get_sha256('a.bin')
+        assert_false(os.path.isfile(index.index_file))  # not saved on every lookup
+        assets.save_asset_indexes()
+        assert_true(os.path.isfile(index.index_file))
+
+        # A fresh index (e.g. in a new process) uses the saved hash...
+        index = assets.AssetIndex(self.location)
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('first').hexdigest())
+        assert_equal(self.hashed, ['a.bin'])
+
+        # ...unless the file has changed since it was saved.
+        self._write('a.bin', 'other', mtime=old + 10)
+        index = assets.AssetIndex(self.location)
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('other').hexdigest())
+        assert_equal(len(self.hashed), 2)
+
+    def test_replaced_file(self):
+        # A file replaced by another with the same size and modification time
+        # (e.g. by a rename) has a different inode.
+        old = time.time() - 600
+        self._write('a.bin', 'first', mtime=old)
+        index = assets.AssetIndex(self.location)
+        index.get_sha256('a.bin')
+        self._write('a.bin.new', 'other', mtime=old)
+        os.rename(os.path.join(self.location, 'a.bin.new'), os.path.join(self.location, 'a.bin'))
+        assert_equal(index.get_sha256('a.bin'), hashlib.sha256('other').hexdigest())
+
+    def test_clock_skew(self):
+        assets.time = SkewedTime()
+        index = assets.AssetIndex(self.location)
+        index.listdir()  # creates the clock file
+        self._write('a.bin', 'first', mtime=time.time() - 600)
+        assert_equal(index.listdir(), ['a.bin'])  # the clock file is not listed
+        indexed_at = index.indexed_at
+        index.listdir()
+        assert_equal(index.indexed_at, indexed_at)  # not re-listed
+        index.get_sha256('a.bin')
+        index.get_sha256('a.bin')
+        assert_equal(self.hashed, ['a.bin'])
+
+    def test_clock_not_readable(self):
+        # The clock cannot be read if the clock file cannot be written, but as
+        # a file has been modified after the host's current time, the clock
+        # must be ahead by at least that much.
+        assets.time = SkewedTime()
+        os.mkdir(os.path.join(self.location, assets.CLOCK_FILE_NAME))
+        self._write('a.bin', 'first', mtime=time.time() - 600)
+        index = assets.AssetIndex(self.location)
+        index.get_sha256('a.bin')
+        assets.time.skew += 10
+        index.get_sha256('a.bin')  # was hashed too soon after being modified
+        index.get_sha256('a.bin')
+        assert_equal(self.hashed, ['a.bin', 'a.bin'])
+
+    @raises(ValueError)
+    def test_missing_file(self):
+        assets.AssetIndex(self.location).get_sha256('missing.bin')
@@ -0,0 +1,147 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import shutil
+import posixpath
+import tempfile
+import subprocess
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_false
+
+from wlauto.modules.cgroups import CpusetController, parse_migrate_tasks_output
+from wlauto.utils import android
+
+
+class LocalShellDevice(object):
+    """Runs commands in a local shell, with cgroups stood in for by directories."""
+
+    path = posixpath
+    busybox = ''
+
+    def __init__(self, working_directory):
+        self.working_directory = working_directory
+        self.commands = []
+
+    def execute(self, command, check_exit_code=True, as_root=False):
+        self.commands.append(command)
+        process = subprocess.Popen(['sh', '-c', command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return process.communicate()[0]
+
+    def push_file(self, source, dest):
+        shutil.copy(source, dest)
+
+    def set_sysfile_value(self, path, value, verify=True):
+        with open(path, 'w') as wfh:
+            wfh.write('{}\n'.format(value))
+
+    def get_sysfile_value(self, path):
+        with open(path) as fh:
+            return fh.read().strip()
+
+
+class AdbShellDevice(LocalShellDevice):
+    """
+    Runs commands as root through adb_shell(), so that they are quoted as they
+    would be for an Android device; "adb shell" and "su" are stood in for by
+    local shells.
+
+    """
+
+    def execute(self, command, check_exit_code=True, as_root=False):
+        self.commands.append(command)
+        saved_functions = android.check_output, android._check_env
+        android.check_output = self._check_output
+        android._check_env = lambda: None
+        try:
+            return android.adb_shell(None, command, check_exit_code=False, as_root=as_root)
+        finally:
+            android.check_output, android._check_env = saved_functions
+
+    def _check_output(self, command, timeout=None, **kwargs):
+        # The host shell expands the command, as it would for adb; the device
+        # shell (and the root shell started by su) gets what adb would send.
+        stand_ins = 'adb() { shift; sh -c "su() { sh; }; $*"; }; '
+        process = subprocess.Popen(['sh', '-c', stand_ins + command], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        return process.communicate()
+
+
+class CgroupsTest(TestCase):
+
+    device_class = LocalShellDevice
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.device = self.device_class(tempfile.mkdtemp(dir=self.tempdir))
+        self.controller = CpusetController('cpuset')
+        self.controller.device = self.device
+        self.controller.mount_point = self.tempdir
+        self.controller.create_group('root', [0, 1], 0)
+        self.controller.create_group('big', [1], 0)
+        self.device.commands = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _set_tasks(self, group, tasks):
+        with open(self.controller.groups[group].tasks_file, 'w') as wfh:
+            wfh.write('\n'.join(map(str, tasks)) + '\n')
+
+    def test_add_tasks(self):
+        result = self.controller.groups['big'].add_tasks([3, 4, 5])
+        assert_equal(result.moved, [3, 4, 5])
+        assert_equal(result.failed, [])
+        assert_equal(len(self.device.commands), 1)
+
+        shutil.rmtree(self.controller.groups['big'].directory)
+        result = self.controller.groups['big'].add_tasks([3, 4])
+        assert_equal(result, ([], [3, 4]))
+
+    def test_move_tasks(self):
+        self._set_tasks('root', [10, 11, 12])
+        result = self.controller.move_all_tasks_to('big')
+        assert_equal(result.moved, [10, 11, 12])
+        assert_equal(self.controller.groups['big'].get_tasks(), [12])  # the stand-in file is overwritten
+        assert_equal(len(self.device.commands), 1)
+
+    def test_move_matching_tasks(self):
+        pid = os.getpid()
+        with open('/proc/{}/comm'.format(pid)) as fh:
+            comm = fh.read().strip()
+        self._set_tasks('root', [pid, 1])
+        result = self.controller.move_tasks('root', 'big', comm_regex='^{}$'.format(comm))
+        assert_equal(result.moved, [pid])
+        assert_equal(result.failed, [])
+
+    def test_regex_not_expanded(self):
+        self._set_tasks('root', [1])
+        marker = os.path.join(self.tempdir, 'expanded')
+        regex = "$(touch {0})'\"`touch {0}`".format(marker)
+        result = self.controller.move_tasks('root', 'big', comm_regex=regex)
+        assert_equal(result, ([], []))
+        assert_false(os.path.exists(marker))
+
+    def test_parse_output(self):
+        result = parse_migrate_tasks_output('+1\n-2\nsu: permission denied\n+3\n')
+        assert_equal(result, ([1, 3], [2]))
+
+
+class AdbCgroupsTest(CgroupsTest):
+
+    device_class = AdbShellDevice
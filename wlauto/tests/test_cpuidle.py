@@ -0,0 +1,110 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=E0611,R0201
+import csv
+import posixpath
+from StringIO import StringIO
+from unittest import TestCase
+
+from nose.tools import assert_equal
+
+from wlauto.modules.cpuidle import Cpuidle, CpuidleState, parse_cpuidle_snapshot
+from wlauto.instrumentation.cpuidle import get_counter_deltas, parse_cpuidle_samples, write_samples_csv
+
+
+SNAPSHOT = """cpu0/cpuidle/state0/name:WFI
+cpu0/cpuidle/state0/desc:ARM WFI
+cpu0/cpuidle/state0/latency:1
+cpu0/cpuidle/state0/usage:100
+cpu0/cpuidle/state1/name:cpu-sleep-0
+cpu0/cpuidle/state1/desc:ARM power down
+cpu0/cpuidle/state1/latency:500
+cpu0/cpuidle/state1/usage:10
+cpu0/cpuidle/state10/name:cluster-sleep-0
+cpu1/cpuidle/state0/name:WFI
+"""
+
+SAMPLES = """@ 100.50 300.00
+cpu0/cpuidle/state0/usage:100
+cpu0/cpuidle/state0/time:2000
+cpu1/cpuidle/state0/usage:50
+cpu1/cpuidle/state0/time:1000
+@ 100.60 300.30
+cpu0/cpuidle/state0/usage:120
+cpu0/cpuidle/state0/time:52000
+cpu1/cpuidle/state0/usage:50
+cpu1/cpuidle/state0/time:1000
+@ 100.70
+"""
+
+
+class MockDevice(object):
+
+    path = posixpath
+    busybox = '/data/local/tmp/busybox'
+    is_rooted = True
+
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def execute(self, command, **kwargs):
+        self.commands.append(command)
+        return self.output
+
+
+class CpuidleSnapshotTest(TestCase):
+
+    def test_parse_snapshot(self):
+        snapshot = parse_cpuidle_snapshot(SNAPSHOT + 'grep: cpu0/cpuidle/state0/s2idle: Is a directory\n')
+        assert_equal(snapshot.keys(), ['cpu0', 'cpu1'])
+        assert_equal(snapshot['cpu0'].keys(), ['state0', 'state1', 'state10'])
+        assert_equal(snapshot['cpu0']['state1'], {'name': 'cpu-sleep-0', 'desc': 'ARM power down',
+                                                  'latency': '500', 'usage': '10'})
+
+    def test_get_states(self):
+        device = MockDevice(SNAPSHOT)
+        module = Cpuidle.__new__(Cpuidle)  # bypass Extension checks
+        module.device = device
+        states = module.get_cpuidle_states(0)
+        assert_equal(len(device.commands), 1)
+        assert_equal(device.commands[0],
+                     "cd /sys/devices/system/cpu && /data/local/tmp/busybox grep -H '' "
+                     "cpu0/cpuidle/state*/desc cpu0/cpuidle/state*/name cpu0/cpuidle/state*/latency "
+                     "cpu0/cpuidle/state*/power 2>/dev/null")
+        assert_equal([(s.index, s.id, s.name) for s in states],
+                     [(0, 'state0', 'WFI'), (1, 'state1', 'cpu-sleep-0'), (10, 'state10', 'cluster-sleep-0')])
+        assert_equal(states[1].path, '/sys/devices/system/cpu/cpu0/cpuidle/state1')
+        assert_equal(states[0], 'ARM WFI')
+        assert_equal(states[0].ordinal, 0)
+
+
+class CpuidleSamplerTest(TestCase):
+
+    def test_samples(self):
+        samples = parse_cpuidle_samples(SAMPLES)
+        assert_equal([s[0] for s in samples], [100.5, 100.6, 100.7])
+        assert_equal(get_counter_deltas(samples[0][1], samples[1][1]),
+                     {('cpu0', 'state0'): (20, 50000), ('cpu1', 'state0'): (0, 0)})
+
+        output = StringIO()
+        write_samples_csv(samples, output)
+        rows = list(csv.reader(output.getvalue().splitlines()))
+        assert_equal(rows[0], ['uptime', 'cpu0_state0_usage', 'cpu0_state0_time',
+                               'cpu1_state0_usage', 'cpu1_state0_time'])
+        assert_equal(rows[2], ['100.6', '120', '52000', '50', '1000'])
+        assert_equal(rows[3], ['100.7', '', '', '', ''])
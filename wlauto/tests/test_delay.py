@@ -0,0 +1,159 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import math
+import random
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_almost_equal
+
+from wlauto.instrumentation import delay
+from wlauto.instrumentation.delay import CoolingModel, DelayInstrument
+
+
+def cooling_curve(t, start=70000, ambient=35000, rate=0.01):
+    return ambient + (start - ambient) * math.exp(-rate * t)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+
+class MockDevice(object):
+
+    name = 'mock_device'
+
+    def __init__(self, clock, noise=0):
+        self.clock = clock
+        self.noise = noise
+        self.readings = 0
+
+    def get_sysfile_value(self, path, kind=None):
+        self.readings += 1
+        return int(cooling_curve(self.clock.now) + random.uniform(-self.noise, self.noise))
+
+
+class MockResult(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def add_metric(self, name, value, units=None, lower_is_better=False, classifiers=None):
+        self.metrics.append((name, value, classifiers))
+
+
+class MockContext(object):
+
+    def __init__(self):
+        self.result = MockResult()
+
+
+class CoolingModelTest(TestCase):
+
+    def test_not_enough_samples(self):
+        model = CoolingModel()
+        model.add_sample(0, 70000)
+        model.add_sample(5, 68000)
+        assert_equal(model.predict_time(40000), None)
+
+    def test_fit(self):
+        model = CoolingModel()
+        for t in xrange(0, 30, 5):
+            model.add_sample(t, cooling_curve(t))
+        assert_true(model.fit())
+        assert_almost_equal(model.rate, 0.01, places=4)
+        assert_almost_equal(model.ambient, 35000, delta=10)
+        expected = math.log(35000.0 / 5000) / 0.01
+        assert_almost_equal(model.predict_time(40000), expected, delta=1)
+
+    def test_noisy_fit(self):
+        random.seed(1)
+        model = CoolingModel()
+        for t in xrange(0, 60, 5):
+            model.add_sample(t, cooling_curve(t) + random.uniform(-200, 200))
+        expected = math.log(35000.0 / 5000) / 0.01
+        assert_almost_equal(model.predict_time(40000), expected, delta=expected * 0.25)
+
+    def test_unreachable(self):
+        model = CoolingModel()
+        for t in xrange(0, 30, 5):
+            model.add_sample(t, cooling_curve(t))
+        assert_equal(model.predict_time(30000), None)  # below ambient
+        model = CoolingModel()
+        for t in xrange(0, 30, 5):
+            model.add_sample(t, 50000 + t)
+        assert_equal(model.predict_time(40000), None)  # not cooling
+
+
+class DelayInstrumentTest(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.saved_time = delay.time
+        delay.time = self.clock
+
+    def tearDown(self):
+        delay.time = self.saved_time
+
+    def _wait(self, prediction, noise=0):
+        device = MockDevice(self.clock, noise)
+        instrument = _instantiate(DelayInstrument, device, temperature_prediction=prediction,
+                                  temperature_between_iterations=40000, temperature_timeout=1200)
+        instrument.initialize(None)
+        instrument.very_slow_on_iteration_start(None)
+        return instrument, device
+
+    def test_predictive_wait(self):
+        expected = math.log(35000.0 / 5000) / 0.01
+        _, polling_device = self._wait(False)
+        assert_true(self.clock.now >= expected)
+
+        self.clock.now = 0
+        instrument, device = self._wait(True, noise=50)
+        assert_true(expected <= self.clock.now < expected + 10)
+        assert_true(device.readings < polling_device.readings / 4)
+
+        context = MockContext()
+        instrument.update_result(context)
+        metrics = dict((name, value) for name, value, _ in context.result.metrics)
+        assert_equal(metrics['cooldown_time'], self.clock.now)
+        assert_true(metrics['cooldown_start_temperature'] > 69000)
+        assert_true(metrics['cooldown_end_temperature'] <= 40000)
+        assert_equal(context.result.metrics[0][2], {'before': 'iteration'})
+
+    def test_timeout(self):
+        device = MockDevice(self.clock)
+        instrument = _instantiate(DelayInstrument, device, temperature_prediction=True,
+                                  temperature_between_iterations=30000, temperature_timeout=100)
+        instrument.initialize(None)
+        instrument.very_slow_on_iteration_start(None)
+        assert_true(100 <= self.clock.now <= 100 + instrument.temperature_poll_period)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
@@ -17,12 +17,32 @@
 # pylint: disable=E0611
 # pylint: disable=R0201
 import os
+import csv
+import json
+import shutil
 import tempfile
 from unittest import TestCase
 
 from nose.tools import assert_equal
 
-from wlauto.instrumentation.misc import _diff_interrupt_files
+from wlauto.instrumentation.misc import (_diff_interrupt_files, _diff_sysfs_dirs,
+                                         _diff_sysfs_manifests, _read_sysfs_manifest)
+from wlauto.utils import sysdiff
+
+
+INTERRUPTS_BEFORE = """           CPU0       CPU1
+ 27:        100         50       GIC  arch_timer
+ 31:          1          1       GIC  removed
+IPI1:        10         20  Rescheduling interrupts
+Err:          0
+"""
+
+INTERRUPTS_AFTER = """           CPU0       CPU1
+ 27:        107         53       GIC  arch_timer
+ 40:          5          0       GIC  mmc0
+IPI1:        12         21  Rescheduling interrupts
+Err:          0
+"""
 
 
 class InterruptDiffTest(TestCase):
@@ -40,3 +60,136 @@ class InterruptDiffTest(TestCase):
         with open(expected_result_file) as fh:
             expected_diff = fh.read()
         assert_equal(output_diff, expected_diff)
+
+    def test_interrupt_diff_without_numpy(self):
+        saved_np = sysdiff.np
+        sysdiff.np = None
+        try:
+            self.test_interrupt_diff()
+        finally:
+            sysdiff.np = saved_np
+
+    def test_structured_interrupt_diff(self):
+        before = sysdiff.parse_interrupts(INTERRUPTS_BEFORE)
+        after = sysdiff.parse_interrupts(INTERRUPTS_AFTER)
+        diff = sysdiff.diff_interrupts(before, after)
+        assert_equal(diff.cpus, ['CPU0', 'CPU1'])
+        assert_equal(list(diff.iter_rows()), [
+            ('27:', [7, 3], 'GIC arch_timer', False),
+            ('40:', [5, 0], 'GIC mmc0', True),
+            ('IPI1:', [2, 1], 'Rescheduling interrupts', False),
+            ('Err:', [0], '', False),
+        ])
+
+        rows = list(csv.reader(_dump(diff.write_csv).splitlines()))
+        assert_equal(rows[0], ['irq', 'CPU0', 'CPU1', 'description', 'new'])
+        assert_equal(rows[2], ['40', '5', '0', 'GIC mmc0', '1'])
+        assert_equal(rows[4], ['Err', '0', '', '', '0'])
+
+
+BEFORE_MANIFEST = """==> /dev/null <==
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq <==
+800000
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/stats/time_in_state <==
+800000 100
+1200000 20
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/scaling_governor <==
+interactive
+
+==> /sys/devices/system/cpu/online <==
+0-3
+"""
+
+AFTER_MANIFEST = """==> /dev/null <==
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq <==
+1200000
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/stats/time_in_state <==
+800000 150
+1200000 70
+
+==> /sys/devices/system/cpu/cpu0/cpufreq/scaling_governor <==
+performance
+
+==> /dev/null <==
+
+==> /sys/devices/system/cpu/online <==
+0-3
+"""
+
+
+class SysfsManifestDiffTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_manifest(self, name, text):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as wfh:
+            wfh.write(text)
+        return _read_sysfs_manifest(path)
+
+    def test_read_manifest(self):
+        manifest = self._write_manifest('after', AFTER_MANIFEST)
+        assert_equal(manifest.keys(), [
+            '/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq',
+            '/sys/devices/system/cpu/cpu0/cpufreq/stats/time_in_state',
+            '/sys/devices/system/cpu/cpu0/cpufreq/scaling_governor',
+            '/sys/devices/system/cpu/online',
+        ])
+        assert_equal(manifest['/sys/devices/system/cpu/cpu0/cpufreq/stats/time_in_state'],
+                     '800000 150\n1200000 70\n')
+        assert_equal(manifest['/sys/devices/system/cpu/online'], '0-3\n')
+
+    def test_manifest_diff(self):
+        before = self._write_manifest('before', BEFORE_MANIFEST)
+        after = self._write_manifest('after', AFTER_MANIFEST)
+        diff_dir = os.path.join(self.tempdir, 'diff')
+        _diff_sysfs_manifests(before, after, diff_dir)
+
+        def read_diff(path):
+            with open(os.path.join(diff_dir, 'sys', 'devices', 'system', 'cpu', *path.split('/'))) as fh:
+                return fh.read()
+
+        assert_equal(read_diff('cpu0/cpufreq/scaling_cur_freq'), '400000\n')
+        assert_equal(read_diff('cpu0/cpufreq/stats/time_in_state'), '800000 50\n1200000 50\n')
+        assert_equal(read_diff('cpu0/cpufreq/scaling_governor'), '[interactive -> performance]\n')
+
+    def test_dirs_diff(self):
+        for stage, value in [('before', '0\n'), ('after', '0\n')]:
+            for name in ['a', 'b']:
+                path = os.path.join(self.tempdir, stage, 'cpu', name)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as wfh:
+                    wfh.write(value if name == 'a' else stage + '\n')
+        differ = _diff_sysfs_dirs(os.path.join(self.tempdir, 'before'), os.path.join(self.tempdir, 'after'),
+                                  os.path.join(self.tempdir, 'diff'), prefix='/sys/devices/system')
+        assert_equal(differ.changes.keys(), ['/sys/devices/system/cpu/b'])
+        with open(os.path.join(self.tempdir, 'diff', 'cpu', 'b')) as fh:
+            assert_equal(fh.read(), '[before -> after]\n')
+
+    def test_differ(self):
+        differ = sysdiff.SysfsDiffer()
+        assert_equal(differ.diff('a', 'cpu0 100\n', 'cpu0 100\n'), 'cpu0 0\n')
+        assert_equal(differ.diff('b', 'cpu0 100\n', 'cpu0 100\n'), 'cpu0 0\n')
+        assert_equal(differ.diff('c', 'cpu0 100\n', 'cpu0 150\n'), 'cpu0 50\n')
+        assert_equal(differ.changes.keys(), ['c'])
+        assert_equal(json.loads(_dump(differ.write_json)), {'c': {'before': 'cpu0 100\n', 'after': 'cpu0 150\n'}})
+
+
+def _dump(write):
+    path = tempfile.mktemp()
+    with open(path, 'w') as wfh:
+        write(wfh)
+    with open(path) as fh:
+        data = fh.read()
+    os.remove(path)
+    return data
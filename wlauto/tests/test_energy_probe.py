@@ -0,0 +1,82 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_almost_equal
+
+from wlauto.instrumentation import energy_probe
+from wlauto.instrumentation.energy_probe import process_raw_file
+
+
+CHANNELS = 2
+ROWS = 7
+CHUNK_SIZE = 3  # so that the last chunk is short
+
+
+class ProcessRawFileTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.raw_file = os.path.join(self.tempdir, '0000000000')
+        self.samples = [[(1000 * (r + 1) + c, 5000 + r, 200 + c) for c in xrange(CHANNELS)]
+                        for r in xrange(ROWS)]
+        with open(self.raw_file, 'wb') as wfh:
+            for row in self.samples:
+                for channel in row:
+                    wfh.write(struct.pack('<3I', *channel))
+            wfh.write('\x07' * 17)  # an incomplete sample
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _process(self, name):
+        csv_files = [os.path.join(self.tempdir, '{}_{}.csv'.format(name, c)) for c in xrange(CHANNELS)]
+        stats = process_raw_file(self.raw_file, csv_files, sample_rate=10, chunk_size=CHUNK_SIZE)
+        contents = []
+        for path in csv_files:
+            with open(path) as fh:
+                contents.append(fh.read())
+        return stats, contents
+
+    def test_process_raw_file(self):
+        stats, contents = self._process('numpy')
+
+        saved_np = energy_probe.np
+        energy_probe.np = None
+        try:
+            expected_stats, expected_contents = self._process('python')
+        finally:
+            energy_probe.np = saved_np
+
+        assert_equal(contents, expected_contents)
+        assert_equal(len(stats), CHANNELS)
+        for (power, energy), (expected_power, expected_energy) in zip(stats, expected_stats):
+            assert_almost_equal(power, expected_power)
+            assert_almost_equal(energy, expected_energy)
+
+        lines = expected_contents[1].splitlines()
+        assert_equal(lines[0], 'power,voltage,current')
+        assert_equal(len(lines), ROWS + 1)
+        assert_equal(lines[-1], '7.001,5.006,0.201')
+        powers = [row[0][0] / 1000.0 for row in self.samples]
+        assert_almost_equal(expected_stats[0][0], sum(powers) / ROWS)
+        assert_almost_equal(expected_stats[0][1], sum(powers) / 10)
@@ -158,6 +158,20 @@ class BadWorkload(Workload):
             raise self.exception("Teardown failed")
 
 
+class ResultManagerRecorder(Mock):
+
+    def __init__(self):
+        super(ResultManagerRecorder, self).__init__()
+        self.processed = []
+        self.recorded = []
+
+    def add_result(self, result, context):
+        self.processed.append((result.id, result.status))
+
+    def record_result(self, result):
+        self.recorded.append((result.id, result.status))
+
+
 class RunnerTest(TestCase):
 
     errors = 0
@@ -1030,6 +1044,34 @@ class RunnerTest(TestCase):
 
         self.signal_check(expected_signals, workloads)
 
+    def test_all_results_recorded(self):
+        workloads = [
+            WorkloadRunSpec(id='1', number_of_iterations=2, instrumentation=[]),
+            WorkloadRunSpec(id='2', number_of_iterations=1, instrumentation=[]),
+            WorkloadRunSpec(id='3', number_of_iterations=1, instrumentation=[]),
+        ]
+        workloads[0]._workload = Mock()
+        workloads[1]._workload = Mock()
+        workloads[1].enabled = False
+        workloads[2]._workload = BadWorkload(Exception, ["setup"])
+
+        context = Mock()
+        context.reboot_policy = RebootPolicy("never")
+        context.config.workload_specs = workloads
+        context.config.retry_on_status = []
+
+        result_manager = ResultManagerRecorder()
+        runner = BySpecRunner(Mock(), context, result_manager)
+        runner.init_queue(context.config.workload_specs)
+        runner.run()
+
+        # Skipped iterations, and those that fail during setup, are not
+        # processed, but their results must still be recorded.
+        assert_equal(result_manager.recorded, [('1', IterationResult.OK), ('1', IterationResult.OK),
+                                               ('2', IterationResult.SKIPPED), ('3', IterationResult.FAILED)])
+        assert_equal([r for r in result_manager.processed if r[0] != '3'],
+                     [('1', IterationResult.OK), ('1', IterationResult.OK)])
+
     def bad_device(self, method):
         workloads = [WorkloadRunSpec(id='1', number_of_iterations=1, instrumentation=[])]
         workloads[0]._workload = Mock()
@@ -0,0 +1,115 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false, raises
+
+from wlauto.devices.linux.fake import FakeDevice
+from wlauto.exceptions import DeviceError
+
+
+CPUFREQ = '/sys/devices/system/cpu/cpu0/cpufreq'
+
+
+class FakeDeviceTest(TestCase):
+
+    def setUp(self):
+        self.device = _instantiate(FakeDevice)
+        self.device.validate()
+        self.device.connect()
+
+    def tearDown(self):
+        root = self.device.root_directory
+        self.device.disconnect()
+        assert_false(os.path.exists(root))
+
+    def test_sysfs(self):
+        device = self.device
+        assert_equal(device.online_cpus, range(6))
+        assert_equal(device.number_of_cores, 6)
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_governor'), 'performance')
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_cur_freq', int), 1200000)
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/related_cpus'), '0 1 2 3')
+        assert_equal(device.listdir(CPUFREQ + '/ondemand'), ['sampling_rate', 'up_threshold'])
+        assert_equal([s['CPU part'] for s in device.cpuinfo.sections[:6]], ['0xd03'] * 4 + ['0xd08'] * 2)
+        assert_equal(device.abi, 'arm64')
+
+    def test_cpufreq(self):
+        device = self.device
+        device.set_sysfile_value(CPUFREQ + '/scaling_max_freq', 800000)
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_cur_freq', int), 800000)
+        device.set_sysfile_value(CPUFREQ + '/scaling_governor', 'powersave')
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_cur_freq', int), 200000)
+
+        # scaling_setspeed is only writable with the userspace governor.
+        device.set_sysfile_value(CPUFREQ + '/scaling_setspeed', 600000, verify=False)
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_cur_freq', int), 200000)
+        device.set_sysfile_value(CPUFREQ + '/scaling_governor', 'userspace')
+        device.set_sysfile_value(CPUFREQ + '/scaling_setspeed', 600000, verify=False)
+        assert_equal(device.get_sysfile_value(CPUFREQ + '/scaling_cur_freq', int), 600000)
+
+    @raises(DeviceError)
+    def test_invalid_governor(self):
+        self.device.set_sysfile_value(CPUFREQ + '/scaling_governor', 'schedutil')
+
+    def test_hotplug(self):
+        self.device.disable_cpu(1)
+        self.device.disable_cpu(4)
+        assert_equal(self.device.online_cpus, [0, 2, 3, 5])
+        assert_equal(self.device.get_number_of_online_cpus('a72'), 1)
+
+    def test_files(self):
+        device = self.device
+        host_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(host_dir, 'source.txt')
+            with open(source, 'w') as wfh:
+                wfh.write('contents')
+            on_device = device.path.join(device.working_directory, 'file.txt')
+            device.push_file(source, on_device)
+            assert_true(device.file_exists(on_device))
+            assert_true(device.is_file(on_device))
+            assert_equal(device.execute('cat {}'.format(on_device)), 'contents')
+            assert_true('file.txt' in device.listdir(device.working_directory))
+
+            pulled = os.path.join(host_dir, 'pulled.txt')
+            device.pull_file(on_device, pulled)
+            with open(pulled) as fh:
+                assert_equal(fh.read(), 'contents')
+
+            device.delete_file(on_device)
+            assert_false(device.file_exists(on_device))
+        finally:
+            shutil.rmtree(host_dir)
+
+    def test_latency(self):
+        device = self.device
+        device.command_latency = 0.01
+        device.command_count = 0
+        device.execute('true')
+        device.get_sysfile_value(CPUFREQ + '/scaling_governor')
+        assert_equal(device.command_count, 2)
+        assert_equal(device.simulated_latency, 0.02)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
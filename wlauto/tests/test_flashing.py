@@ -0,0 +1,181 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false
+
+from wlauto import settings
+from wlauto.modules import flashing
+from wlauto.modules.flashing import FastbootFlasher
+from wlauto.utils import assets
+
+
+class MockDevice(object):
+
+    name = 'mock_device'
+    adb_name = '0123456789'
+
+
+class FastbootFlasherTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.start_time = time.time()
+        self.saved_environment_root = settings.environment_root
+        settings.environment_root = os.path.join(self.tempdir, 'wa')
+        assets._indexes.clear()
+
+        self.flashed = []
+        self.commands = []
+        self.saved_functions = flashing.fastboot_flash_partition, flashing.fastboot_command
+        flashing.fastboot_flash_partition = lambda p, i: self.flashed.append((p, os.path.basename(i)))
+        flashing.fastboot_command = self.commands.append
+
+        self.flasher = _instantiate(FastbootFlasher, MockDevice())
+        self.flasher._fastboot_prelude = self._fastboot_prelude
+
+    def tearDown(self):
+        flashing.fastboot_flash_partition, flashing.fastboot_command = self.saved_functions
+        settings.environment_root = self.saved_environment_root
+        assets._indexes.clear()
+        shutil.rmtree(self.tempdir)
+
+    def _fastboot_prelude(self, device):
+        self.flasher.prelude_done = True
+
+    def _create_bundle(self, name, kernel, ramdisk):
+        bundle_dir = os.path.join(self.tempdir, name)
+        os.makedirs(bundle_dir)
+        for filename, contents in [('partitions.txt', 'kernel zImage\nramdisk ramdisk.img\n'),
+                                   ('zImage', kernel), ('ramdisk.img', ramdisk)]:
+            with open(os.path.join(bundle_dir, filename), 'w') as wfh:
+                wfh.write(contents)
+        bundle = os.path.join(self.tempdir, name + '.tar')
+        with tarfile.open(bundle, 'w') as tar:
+            for filename in os.listdir(bundle_dir):
+                tar.add(os.path.join(bundle_dir, filename), arcname=filename)
+        return bundle
+
+    def test_skip_unchanged(self):
+        bundle = self._create_bundle('first', 'kernel 1', 'ramdisk 1')
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(sorted(self.flashed), [('kernel', 'zImage'), ('ramdisk', 'ramdisk.img')])
+        assert_equal(self.commands, ['reboot'])
+
+        # Skipping is disabled by default.
+        self.flashed = []
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(len(self.flashed), 2)
+
+        # Nothing changed, so nothing should be flashed (and no reboot is needed).
+        self.flasher.skip_unchanged = True
+        self.flashed, self.commands[:] = [], []
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(self.flashed, [])
+        assert_equal(self.commands, [])
+
+        # Partitions the device writes to are always flashed.
+        self.flasher.skippable_partitions = ['kernel']
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(self.flashed, [('ramdisk', 'ramdisk.img')])
+        self.flasher.skippable_partitions = ['kernel', 'ramdisk']
+
+        # Only the kernel is different in the new bundle.
+        self.flashed, self.commands[:] = [], []
+        self.flasher.flash(image_bundle=self._create_bundle('second', 'kernel 2', 'ramdisk 1'))
+        assert_equal(self.flashed, [('kernel', 'zImage')])
+        assert_equal(self.commands, ['reboot'])
+
+        self.flashed = []
+        self.flasher.skip_unchanged = False
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(len(self.flashed), 2)
+
+    def test_image_rewritten_in_place(self):
+        self.flasher.skip_unchanged = True
+        image = os.path.join(self.tempdir, 'Image')
+        self._write_in_place(image, 'kernel 1')
+        self.flasher.flash(images={'kernel': image})
+        assert_equal(self.flashed, [('kernel', 'Image')])
+
+        self._write_in_place(image, 'kernel 2')
+        self.flashed = []
+        self.flasher.flash(images={'kernel': image})
+        assert_equal(self.flashed, [('kernel', 'Image')])
+
+    def test_bundle_rewritten_in_place(self):
+        self.flasher.skip_unchanged = True
+        bundle = self._create_bundle('first', 'kernel 1', 'ramdisk 1')
+        self.flasher.flash(image_bundle=bundle)
+        self._age_directory(self.tempdir)
+        self.flasher.flash(image_bundle=bundle)  # indexes the aged directory
+
+        shutil.rmtree(os.path.join(self.tempdir, 'first'))
+        self._create_bundle('first', 'kernel 2', 'ramdisk 1')  # truncates and rewrites the tar
+        self._age_directory(self.tempdir)
+        self.flashed = []
+        self.flasher.flash(image_bundle=bundle)
+        assert_equal(self.flashed, [('kernel', 'zImage')])
+
+    def _write_in_place(self, path, contents):
+        with open(path, 'w') as wfh:
+            wfh.write(contents)
+        self._age_directory(os.path.dirname(path))
+
+    def _age_directory(self, path):
+        # Always set to the same time, so that the directory does not appear to
+        # have changed since it was last indexed; only the files in it have.
+        os.utime(path, (self.start_time - 3600, self.start_time - 3600))
+
+    def test_failed_flash(self):
+        bundle = self._create_bundle('first', 'kernel 1', 'ramdisk 1')
+        self.flasher.flash(image_bundle=bundle)
+
+        def fail(partition, image):
+            raise RuntimeError('flashing failed')
+
+        flashing.fastboot_flash_partition = fail
+        try:
+            self.flasher.flash(image_bundle=bundle)
+        except RuntimeError:
+            pass
+        record = flashing.FlashCache().get_device_record(MockDevice.adb_name)
+        assert_equal(len(record.partitions), 1)  # the partition that failed was invalidated
+
+    def test_bundle_cache(self):
+        cache = flashing.FlashCache()
+        cache.max_bundles = 1
+        first = self._create_bundle('first', 'kernel 1', 'ramdisk 1')
+        second = self._create_bundle('second', 'kernel 2', 'ramdisk 1')
+        assert_equal(cache.get_extracted_bundle(first), None)
+        first_dir = cache.extract_bundle(first)
+        assert_equal(cache.get_extracted_bundle(first), first_dir)
+        assert_true(os.path.isfile(os.path.join(first_dir, 'zImage')))
+        second_dir = cache.extract_bundle(second)
+        assert_true(os.path.isdir(second_dir))
+        assert_false(os.path.exists(first_dir))
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
@@ -0,0 +1,208 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201,protected-access
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false, raises
+
+from wlauto.exceptions import DeviceError
+
+from wlauto.devices.android.gem5 import Gem5AndroidDevice
+from wlauto.devices.linux.gem5 import Gem5LinuxDevice
+
+
+class Gem5RestoreTest(TestCase):
+
+    def _create_device(self, cls, **kwargs):
+        device = _instantiate(cls, gem5_args='fs.py', gem5_vio_args='--root={}',
+                              working_directory='/root/wa', binaries_directory='/root/wa/bin', **kwargs)
+        device.dynamic_modules = []
+        self.calls = []
+        device.gem5_shell = self._gem5_shell
+        for name in ['connect_gem5', 'stop_gem5', 'start_gem5', 'deploy_m5', 'deploy_busybox',
+                     'deploy_sqlite3', 'disable_screen_lock', 'disable_selinux', 'ensure_screen_is_on']:
+            setattr(device, name, self._recorder(name))
+        device.has_cached_checkpoint = lambda: True
+        return device
+
+    def _gem5_shell(self, command, **kwargs):
+        self.calls.append(command)
+        return ''
+
+    def _recorder(self, name):
+        def record(*args, **kwargs):
+            self.calls.append(name)
+            return name
+        return record
+
+    def _restore(self, device):
+        # As in a run: the device is initialized, and later restored from a
+        # checkpoint taken before it was initialized. initialize() is globally
+        # virtual, so it only takes effect for the first device created here.
+        context = object()
+        device._is_ready = True
+        device.initialize(context)
+        device._init_context = context
+        self.calls = []
+        device.restored = True
+        device.gem5_start_time = time.time()
+        device.connect()
+
+    def test_linux_restore(self):
+        device = self._create_device(Gem5LinuxDevice, username='root')
+        self._restore(device)
+        assert_true(device._post_boot)
+        for call in ['mkdir -p /root/wa/bin', 'export PATH=/root/wa/bin:$PATH', 'deploy_busybox',
+                     'stty columns 1024', 'deploy_m5']:
+            assert_true(call in self.calls, call)
+        assert_equal(self.calls.count('deploy_m5'), 1)
+        assert_equal(device.busybox, 'deploy_busybox')
+
+    def test_android_restore(self):
+        device = self._create_device(Gem5AndroidDevice)
+        self._restore(device)
+        for call in ['deploy_busybox', 'deploy_sqlite3', 'disable_selinux', 'stty columns 1024', 'deploy_m5']:
+            assert_true(call in self.calls, call)
+
+    def test_boot_after_restore(self):
+        device = self._create_device(Gem5LinuxDevice, username='root')
+        self._restore(device)
+
+        # Commands run by connect() and initialize() do not count as the system
+        # having been used, so it is not rebooted straight away...
+        device.boot()
+        assert_false('start_gem5' in self.calls)
+
+        # ...but it is once a job has started.
+        device.start()
+        assert_false(device._post_boot)
+        device.boot()
+        assert_equal(self.calls[-2:], ['stop_gem5', 'start_gem5'])
+        assert_equal(device.restore_count, 1)
+
+
+class Gem5TransferTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.device = _instantiate(Gem5LinuxDevice, gem5_args='fs.py', gem5_vio_args='--root={}',
+                                   username='root')
+        self.device.busybox = '/root/wa/bin/busybox'
+        self.device.temp_dir = os.path.join(self.tempdir, 'vio')
+        self.device.gem5outdir = os.path.join(self.tempdir, 'm5out')
+        os.mkdir(self.device.temp_dir)
+        os.mkdir(self.device.gem5outdir)
+        self.device.gem5_shell = self._gem5_shell
+        self.device.gem5_util = self._gem5_util
+        self.device.push_file = lambda source, dest, **kwargs: self.single.append((source, dest))
+        self.device.pull_file = lambda source, dest, **kwargs: self.single.append((source, dest))
+        self.commands = []
+        self.single = []
+        self.pushed = None
+        self.guest_files = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _gem5_shell(self, command, **kwargs):
+        self.commands.append(command)
+        if ' tar -xf /mnt/obb/' in command:
+            archive = os.path.join(self.device.temp_dir, command.split('/mnt/obb/')[1].split()[0])
+            with tarfile.open(archive) as tar:
+                self.pushed = dict((m.name, tar.extractfile(m).read()) for m in tar)
+        elif ' tar -cf ' in command:
+            # Simulate the archive being created in the guest's working directory.
+            self.guest_archive = os.path.join(self.tempdir, 'guest.tar')
+            with tarfile.open(self.guest_archive, 'w') as tar:
+                for source in command.split(' && ')[0].split()[4:]:
+                    path = os.path.join(self.tempdir, 'guest', source.lstrip('/'))
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    with open(path, 'w') as wfh:
+                        wfh.write(self.guest_files[source])
+                    tar.add(path, arcname=source.lstrip('/'))
+            return str(os.path.getsize(self.guest_archive))
+        return ''
+
+    def _gem5_util(self, command):
+        self.commands.append(command)
+        filename = command.split()[-1]
+        shutil.copy(self.guest_archive, os.path.join(self.device.gem5outdir, filename))
+
+    def _write(self, name, contents):
+        path = os.path.join(self.tempdir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as wfh:
+            wfh.write(contents)
+        return path
+
+    def test_push_files(self):
+        first = self._write('a/data.txt', 'first')
+        second = self._write('b/data.txt', 'second')
+        self.device.push_files([(first, '/data/one/data.txt'), (second, '/data/two/data.txt'),
+                                (first, 'relative.txt')])
+        assert_equal(self.pushed, {'data/one/data.txt': 'first', 'data/two/data.txt': 'second'})
+        assert_equal(self.commands, ['/root/wa/bin/busybox tar -xf /mnt/obb/wa_push.tar -C / && sync'])
+        assert_equal(self.single, [(first, 'relative.txt')])
+        assert_equal(os.listdir(self.device.temp_dir), [])
+
+    def test_pull_files(self):
+        self.guest_files = {'/sys/one/data.txt': 'first', '/sys/two/data.txt': 'second'}
+        first = os.path.join(self.tempdir, 'first.txt')
+        second = os.path.join(self.tempdir, 'second.txt')
+        self.device.pull_files([('/sys/one/data.txt', first), ('/sys/two/data.txt', second)])
+        with open(first) as fh:
+            assert_equal(fh.read(), 'first')
+        with open(second) as fh:
+            assert_equal(fh.read(), 'second')
+        assert_equal(self.single, [])
+        assert_equal(self.commands[-1], 'rm -f wa_pull.tar')
+        assert_equal(os.listdir(self.device.temp_dir), [])
+        assert_equal(os.listdir(self.device.gem5outdir), [])
+
+    def test_pull_files_fallback(self):
+        files = [('/sys/data.txt', 'first.txt'), ('sys/data.txt', 'second.txt')]
+        self.device.pull_files(files)
+        assert_equal(self.single, files)
+        self.single = []
+        self.device.busybox = None
+        self.device.pull_files(files[:1] + [('/sys/other.txt', 'third.txt')])
+        assert_equal(len(self.single), 2)
+        assert_equal(self.commands, [])
+
+    @raises(DeviceError)
+    def test_wait_for_host_file_timeout(self):
+        self.device.wait_for_host_file(os.path.join(self.tempdir, 'missing'), 10, timeout=0.1)
+
+    @raises(DeviceError)
+    def test_wait_for_host_file_gem5_exited(self):
+        class ExitedProcess(object):
+            def poll(self):
+                return 1
+        self.device.gem5 = ExitedProcess()
+        self.device.wait_for_host_file(os.path.join(self.tempdir, 'missing'), 10)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
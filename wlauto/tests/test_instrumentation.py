@@ -230,6 +230,82 @@ class InstrumentationTest(TestCase):
         instrumentation.install(instrument2)
 
 
+class Receiver(object):
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def __call__(self, context):
+        self.calls.append((self.name, context))
+
+    def handle(self, context, signal):
+        self.calls.append((self.name, context, signal.name))
+
+
+BEFORE_TEST_SIGNAL = signal.Signal('before-test-signal', invert_priority=True)
+TEST_SIGNAL = signal.Signal('test-signal')
+
+
+class SignalDispatchTest(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.connected = []
+
+    def tearDown(self):
+        for handler, sig in self.connected:
+            signal.disconnect(handler, sig)
+
+    def connect(self, handler, sig, priority=0):
+        signal.connect(handler, sig, priority=priority)
+        self.connected.append((handler, sig))
+
+    def test_priority_and_kwargs(self):
+        low = Receiver('low', self.calls)
+        high = Receiver('high', self.calls)
+        self.connect(low.handle, BEFORE_TEST_SIGNAL, priority=-1)
+        self.connect(high, BEFORE_TEST_SIGNAL, priority=1)
+        for _ in xrange(2):
+            signal.send(BEFORE_TEST_SIGNAL, self, context='ctx')
+        # BEFORE_ signals have inverted priorities
+        expected = [('low', 'ctx', 'before-test-signal'), ('high', 'ctx')]
+        assert_equal(self.calls, expected * 2)
+
+    def test_connect_and_disconnect(self):
+        first = Receiver('first', self.calls)
+        second = Receiver('second', self.calls)
+        self.connect(first.handle, TEST_SIGNAL)
+        signal.send(TEST_SIGNAL, self, context=1)
+        self.connect(second.handle, TEST_SIGNAL)
+        signal.send(TEST_SIGNAL, self, context=2)
+        signal.disconnect(first.handle, TEST_SIGNAL)
+        signal.send(TEST_SIGNAL, self, context=3)
+        assert_equal(sorted(self.calls), [('first', 1, 'test-signal'),
+                                          ('first', 2, 'test-signal'),
+                                          ('second', 2, 'test-signal'),
+                                          ('second', 3, 'test-signal')])
+
+    def test_garbage_collected_receiver(self):
+        receiver = Receiver('gone', self.calls)
+        signal.connect(receiver.handle, TEST_SIGNAL)
+        signal.send(TEST_SIGNAL, self, context=1)
+        del receiver
+        signal.send(TEST_SIGNAL, self, context=2)
+        assert_equal(self.calls, [('gone', 1, 'test-signal')])
+
+    def test_garbage_collected_sender(self):
+        receiver = Receiver('receiver', self.calls)
+        self.connect(receiver.handle, TEST_SIGNAL)
+        sender = Receiver('sender', [])
+        signal.send(TEST_SIGNAL, sender, context=1)
+        assert_equal(len(signal._dispatch_tables), 1)
+        del sender
+        assert_equal(signal._dispatch_tables, {})
+        signal.send(TEST_SIGNAL, Receiver('sender', []), context=2)
+        assert_equal(self.calls, [('receiver', 1, 'test-signal'), ('receiver', 2, 'test-signal')])
+
+
 def _instantiate(cls):
     # Needed to get around Extension's __init__ checks
     return cls()
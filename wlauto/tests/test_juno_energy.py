@@ -0,0 +1,84 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_almost_equal
+
+from wlauto.instrumentation.juno_energy import JunoEnergy
+
+
+HEADER = 'sys_curr,sys_volt,sys_pow,sys_cenr\n'
+
+
+class MockDevice(object):
+
+    name = 'juno'
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def pull_file(self, source, dest):
+        with open(dest, 'w') as wfh:
+            wfh.write(self.contents)
+
+
+class MockContext(object):
+
+    def __init__(self, output_directory):
+        self.output_directory = output_directory
+        self.metrics = {}
+
+    def add_metric(self, name, value, units=None, lower_is_better=False):
+        self.metrics[name] = value
+
+    def add_artifact(self, name, path, kind, *args, **kwargs):
+        pass
+
+
+class JunoEnergyTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.context = MockContext(self.tempdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _update_result(self, contents):
+        instrument = _instantiate(JunoEnergy, MockDevice(contents))
+        instrument.host_output_file = os.path.join(self.tempdir, 'energy.csv')
+        instrument.device_output_file = 'energy.csv'
+        instrument.update_result(self.context)
+        return self.context.metrics
+
+    def test_metrics(self):
+        metrics = self._update_result(HEADER + '1.0,0.9,0.9,10\n3.0,0.9,2.7,12.5\n')
+        assert_almost_equal(metrics['sys_curr'], 2.0)
+        assert_almost_equal(metrics['sys_pow'], 1.8)
+        assert_almost_equal(metrics['sys_cenr'], 2.5)
+
+    def test_no_samples(self):
+        assert_equal(self._update_result(HEADER), {})
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
@@ -0,0 +1,244 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import itertools
+from datetime import timedelta
+from collections import defaultdict
+from unittest import TestCase
+from multiprocessing.pool import ThreadPool
+
+from nose.tools import assert_equal, assert_true, assert_false
+
+from wlauto import Artifact
+from wlauto.result_processors import mongodb
+from wlauto.result_processors.mongodb import MongodbUploader
+
+
+class FakeGridOut(object):
+
+    def __init__(self, fsid, data, fields):
+        self._id = fsid
+        self.data = data
+        self.filename = fields.get('filename')
+        self.fields = fields
+
+
+class FakeGridFS(object):
+    """An in-process stand-in for gridfs.GridFS."""
+
+    def __init__(self):
+        self.files = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, fh, **kwargs):
+        data = fh.read()
+        with self._lock:
+            fsid = next(self._ids)
+            self.files.append(FakeGridOut(fsid, data, kwargs))
+        return fsid
+
+    def find_one(self, query):
+        with self._lock:
+            for f in self.files:
+                if all(f.fields.get(k) == v for k, v in query.iteritems()):
+                    return f
+
+    def exists(self, query):
+        return False
+
+
+class FakeCollection(object):
+
+    def __init__(self):
+        self.updates = []
+        self.indexes = []
+
+    def insert(self, document):
+        return 'run'
+
+    def update(self, spec, document):
+        self.updates.append((spec, document))
+
+    def create_index(self, key):
+        self.indexes.append(key)
+
+
+class FakeDatabase(object):
+
+    def __init__(self):
+        self.runs = FakeCollection()
+        self.fs = FakeCollection()
+        self.fs.files = FakeCollection()  # the collection GridFS stores file metadata in
+
+
+class FakePymongo(object):
+    """Stands in for the pymongo module, connecting to a single FakeDatabase."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def MongoClient(self, host, port, **kwargs):  # pylint: disable=invalid-name
+        return defaultdict(lambda: self.database)
+
+
+class MockSpec(object):
+
+    def __init__(self, spec_id):
+        self.id = spec_id
+        self.label = 'workload'
+
+
+class MockRunInfo(object):
+
+    project = 'project'
+    run_name = 'run'
+    end_time = None
+    duration = timedelta(seconds=10)
+
+    def to_dict(self):
+        return {'device': 'generic_android', 'device_properties': {}}
+
+
+class MockConfig(object):
+
+    def to_dict(self):
+        return {'workload_specs': []}
+
+
+class MockContext(object):
+
+    def __init__(self, output_directory):
+        self.output_directory = output_directory
+        self.run_info = MockRunInfo()
+        self.config = MockConfig()
+        self.workload = None
+        self.spec = None
+        self.current_iteration = None
+        self.iteration_artifacts = []
+        self.run_artifacts = []
+
+
+class MockResult(object):
+
+    status = 'OK'
+    events = []
+    metrics = []
+
+
+class MongodbUploaderTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.context = MockContext(self.tempdir)
+        self.uploader = _instantiate(MongodbUploader, batch_size=3)
+        self.uploader.dbc = FakeDatabase()
+        self.uploader.fs = FakeGridFS()
+        self.uploader.run_dbid = 'run'
+        self.uploader.gridfs_dir = 'project/run'
+        self.uploader.artifacts = []
+        self.uploader.pool = ThreadPool(self.uploader.upload_threads)
+        self.uploader.pending_results = []
+        self.uploader._digest_locks = {}
+        self.uploader._digest_locks_lock = threading.Lock()
+
+    def tearDown(self):
+        self.uploader.pool.close()
+        self.uploader.pool.join()
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, path, contents):
+        with open(os.path.join(self.tempdir, path), 'w') as wfh:
+            wfh.write(contents)
+
+    def _run_iteration(self, spec_id, iteration):
+        self.context.workload = object()
+        self.context.spec = MockSpec(spec_id)
+        self.context.current_iteration = iteration
+        path = 'trace-{}-{}.txt'.format(spec_id, iteration)
+        self._write(path, 'trace contents')  # identical in every iteration
+        self.context.iteration_artifacts = [Artifact('trace', path, 'data', level=Artifact.ITERATION)]
+        self.uploader.export_iteration_result(MockResult(), self.context)
+
+    def test_upload(self):
+        for spec_id, iteration in [('1', 1), ('2', 1), ('1', 2), ('2', 2)]:
+            self._run_iteration(spec_id, iteration)
+        # The first three results are written in a single batch.
+        updates = self.uploader.dbc.runs.updates
+        assert_equal([spec['workloads.id'] for spec, _ in updates], ['1', '2'])
+        assert_equal(len(updates[0][1]['$push']['workloads.$.results']['$each']), 2)
+        assert_equal(len(self.uploader.pending_results), 1)
+
+        self.context.workload = None
+        self._write('run.log', 'log')
+        self._write('untracked.txt', 'not an artifact')
+        self._write('raw.txt', 'raw artifact')
+        self.context.run_artifacts = [Artifact('runlog', 'run.log', 'log'),
+                                      Artifact('raw', 'raw.txt', 'raw')]
+        self.uploader.export_run_result(MockResult(), self.context)
+
+        updates = self.uploader.dbc.runs.updates
+        assert_equal(len(updates), 4)
+        assert_equal(updates[2][0]['workloads.id'], '2')
+        run_stats = updates[3][1]['$set']
+        assert_equal([a['filename'] for a in run_stats['artifacts']],
+                     ['project/run/run.log', 'project/run/files.tar.gz'])
+        with tarfile.open(os.path.join(self.tempdir, 'files.tar.gz')) as tf:
+            names = tf.getnames()
+        assert_true('untracked.txt' in names)
+        assert_true('raw.txt' in names)
+        assert_false('run.log' in names)
+
+        # The trace contents were identical in every iteration, so were only stored once.
+        fs = self.uploader.fs
+        assert_equal(len([f for f in fs.files if f.data == 'trace contents']), 1)
+        results = updates[0][1]['$push']['workloads.$.results']['$each']
+        entries = [r['artifacts'][0] for r in results]
+        assert_equal(entries[0]['gridfs_id'], entries[1]['gridfs_id'])
+        assert_equal(entries[1]['filename'], 'project/run/1-workload-2/trace-1-2.txt')
+
+    def test_initialize(self):
+        saved = dict((name, getattr(mongodb, name, None)) for name in ['pymongo', 'GridFS', 'ObjectId'])
+        database = FakeDatabase()
+        mongodb.pymongo = FakePymongo(database)
+        mongodb.GridFS = lambda dbc: FakeGridFS()
+        mongodb.ObjectId = object
+        self.uploader.pool.close()
+        try:
+            self.uploader.initialize.implementation(self.uploader, self.context)
+        finally:
+            for name, value in saved.iteritems():
+                setattr(mongodb, name, value)
+        assert_true(self.uploader.dbc is database)
+        assert_equal(database.fs.files.indexes, ['sha256'])
+
+    def test_no_deduplication(self):
+        self.uploader.deduplicate = False
+        for iteration in xrange(1, 4):
+            self._run_iteration('1', iteration)
+        assert_equal(len(self.uploader.fs.files), 3)
+        assert_false('sha256' in self.uploader.fs.files[0].fields)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
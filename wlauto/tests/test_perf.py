@@ -0,0 +1,128 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import csv
+import shutil
+import tempfile
+from unittest import TestCase
+from StringIO import StringIO
+
+from nose.tools import assert_equal
+
+from wlauto.instrumentation.perf import FoldedStackAggregator, parse_interval_output, np
+
+
+PER_CPU_OUTPUT = """\
+#           time cpu                 counts unit events
+     0.100123456,CPU0,100,,cs,100123456,100.00
+     0.100123456,CPU1,20,,cs,100123456,100.00
+     0.100123456,CPU0,3,,migrations,100123456,100.00
+     0.100123456,CPU1,<not counted>,,migrations,0,100.00
+     0.200234567,CPU0,300,,cs,100123456,100.00
+     0.200234567,CPU1,40,,cs,100123456,100.00
+     0.200234567,CPU0,1,,migrations,100123456,100.00
+     0.200234567,CPU1,2,,migrations,100123456,100.00
+     0.300345678,CPU0,200,,cs,100123456,100.00
+     0.300345678,CPU1,60,,cs,100123456,100.00
+     0.300345678,CPU0,2,,migrations,100123456,100.00
+     0.300345678,CPU1,4,,migrations,100123456,100.00
+"""
+
+# Older versions of perf do not output the unit field.
+AGGREGATE_OUTPUT = """\
+     1.000100000,1024,cs
+     1.000100000,12.51,task-clock
+     2.000200000,2048,cs
+     2.000200000,11.25,task-clock
+"""
+
+
+class PerfIntervalTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_parse_per_cpu(self):
+        series = parse_interval_output(PER_CPU_OUTPUT.splitlines(True))
+        assert_equal(series.times, [0.100123456, 0.200234567, 0.300345678])
+        assert_equal(series.columns.keys(), [(0, 'cs'), (1, 'cs'), (0, 'migrations'), (1, 'migrations')])
+        assert_equal(series.columns[(1, 'migrations')], [None, 2, 4])
+
+        stats = dict(((cpu, event), s) for cpu, event, s in series.iter_stats())
+        assert_equal(stats[(0, 'cs')].total, 600)
+        assert_equal(stats[(0, 'cs')].mean, 200)
+        assert_equal(stats[(0, 'cs')].p95, 300)
+        assert_equal(stats[(0, 'cs')].max, 300)
+        assert_equal(stats[(1, 'migrations')].total, 6)
+
+    def test_parse_aggregate(self):
+        series = parse_interval_output(AGGREGATE_OUTPUT.splitlines(True))
+        assert_equal(series.columns.keys(), [(None, 'cs'), (None, 'task-clock')])
+        assert_equal(series.columns[(None, 'task-clock')], [12.51, 11.25])
+        assert_equal(series.get_column_names(), ['cs', 'task-clock'])
+
+    def test_write(self):
+        series = parse_interval_output(PER_CPU_OUTPUT.splitlines(True))
+        csv_file = os.path.join(self.tempdir, 'intervals.csv')
+        with open(csv_file, 'wb') as wfh:
+            series.write_csv(wfh)
+        with open(csv_file) as fh:
+            rows = list(csv.reader(fh))
+        assert_equal(rows[0], ['time', '0_cs', '1_cs', '0_migrations', '1_migrations'])
+        assert_equal(rows[1][1:], ['100', '20', '3', ''])
+        assert_equal(len(rows), 4)
+
+        if np is not None:
+            npz_file = os.path.join(self.tempdir, 'intervals.npz')
+            series.write_npz(npz_file)
+            data = np.load(npz_file)
+            assert_equal(data['values'].shape, (3, 4))
+            assert_equal(data['values'][2, 3], 4)
+            assert_equal(list(data['columns']), series.get_column_names())
+
+
+class FoldedStackAggregatorTest(TestCase):
+
+    def _aggregate(self, filename):
+        with open(os.path.join(os.path.dirname(__file__), 'data', 'perf', filename)) as fh:
+            return FoldedStackAggregator().update(fh).finalize()
+
+    def test_call_graph(self):
+        aggregator = self._aggregate('script.txt')
+        assert_equal(aggregator.total, 5)
+        assert_equal(dict(aggregator.stacks), {
+            'surfaceflinger;[libc.so];irq_exit;__do_softirq': 1,
+            'surfaceflinger;__start_thread;android::SurfaceFlinger::onMessageReceived(int);memcpy': 2,
+            'RenderThread 2;[unknown];memcpy': 1,
+            'swapper;cpu_idle_loop': 1,
+        })
+        assert_equal(aggregator.get_top_symbols(2), [(('memcpy', '/system/lib64/libc.so'), 3),
+                                                     (('__do_softirq', '[kernel.kallsyms]'), 1)])
+        assert_equal(aggregator.get_top_dsos(1), [('/system/lib64/libc.so', 3)])
+
+        output = StringIO()
+        aggregator.write_folded(output)
+        assert_equal(output.getvalue().splitlines()[0], 'RenderThread 2;[unknown];memcpy 1')
+
+    def test_no_call_graph(self):
+        aggregator = self._aggregate('script_no_callgraph.txt')
+        assert_equal(dict(aggregator.stacks), {'dhrystone;Proc_1': 2, 'dhrystone;main': 1})
+        assert_equal(aggregator.get_top_symbols(1), [(('Proc_1', '/data/local/tmp/dhrystone'), 2)])
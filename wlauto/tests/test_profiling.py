@@ -0,0 +1,112 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import csv
+import json
+import shutil
+import pstats
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false, raises
+
+from wlauto.core import profiling
+
+
+class MockDevice(object):
+
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, command, timeout=None):
+        self.commands.append(command)
+        return ''
+
+    def push_file(self, source, dest):
+        pass
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        profiling.reset()
+
+    def tearDown(self):
+        profiling.reset()
+        shutil.rmtree(self.tempdir)
+
+    def test_jobs(self):
+        profiling.record('signal', 'start-signal', 1.0)
+        profiling.start_job('1', 'dhrystone', 1)
+        profiling.record('instrument', 'trace-cmd.start', 0.5)
+        profiling.record('instrument', 'trace-cmd.start', 1.5)
+        profiling.end_job('OK')
+        profiling.start_job('1', 'dhrystone', 2)
+        profiling.record('instrument', 'trace-cmd.start', 2.0)
+        profiling.end_job('FAILED')
+
+        profile = profiling.get_profile()
+        stats = profile.timings.categories['instrument']['trace-cmd.start']
+        assert_equal((stats.count, stats.total, stats.max), (3, 4.0, 2.0))
+        assert_equal([job.status for job in profile.jobs], ['OK', 'FAILED'])
+        job_stats = profile.jobs[0].timings.categories['instrument']['trace-cmd.start']
+        assert_equal((job_stats.count, job_stats.total), (2, 2.0))
+        assert_false('signal' in profile.jobs[0].timings.categories)
+        assert_equal(sorted(profile.timings.categories['job']), ['dhrystone_1_1', 'dhrystone_1_2'])
+
+    def test_wrap_device(self):
+        device = MockDevice()
+        profiling.wrap_device(device)
+        profiling.wrap_device(device)  # should not be wrapped twice
+        device.execute('/data/local/tmp/bin/busybox cat /proc/stat', timeout=10)
+        device.execute('ls')
+        device.push_file('a', 'b')
+        assert_equal(device.commands, ['/data/local/tmp/bin/busybox cat /proc/stat', 'ls'])
+        timings = profiling.get_profile().timings.categories['device']
+        assert_equal(sorted(timings), ['execute: busybox', 'execute: ls', 'push_file'])
+        assert_equal(timings['execute: busybox'].count, 1)
+
+    def test_write(self):
+        profiling.reset('workload_setup')
+        with profiling.phase('workload_setup'):
+            with profiling.timed('workload', 'dhrystone.setup'):
+                sum(xrange(1000))
+        with profiling.phase('workload_execution'):
+            pass
+        json_file = profiling.write(self.tempdir)
+
+        with open(json_file) as fh:
+            profile = json.load(fh)
+        assert_equal(profile['profile_phase'], 'workload_setup')
+        assert_equal(sorted(profile['timings']['phase']), ['workload_execution', 'workload_setup'])
+        assert_equal(profile['timings']['workload']['dhrystone.setup']['count'], 1)
+
+        with open(os.path.join(self.tempdir, 'run_profile.csv')) as fh:
+            rows = list(csv.reader(fh))
+        assert_equal(rows[0], ['category', 'name', 'count', 'total', 'mean', 'max'])
+        assert_equal(sorted(r[:3] for r in rows[1:]), [['phase', 'workload_execution', '1'],
+                                                       ['phase', 'workload_setup', '1'],
+                                                       ['workload', 'dhrystone.setup', '1']])
+
+        stats = pstats.Stats(os.path.join(self.tempdir, 'run_profile.pstats'))
+        assert_true(any('sum' in func[2] for func in stats.stats))
+
+    @raises(ValueError)
+    def test_bad_phase(self):
+        profiling.reset('not_a_phase')
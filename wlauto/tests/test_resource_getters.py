@@ -0,0 +1,163 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from unittest import TestCase
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from nose.tools import assert_equal, assert_true, assert_false
+
+from wlauto import File, settings
+from wlauto.core.extension import Extension
+from wlauto.resource_getters.standard import HttpGetter
+from wlauto.utils import assets
+
+
+ASSET_DATA = ''.join(chr(i % 256) for i in xrange(100000))
+
+INDEX = {
+    'foo': [
+        {'path': 'foo.bin', 'sha256': hashlib.sha256(ASSET_DATA).hexdigest()},
+    ],
+}
+
+
+class AssetsRequestHandler(BaseHTTPRequestHandler):
+    """Serves INDEX and ASSET_DATA, supporting single byte ranges."""
+
+    requests = []
+
+    def do_GET(self):
+        AssetsRequestHandler.requests.append((self.path, self.headers.get('Range')))
+        if self.path.endswith('/index.json'):
+            data = json.dumps(INDEX)
+        elif self.path.endswith('/foo/foo.bin'):
+            data = ASSET_DATA
+        else:
+            self.send_error(404)
+            return
+        range_header = self.headers.get('Range')
+        if range_header:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(data) - 1, len(data)))
+            data = data[start:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class NamedExtension(Extension):
+    def __init__(self, name, **kwargs):
+        super(NamedExtension, self).__init__(**kwargs)
+        self.name = name
+
+
+class TestHttpGetter(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.saved_settings = settings.environment_root, settings.dependencies_directory
+        settings.environment_root = self.tempdir
+        settings.dependencies_directory = os.path.join(self.tempdir, 'dependencies')
+        assets._indexes.clear()
+
+        self.server = HTTPServer(('localhost', 0), AssetsRequestHandler)
+        url = 'http://localhost:{}/assets'.format(self.server.server_address[1])
+        self.getter = _instantiate(HttpGetter, None, url=url)
+        self.resource = File(_instantiate(NamedExtension, 'foo'), 'foo.bin')
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        AssetsRequestHandler.requests = []
+        self.local_path = os.path.join(settings.dependencies_directory, '__remote', 'foo', 'foo.bin')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.server_close()
+        settings.environment_root, settings.dependencies_directory = self.saved_settings
+        assets._indexes.clear()
+        shutil.rmtree(self.tempdir)
+
+    def test_download(self):
+        path = self.getter.get(self.resource)
+        assert_equal(path, self.local_path)
+        with open(path, 'rb') as fh:
+            assert_equal(fh.read(), ASSET_DATA)
+        assert_false(os.path.exists(path + '.part'))
+
+        # The local copy is verified from the cached hash, without a download.
+        AssetsRequestHandler.requests = []
+        assert_equal(self.getter.get(self.resource), self.local_path)
+        assert_equal(AssetsRequestHandler.requests, [])
+
+    def test_resume(self):
+        os.makedirs(os.path.dirname(self.local_path))
+        with open(self.local_path + '.part', 'wb') as wfh:
+            wfh.write(ASSET_DATA[:40000])
+        path = self.getter.get(self.resource)
+        assert_equal(AssetsRequestHandler.requests[-1], ('/assets/foo/foo.bin', 'bytes=40000-'))
+        with open(path, 'rb') as fh:
+            assert_equal(fh.read(), ASSET_DATA)
+
+    def test_corrupt_partial_download(self):
+        os.makedirs(os.path.dirname(self.local_path))
+        with open(self.local_path + '.part', 'wb') as wfh:
+            wfh.write('x' * 40000)
+        path = self.getter.get(self.resource)
+        assert_true(path)
+        assert_equal(AssetsRequestHandler.requests[-1], ('/assets/foo/foo.bin', None))
+        with open(path, 'rb') as fh:
+            assert_equal(fh.read(), ASSET_DATA)
+
+    def test_corrupt_local_copy(self):
+        path = self.getter.get(self.resource)
+        local_dir = os.path.dirname(path)
+        old = time.time() - 3600
+        for corrupt in [ASSET_DATA[:40000], 'x' * len(ASSET_DATA)]:
+            # Index the directory with an old modification time...
+            os.utime(local_dir, (old, old))
+            self.getter.get(self.resource)
+            # ...then truncate or overwrite the local copy in place, without
+            # the directory's modification time changing.
+            with open(path, 'wb') as wfh:
+                wfh.write(corrupt)
+            os.utime(local_dir, (old, old))
+            AssetsRequestHandler.requests = []
+            assert_equal(self.getter.get(self.resource), self.local_path)
+            assert_equal(AssetsRequestHandler.requests, [('/assets/foo/foo.bin', None)])
+            with open(path, 'rb') as fh:
+                assert_equal(fh.read(), ASSET_DATA)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
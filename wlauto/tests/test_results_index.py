@@ -0,0 +1,137 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+
+from nose.tools import assert_equal, raises
+
+from wlauto.utils.resultindex import ResultIndex, ResultIndexError
+
+
+RESULTS_CSV = """\
+id,workload,iteration,metric,cluster,value,units
+1,dhrystone,1,score,big,100,
+1,dhrystone,1,score,little,50,
+1,dhrystone,2,score,big,110,
+"""
+
+
+def make_record(spec_id, workload, iteration, metrics, status='OK'):
+    return {
+        'id': spec_id,
+        'workload': workload,
+        'label': workload,
+        'iteration': iteration,
+        'status': status,
+        'summary_metrics': [],
+        'events': [],
+        'metrics': [{'name': name, 'value': value, 'units': 'ms', 'lower_is_better': True,
+                     'classifiers': classifiers}
+                    for name, value, classifiers in metrics],
+    }
+
+
+class ResultIndexTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.outputs = os.path.join(self.tempdir, 'outputs')
+        self.index = ResultIndex(os.path.join(self.tempdir, 'index.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_run(self, name, device, records):
+        output_directory = os.path.join(self.outputs, name)
+        os.makedirs(os.path.join(output_directory, '__meta'))
+        with open(os.path.join(output_directory, '__meta', 'run_config.json'), 'w') as wfh:
+            json.dump({'run_name': name, 'project': None, 'device': device}, wfh)
+        with open(os.path.join(output_directory, 'results.jsonl'), 'w') as wfh:
+            for record in records:
+                wfh.write(json.dumps(record) + '\n')
+        return output_directory
+
+    def _write_runs(self):
+        self._write_run('run1', 'juno', [
+            make_record('1', 'memcpy', 1, [('time', 10, {'size': '1k'}), ('time', 20, {'size': '4k'})]),
+            make_record('1', 'memcpy', 2, [('time', 12, {'size': '1k'}), ('time', 22, {'size': '4k'})]),
+        ])
+        self._write_run('run2', 'tc2', [
+            make_record('1', 'memcpy', 1, [('time', 30, {'size': '1k'})]),
+            make_record('2', 'idle', 1, [], status='FAILED'),
+        ])
+
+    def test_query(self):
+        self._write_runs()
+        assert_equal(self.index.index([self.outputs]), (2, 0))
+
+        headers, rows = self.index.query()
+        assert_equal(headers, ['run', 'device', 'workload', 'iteration', 'metric', 'value', 'units'])
+        assert_equal(len(rows), 5)
+        assert_equal(rows[0], ('run1', 'juno', 'memcpy', 1, 'time', 10, 'ms'))
+
+        _, rows = self.index.query(filters={'device': ['tc*']})
+        assert_equal([r[5] for r in rows], [30])
+        _, rows = self.index.query(classifiers={'size': '4k'})
+        assert_equal([r[5] for r in rows], [20, 22])
+
+        headers, rows = self.index.query(group_by=['device', 'classifier:size'])
+        assert_equal(headers, ['device', 'classifier:size', 'count', 'mean', 'min', 'max', 'units'])
+        assert_equal(rows, [('juno', '1k', 2, 11, 10, 12, 'ms'),
+                            ('juno', '4k', 2, 21, 20, 22, 'ms'),
+                            ('tc2', '1k', 1, 30, 30, 30, 'ms')])
+
+        _, rows = self.index.query(filters={'status': ['FAILED']})
+        assert_equal(rows, [])
+
+    def test_incremental(self):
+        self._write_runs()
+        assert_equal(self.index.index([self.outputs]), (2, 0))
+        assert_equal(self.index.index([self.outputs]), (0, 2))
+
+        # Touching the file without changing its contents does not re-index the run.
+        stream = os.path.join(self.outputs, 'run1', 'results.jsonl')
+        os.utime(stream, (0, 0))
+        assert_equal(self.index.index([self.outputs]), (0, 2))
+
+        with open(stream, 'a') as wfh:
+            wfh.write(json.dumps(make_record('1', 'memcpy', 3, [('time', 14, {'size': '1k'})])) + '\n')
+        os.utime(stream, (1, 1))
+        assert_equal(self.index.index([self.outputs]), (1, 1))
+        _, rows = self.index.query(filters={'run': ['run1']}, group_by=['run'])
+        assert_equal(rows, [('run1', 5, 15.6, 10, 22, 'ms')])
+
+    def test_csv(self):
+        output_directory = os.path.join(self.outputs, 'old_run')
+        os.makedirs(output_directory)
+        with open(os.path.join(output_directory, 'results.csv'), 'w') as wfh:
+            wfh.write(RESULTS_CSV)
+        self.index.index([output_directory])
+        _, rows = self.index.query(group_by=['iteration', 'classifier:cluster'])
+        assert_equal(rows, [(1, 'big', 1, 100, 100, 100, None),
+                            (1, 'little', 1, 50, 50, 50, None),
+                            (2, 'big', 1, 110, 110, 110, None)])
+        _, rows = self.index.query(group_by=['run'])
+        assert_equal(rows[0][0], 'old_run')
+
+    @raises(ResultIndexError)
+    def test_unknown_field(self):
+        self.index.query(group_by=['colour'])
@@ -15,12 +15,19 @@
 
 
 # pylint: disable=W0231,W0613,E0611,W0603,R0201
+import os
+import csv
+import json
+import shutil
+import tempfile
 from unittest import TestCase
 
 from nose.tools import assert_equal, assert_true, assert_false, assert_raises
 
-from wlauto.core.result import ResultProcessor, ResultManager
+from wlauto.core.result import (ResultProcessor, ResultManager, IterationResult, RunResult,
+                                RESULT_STREAM_FILE, read_result_stream)
 from wlauto.exceptions import WAError
+from wlauto.result_processors.standard import CsvReportProcessor, JsonReportProcessor, SummaryCsvProcessor
 
 
 class MockResultProcessor1(ResultProcessor):
@@ -125,6 +132,136 @@ class ResultManagerTest(TestCase):
         assert_true(processor.is_invoked)
 
 
+class MockWorkload(object):
+
+    name = 'dhrystone'
+    summary_metrics = ['score']
+
+
+class MockSpec(object):
+
+    def __init__(self, spec_id):
+        self.id = spec_id
+        self.label = 'dhrystone_label'
+        self.workload = MockWorkload()
+        self.classifiers = {}
+
+
+class MockContext(object):
+
+    def __init__(self, output_directory):
+        self.run_output_directory = output_directory
+        self.artifacts = []
+
+    def add_artifact(self, name, path, kind, *args, **kwargs):
+        self.artifacts.append(name)
+
+
+class MetricAddingProcessor(ResultProcessor):
+
+    name = 'metric_adding_processor'
+
+    def process_iteration_result(self, result, context):
+        result.add_metric('derived', 1, classifiers={'cluster': 'big'})
+
+
+class ResultStreamTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.context = MockContext(self.tempdir)
+        self.manager = ResultManager()
+        self.csv_processor = _instantiate(CsvReportProcessor)
+        self.csv_processor.use_all_classifiers = True
+        for processor in [self.csv_processor, _instantiate(MetricAddingProcessor),
+                          _instantiate(JsonReportProcessor), _instantiate(SummaryCsvProcessor)]:
+            self.manager.install(processor)
+        self.manager.initialize(self.context)
+        # initialize() only runs once per process for each processor class, so
+        # it must be invoked directly to set up the instance used by each test.
+        self.csv_processor.initialize.implementation(self.csv_processor, self.context)
+        self.run_result = RunResult(None, self.tempdir)
+
+    def tearDown(self):
+        self.manager.finalize(self.context)
+        shutil.rmtree(self.tempdir)
+
+    def _add_result(self, spec_id, iteration, score):
+        result = IterationResult(MockSpec(spec_id))
+        result.iteration = iteration
+        result.status = IterationResult.OK
+        result.add_metric('score', score)
+        result.add_metric('time', 1.5, 'seconds', classifiers={'phase': 'setup'})
+        self.manager.add_result(result, self.context)
+        self.run_result.iteration_results.append(result)
+        self.manager.record_result(result)
+
+    def _read_csv(self, name):
+        with open(os.path.join(self.tempdir, name)) as fh:
+            return list(csv.reader(fh))
+
+    def test_stream(self):
+        self._add_result('1', 1, 100)
+        # results.csv is written as iterations complete...
+        rows = self._read_csv('results.csv')
+        assert_equal(rows[0], ['id', 'workload', 'iteration', 'metric', 'phase', 'value', 'units'])
+        assert_equal(len(rows), 3)
+
+        self._add_result('1', 2, 200)
+        stream_file = os.path.join(self.tempdir, RESULT_STREAM_FILE)
+        records = list(read_result_stream(stream_file))
+        assert_equal([r['iteration'] for r in records], [1, 2])
+        assert_equal([m['name'] for m in records[0]['metrics']], ['score', 'time', 'derived'])
+
+        # ...and re-written from the stream at the end of the run (including
+        # metrics added by processors after the csv processor).
+        self.manager.process_run_result(self.run_result, self.context)
+        rows = self._read_csv('results.csv')
+        assert_equal(rows[0], ['id', 'workload', 'iteration', 'metric', 'cluster', 'phase', 'value', 'units'])
+        assert_equal(rows[3], ['1', 'dhrystone_label', '1', 'derived', 'big', '', '1', ''])
+        assert_equal(len(rows), 7)
+        assert_equal(self._read_csv('summary.csv')[1:], [['1', 'dhrystone', '1', 'score', '100', ''],
+                                                         ['1', 'dhrystone', '2', 'score', '200', '']])
+        with open(os.path.join(self.tempdir, 'results.json')) as fh:
+            assert_equal(len(json.load(fh)), 2)
+        assert_true('run_result_stream' in self.context.artifacts)
+
+    def test_skipped_iteration(self):
+        self._add_result('1', 1, 100)
+        skipped = IterationResult(MockSpec('2'))
+        skipped.iteration = 1
+        skipped.status = IterationResult.SKIPPED
+        self.run_result.iteration_results.append(skipped)
+        self.manager.record_result(skipped)
+        self._add_result('3', 1, 300)
+
+        # A result that could not be written to the stream is taken from the
+        # run result.
+        unrecorded = IterationResult(MockSpec('4'))
+        unrecorded.iteration = 1
+        unrecorded.status = IterationResult.OK
+        unrecorded.add_metric('score', 400)
+        self.run_result.iteration_results.append(unrecorded)
+
+        records = list(read_result_stream(os.path.join(self.tempdir, RESULT_STREAM_FILE)))
+        assert_equal([(r['id'], r['status']) for r in records],
+                     [('1', IterationResult.OK), ('2', IterationResult.SKIPPED), ('3', IterationResult.OK)])
+
+        self.manager.process_run_result(self.run_result, self.context)
+        with open(os.path.join(self.tempdir, 'results.json')) as fh:
+            results = json.load(fh)
+        assert_equal([r['id'] for r in results], ['1', '2', '3', '4'])
+        assert_equal(results[1]['metrics'], [])
+        assert_equal([row[0] for row in self._read_csv('summary.csv')[1:]], ['1', '3', '4'])
+
+    def test_truncated_stream(self):
+        self._add_result('1', 1, 100)
+        stream_file = os.path.join(self.tempdir, RESULT_STREAM_FILE)
+        with open(stream_file, 'a') as wfh:
+            wfh.write('{"id": "1", "iteration": 2, "metr')
+        assert_equal(len(list(read_result_stream(stream_file))), 1)
+
+
 def _instantiate(cls):
     # Needed to get around Extension's __init__ checks
     return cls()
@@ -0,0 +1,211 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201,protected-access
+import os
+import csv
+import shutil
+import tempfile
+import xmlrpclib
+from unittest import TestCase
+
+from nose.tools import assert_equal, assert_true, assert_false, assert_almost_equal
+
+from wlauto.instrumentation import servo_power_monitors
+from wlauto.instrumentation.servo_power_monitors import PowerPoller, ServoPowerMonitor
+
+
+CHANNELS = ['ppvar_big_mw', 'ppvar_little_mw']
+
+
+class FakeClock(object):
+    """Stands in for the time module, so that polling runs in simulated time."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.on_sleep = None
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        assert seconds >= 0
+        self.now += seconds
+        if self.on_sleep:
+            self.on_sleep()
+
+
+class FakeServod(object):
+    """Stands in for an xmlrpclib.ServerProxy connected to servod."""
+
+    def __init__(self, clock, supports_multicall=True, call_time=0.0):
+        self.clock = clock
+        self.supports_multicall = supports_multicall
+        self.call_time = call_time
+        self.system = self
+        self.failing = set()
+        self.gets = 0
+        self.multicalls = 0
+
+    def get(self, channel):
+        self.clock.now += self.call_time
+        self.gets += 1
+        return self._get(channel)
+
+    def multicall(self, calls):
+        if not self.supports_multicall:
+            raise xmlrpclib.Fault(1, 'method "system.multicall" is not supported')
+        self.clock.now += self.call_time
+        self.multicalls += 1
+        results = []
+        for call in calls:
+            try:
+                results.append([self._get(*call['params'])])
+            except xmlrpclib.Fault as e:
+                results.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+        return results
+
+    def _get(self, channel):
+        if channel in self.failing:
+            raise xmlrpclib.Fault(1, 'Failed to read {}'.format(channel))
+        return 1000.0 * (CHANNELS.index(channel) + 1)
+
+
+class MockResult(object):
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add_metric(self, name, value, units=None, lower_is_better=False):
+        self.metrics[name] = value
+
+
+class MockContext(object):
+
+    def __init__(self, output_directory):
+        self.output_directory = output_directory
+        self.result = MockResult()
+
+
+class PowerPollerTest(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.saved_time = servo_power_monitors.time
+        self.saved_server_proxy = xmlrpclib.ServerProxy
+        servo_power_monitors.time = self.clock
+        xmlrpclib.ServerProxy = lambda url: self.servod
+
+    def tearDown(self):
+        servo_power_monitors.time = self.saved_time
+        xmlrpclib.ServerProxy = self.saved_server_proxy
+
+    def _poll(self, samples, sampling_rate=10, **kwargs):
+        self.servod = FakeServod(self.clock, **kwargs)
+        poller = PowerPoller('localhost', 9999, CHANNELS, sampling_rate)
+        self.servod.gets = 0
+
+        def stop_after_samples():
+            if len(poller.data['timestamp']) + poller.failed_samples >= samples:
+                poller.term_signal.clear()
+        self.clock.on_sleep = stop_after_samples
+        return poller
+
+    def test_multicall(self):
+        poller = self._poll(3)
+        poller.run()
+        assert_true(poller.use_multicall)
+        assert_equal(self.servod.multicalls, 3)
+        assert_equal(self.servod.gets, 0)
+        assert_equal(list(poller.data['ppvar_big_mw']), [1000.0] * 3)
+        assert_equal(list(poller.data['ppvar_little_mw']), [2000.0] * 3)
+
+    def test_fallback(self):
+        poller = self._poll(3, supports_multicall=False)
+        poller.run()
+        assert_false(poller.use_multicall)
+        assert_equal(self.servod.multicalls, 0)
+        assert_equal(self.servod.gets, 3 * len(CHANNELS))
+        assert_equal(list(poller.data['ppvar_little_mw']), [2000.0] * 3)
+
+    def test_channel_fault(self):
+        poller = self._poll(4)
+        self.servod.failing.add('ppvar_little_mw')
+        real_sleep = self.clock.sleep
+
+        def recover(seconds):
+            real_sleep(seconds)
+            self.servod.failing.clear()  # only the first sample fails
+        self.clock.sleep = recover
+        poller.run()
+
+        # A fault for one channel must not disable multicall.
+        assert_true(poller.use_multicall)
+        assert_equal(self.servod.gets, 0)
+        assert_equal(poller.failed_samples, 1)
+        assert_equal(len(poller.data['timestamp']), 3)
+        assert_equal(len(poller.data['ppvar_big_mw']), 3)
+        assert_equal(len(poller.data['ppvar_little_mw']), 3)
+
+    def test_deadlines(self):
+        poller = self._poll(5)
+        poller.run()
+        assert_equal(poller.missed_deadlines, 0)
+        timestamps = poller.data['timestamp']
+        for t1, t2 in zip(timestamps, timestamps[1:]):
+            assert_almost_equal(t2 - t1, 0.1)
+
+        # Each sample takes 2.5 periods, so two deadlines are missed after each,
+        # and samples are taken every three periods.
+        poller = self._poll(5, call_time=0.25)
+        poller.run()
+        assert_equal(poller.missed_deadlines, 10)
+        timestamps = poller.data['timestamp']
+        for t1, t2 in zip(timestamps, timestamps[1:]):
+            assert_almost_equal(t2 - t1, 0.3)
+
+    def test_metrics(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            instrument = _instantiate(ServoPowerMonitor, None, board_name='test')
+            instrument.sampling_rate = 10
+            instrument.label_map = {'ppvar_big_mw': 'big', 'ppvar_little_mw': 'little'}
+            instrument.outfile = os.path.join(tempdir, 'servo.csv')
+            instrument.poller = self._poll(5, call_time=0.25)
+            instrument.poller.start()
+            instrument.poller.join()  # stops by itself after five samples
+            context = MockContext(tempdir)
+            instrument.stop(context)
+
+            metrics = context.result.metrics
+            assert_equal(metrics['servo_missed_deadlines'], 10)
+            assert_false('servo_failed_samples' in metrics)
+            assert_almost_equal(metrics['servo_achieved_sampling_rate'], 3.333)
+            assert_equal(metrics['big_power'], 1.0)
+            assert_equal(metrics['little_power'], 2.0)
+            # each sample holds until the next one, and the last for one period
+            assert_almost_equal(metrics['little_energy'], 2.0 * (4 * 0.3 + 0.1))
+            with open(instrument.outfile) as fh:
+                rows = list(csv.reader(fh))
+            assert_equal(rows[0], ['timestamp', 'big_power', 'little_power'])
+            assert_equal(len(rows), 6)
+        finally:
+            shutil.rmtree(tempdir)
+
+
+def _instantiate(cls, *args, **kwargs):
+    # Needed to get around Extension's __init__ checks
+    return cls(*args, **kwargs)
@@ -0,0 +1,171 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+# pylint: disable=W0231,W0613,E0611,W0603,R0201,protected-access
+import os
+import shutil
+import tempfile
+from copy import deepcopy
+from unittest import TestCase
+
+import yaml
+from nose.tools import assert_equal, assert_true, assert_false, assert_is, assert_is_not, raises
+
+from wlauto.utils import statedetect
+from wlauto.utils.statedetect import (StateDefinition, StateTemplate, StateDefinitionError,
+                                      get_state_definition, clear_state_definitions_cache,
+                                      match_state, verify_state)
+
+try:
+    import numpy as np
+    import cv2
+except ImportError:
+    np = cv2 = None
+
+
+SCALE = 0.25
+
+DEFINITIONS = {
+    'workload_states': [
+        {'state_name': 'other', 'templates': ['cross'], 'matches': 1},
+        {'state_name': 'menu', 'templates': ['checker', 'circle'], 'matches': 2},
+    ],
+    'workload_phases': [
+        {'phase_name': 'setup_complete', 'expected_state': 'menu'},
+        {'phase_name': 'run_complete', 'expected_state': 'other'},
+    ],
+}
+
+
+class StateDetectionTest(TestCase):
+
+    def setUp(self):
+        if cv2 is None:
+            self.skipTest('State detection requires numpy and opencv')
+        self.tempdir = tempfile.mkdtemp()
+        self.defpath = os.path.join(self.tempdir, 'state_definitions')
+        os.makedirs(os.path.join(self.defpath, 'templates'))
+        self.screenshot = os.path.join(self.tempdir, 'screen.png')
+        self._create_images()
+        with open(os.path.join(self.defpath, 'definition.yaml'), 'w') as wfh:
+            yaml.dump(DEFINITIONS, wfh)
+        clear_state_definitions_cache()
+
+    def tearDown(self):
+        clear_state_definitions_cache()
+        shutil.rmtree(self.tempdir)
+
+    def _create_images(self):
+        image = np.full((320, 480), 200, np.uint8)
+        # A box with a fine checker pattern, and a decoy in which the pattern is
+        # replaced by its average, so that the two look the same when downscaled.
+        yy, xx = np.indices((64, 96))
+        image[208:272, 308:404] = np.where(((yy // 2) + (xx // 2)) % 2, 255, 0)
+        image[40:104, 48:144] = 128
+        cv2.circle(image, (120, 240), 40, 0, -1)
+        cross = np.full((80, 80), 200, np.uint8)
+        cv2.line(cross, (10, 10), (70, 70), 0, 6)
+        cv2.line(cross, (10, 70), (70, 10), 0, 6)
+
+        self._write_template('checker', image[200:280, 300:412])
+        self._write_template('circle', image[192:288, 72:168])
+        self._write_template('cross', cross)
+        # Make the checker box a slightly worse match than the decoy when
+        # downscaled; it is still by far the best match at full resolution.
+        image[184:192, 340:348] = 0
+        cv2.imwrite(self.screenshot, image)
+
+    def _write_template(self, name, image):
+        cv2.imwrite(os.path.join(self.defpath, 'templates', name + '.png'), image)
+
+    def test_match(self):
+        definition = StateDefinition(self.defpath)
+        assert_equal([t.name for t in definition.templates], ['cross', 'checker', 'circle'])
+        assert_equal(definition.match(self.screenshot), 'menu')
+        assert_equal(definition.match(self.screenshot, scale=SCALE, jobs=1), 'menu')
+        assert_equal(definition.get_expected_state('setup_complete'), 'menu')
+        assert_true(verify_state(self.screenshot, self.defpath, 'setup_complete', scale=SCALE))
+        assert_false(verify_state(self.screenshot, self.defpath, 'run_complete'))
+
+    def test_coarse_to_fine(self):
+        template = StateTemplate('checker', os.path.join(self.defpath, 'templates', 'checker.png'))
+        gray = cv2.imread(self.screenshot, 0)
+        img_edge = statedetect.auto_canny(gray)
+        coarse_edge = statedetect.auto_canny(statedetect._resize(gray, SCALE))
+
+        # The decoy is the best coarse match, so the template is only found by
+        # checking more than one candidate...
+        res = cv2.matchTemplate(coarse_edge, template.get_edge(SCALE), cv2.TM_CCOEFF_NORMED)
+        _, _, _, (x, y) = cv2.minMaxLoc(res)
+        assert_true(x < 40 and y < 30)
+        assert_true(statedetect._match_coarse_to_fine(img_edge, coarse_edge, template, SCALE))
+
+        # ...or by falling back to full resolution.
+        saved_candidates = statedetect.COARSE_CANDIDATES
+        statedetect.COARSE_CANDIDATES = 1
+        try:
+            assert_true(statedetect._match_coarse_to_fine(img_edge, coarse_edge, template, SCALE))
+        finally:
+            statedetect.COARSE_CANDIDATES = saved_candidates
+
+        cross = StateTemplate('cross', os.path.join(self.defpath, 'templates', 'cross.png'))
+        assert_false(statedetect._match_coarse_to_fine(img_edge, coarse_edge, cross, SCALE))
+
+    def test_template_edges(self):
+        template = StateTemplate('cross', os.path.join(self.defpath, 'templates', 'cross.png'))
+        assert_is(template.get_edge(), template.edge)
+        assert_is(template.get_edge(1), template.edge)
+        coarse = template.get_edge(SCALE)
+        assert_equal(coarse.shape, (20, 20))
+        assert_is(template.get_edge(SCALE), coarse)
+        assert_is(template.get_edge(0.1), None)  # too small to be matched coarsely
+
+    def test_cache(self):
+        definition = get_state_definition(self.defpath)
+        assert_is(get_state_definition(self.defpath + os.sep), definition)
+        clear_state_definitions_cache()
+        assert_is_not(get_state_definition(self.defpath), definition)
+
+        definitions = deepcopy(DEFINITIONS)
+        definitions['workload_states'][1]['templates'] = ['checker']
+        definitions['workload_states'][1]['matches'] = 1
+        definitions['workload_states'][1]['state_name'] = 'checker_only'
+        assert_equal(match_state(self.screenshot, self.defpath, definitions), 'checker_only')
+        assert_equal(match_state(self.screenshot, self.defpath, DEFINITIONS), 'menu')
+
+    @raises(StateDefinitionError)
+    def test_missing_definition(self):
+        os.remove(os.path.join(self.defpath, 'definition.yaml'))
+        StateDefinition(self.defpath)
+
+    @raises(StateDefinitionError)
+    def test_missing_template(self):
+        os.remove(os.path.join(self.defpath, 'templates', 'circle.png'))
+        StateDefinition(self.defpath)
+
+    @raises(StateDefinitionError)
+    def test_invalid_template(self):
+        with open(os.path.join(self.defpath, 'templates', 'circle.png'), 'w') as wfh:
+            wfh.write('not a PNG')
+        StateDefinition(self.defpath)
+
+    @raises(StateDefinitionError)
+    def test_undefined_phase(self):
+        StateDefinition(self.defpath).get_expected_state('teardown_complete')
+
+    @raises(StateDefinitionError)
+    def test_missing_screenshot(self):
+        StateDefinition(self.defpath).match(os.path.join(self.tempdir, 'missing.png'))
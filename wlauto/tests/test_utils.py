@@ -15,12 +15,24 @@
 
 
 # pylint: disable=R0201
+import os
+import csv
+import json
+import shutil
+import logging
+import struct
+import tempfile
+from StringIO import StringIO
 from unittest import TestCase
 
-from nose.tools import raises, assert_equal, assert_not_equal  # pylint: disable=E0611
+from nose.tools import raises, assert_equal, assert_not_equal, assert_true  # pylint: disable=E0611
 
 from wlauto.utils.android import check_output
+from wlauto.utils.chrome_trace import iter_trace_events, get_event_timestamps, _Reader
+from wlauto.utils.energy import PowerStreamReducer
+from wlauto.utils.log import LogWriter, LogWriterThread, QueueHandler
 from wlauto.utils.misc import merge_dicts, merge_lists, TimeoutError
+from wlauto.utils.revent import ReventParser
 from wlauto.utils.types import list_or_integer, list_or_bool, caseless_string, arguments
 
 
@@ -88,3 +100,178 @@ class TestTypes(TestCase):
         assert_equal(arguments('--foo 7 --bar "fizz buzz"'),
                      ['--foo', '7', '--bar', 'fizz buzz'])
         assert_equal(arguments(['test', 42]), ['test', '42'])
+
+
+class TestReventParser(TestCase):
+
+    events = [(0, 100, 0, 1, 330, 1),
+              (0, 100, 250000, 0, 0, 0),
+              (1, 102, 500000, 1, 330, 0)]
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'test.revent')
+        with open(self.path, 'wb') as wfh:
+            wfh.write(ReventParser.header_struct.pack('REVENT', 1))
+            wfh.write(struct.pack('<i', 2))
+            for device_path in ['/dev/input/event0', '/dev/input/event1']:
+                wfh.write(struct.pack('<i', len(device_path)))
+                wfh.write(device_path)
+            for event in self.events:
+                wfh.write(ReventParser.event_struct.pack(*event))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_parse(self):
+        parser = ReventParser()
+        events = list(parser.parse(self.path))
+        assert_equal(len(events), 3)
+        assert_equal(parser.device_paths, ['/dev/input/event0', '/dev/input/event1'])
+        assert_equal(events[2][0], 1)
+        assert_equal(events[2][2:], (1, 330, 0))
+
+    def test_get_events(self):
+        events = ReventParser().get_events(self.path)
+        assert_equal(len(events), 3)
+        assert_equal(list(events['code']), [330, 0, 330])
+        assert_equal(list(ReventParser().get_timestamps(self.path)), [100.0, 100.25, 102.5])
+
+    def test_duration(self):
+        assert_equal(ReventParser.get_revent_duration(self.path), 2.5)
+
+    def test_truncated(self):
+        with open(self.path, 'ab') as wfh:
+            wfh.write(ReventParser.event_struct.pack(0, 110, 0, 0, 0, 0)[:12])
+        assert_equal(len(list(ReventParser().parse(self.path))), 3)
+        assert_equal(len(ReventParser().get_events(self.path)), 3)
+        assert_equal(ReventParser.get_revent_duration(self.path), 2.5)
+
+    @raises(ValueError)
+    def test_bad_magic(self):
+        with open(self.path, 'r+b') as wfh:
+            wfh.write('NOTREV')
+        ReventParser.get_revent_duration(self.path)
+
+
+class TestPowerStreamReducer(TestCase):
+
+    rows = [['1', '10', '8'],
+            ['2', '20', '9'],
+            ['3', '30', '1'],
+            ['6', '40', '3'],
+            ['4', '50', '5']]
+
+    def test_stats(self):
+        reducer = PowerStreamReducer(['power', 'energy', 'counter'], cumulative=['energy', 'counter'],
+                                     wrap_value=10, chunk_size=2)
+        stats = reducer.process(self.rows)
+        assert_equal(stats['power'].mean, 3.2)
+        assert_equal(stats['power'].min, 1)
+        assert_equal(stats['power'].max, 6)
+        assert_equal(stats['energy'].delta, 40)
+        assert_equal(stats['counter'].wraps, 1)
+        assert_equal(stats['counter'].delta, 7)
+
+    def test_timeline(self):
+        output = StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        reducer = PowerStreamReducer(['power', 'energy'], cumulative=['energy'],
+                                     timeline_writer=writer, downsample=2, chunk_size=3)
+        reducer.process([row[:2] for row in self.rows])
+        assert_equal(output.getvalue().split(),
+                     ['power,energy', '1.5,20.0', '4.5,40.0', '4.0,50.0'])
+
+
+class TestChromeTrace(TestCase):
+
+    events = [{'name': 'SwapBuffersLatency', 'ts': 1000, 'args': {'a': '}]'}},
+              {'name': 'Other', 'ts': 1500.5},
+              {'name': 'SwapBuffersLatency', 'ts': 17667}]
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'trace.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, text):
+        with open(self.path, 'w') as wfh:
+            wfh.write(text)
+
+    def test_object_format(self):
+        self._write(json.dumps({'metadata': {'x': [1, 2]},
+                                'traceEvents': self.events,
+                                'systemTraceEvents': 'some text'}, indent=2))
+        for chunk_size in [1, 7, 1024]:
+            assert_equal(list(iter_trace_events(self.path, chunk_size)), self.events)
+        assert_equal(list(get_event_timestamps(self.path, 'SwapBuffersLatency', 5)), [1000, 17667])
+
+    def test_unterminated_array_format(self):
+        self._write(json.dumps(self.events)[:-1] + ',\n')
+        assert_equal(list(iter_trace_events(self.path, 3)), self.events)
+
+    def test_skipped_values(self):
+        self._write(json.dumps({'a': '\\"}]', 'b': [{'c': '[{\\'}, [], 1.5e3], 'd': None,
+                                'traceEvents': self.events, 'e': {'f': '"'}}))
+        for chunk_size in [1, 2, 3, 1024]:
+            assert_equal(list(iter_trace_events(self.path, chunk_size)), self.events)
+
+    def test_skip_large_value(self):
+        chunk_size = 1024
+        reader = _Reader(StringIO(json.dumps(['x\\"' * 100000, {'y': '[' * 100000}]) + ' 42'),
+                         chunk_size)
+        fill = reader.fill
+        sizes = []
+
+        def recording_fill():
+            result = fill()
+            sizes.append(len(reader.buffer))
+            return result
+        reader.fill = recording_fill
+        reader.skip()
+        assert_equal(reader.decode(), 42)
+        assert_true(max(sizes) < 2 * chunk_size)
+
+
+class TestLogging(TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('test_logging')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.writer = LogWriterThread()
+        self.stream = StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(logging.Formatter('%(levelname)s:%(message)s'))
+        handler.setLevel(logging.INFO)
+        self.writer.add_handler(handler)
+        self.queue_handler = QueueHandler(self.writer)
+        self.logger.addHandler(self.queue_handler)
+        self.writer.start()
+
+    def tearDown(self):
+        self.writer.stop()
+        self.logger.removeHandler(self.queue_handler)
+
+    def test_flush(self):
+        values = [1]
+        self.logger.info('first %s', values)
+        values.append(2)  # must not affect the queued record
+        self.logger.debug('not shown')
+        for i in xrange(2000):
+            self.logger.warning('line %d', i)
+        self.writer.flush(5)
+        lines = self.stream.getvalue().split('\n')
+        assert_equal(lines[0], 'INFO:first [1]')
+        assert_equal(lines[1:], ['WARNING:line {}'.format(i) for i in xrange(2000)] + [''])
+
+    def test_log_writer(self):
+        writer = LogWriter('test_logging', logging.INFO)
+        writer.write('one\r\ntw')
+        writer.write('o\rthree\n\nfour')
+        writer.close()
+        self.writer.flush(5)
+        assert_equal(self.stream.getvalue().split('\n'),
+                     ['INFO:one', 'INFO:two', 'INFO:three', 'INFO:', ''])
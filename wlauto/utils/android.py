@@ -164,6 +164,7 @@ class ApkInfo(object):
         self.label = None
         self.version_name = None
         self.version_code = None
+        self.native_code = []
         self.parse(path)
 
     def parse(self, apk_path):
@@ -183,6 +184,8 @@ class ApkInfo(object):
             elif line.startswith('launchable-activity:'):
                 match = self.name_regex.search(line)
                 self.activity = match.group('name')
+            elif line.startswith('native-code:'):
+                self.native_code = line.split(':', 1)[1].replace('\'', '').split()
             else:
                 pass  # not interested
 
@@ -200,6 +203,12 @@ def fastboot_flash_partition(partition, path_to_image):
     fastboot_command(command)
 
 
+def fastboot_list_devices():
+    """Returns the serial numbers of the devices that are in fastboot mode."""
+    output = fastboot_command('devices')
+    return [line.split()[0] for line in output.splitlines() if line.strip()]
+
+
 def adb_get_device():
     """
     Returns the serial number of a connected android device.
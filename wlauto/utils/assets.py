@@ -0,0 +1,313 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Persistent indexes of asset locations used by resource getters.
+
+Resolving resources requires listing directories (which may be on a remote
+filer) and, for APKs, running ``aapt`` to discover package versions. An
+``AssetIndex`` records the contents of a directory, along with any information
+that had to be extracted from its files, so that subsequent lookups can be
+answered without re-scanning the directory or re-inspecting unchanged files.
+
+Indexes are stored as JSON files under ``<environment_root>/__asset_index``.
+Changes are saved in batches -- after each resource has been resolved, and when
+WA exits -- rather than after every lookup.
+
+"""
+import os
+import json
+import stat
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from functools import wraps
+
+from wlauto.core.bootstrap import settings
+from wlauto.utils.android import ApkInfo
+from wlauto.utils.misc import ensure_file_directory_exists as _f, sha256
+
+
+logger = logging.getLogger('assets')
+
+INDEX_VERSION = 3
+MTIME_GRANULARITY = 2  # seconds
+CLOCK_FILE_NAME = '.wa_asset_index_clock'
+
+# Entry fields that identify a version of a file, and fields holding
+# information extracted from that version.
+STAT_FIELDS = ['size', 'mtime', 'inode']
+EXTRACTED_FIELDS = ['sha256', 'apk', 'extracted_at']
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _synchronized(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class AssetIndex(object):
+    """
+    Index of the files in a single directory. The list of files is only
+    re-read when the directory's modification time changes. Information about
+    a file (its SHA256 hash, and APK details for APKs) is extracted the first
+    time it is requested, and kept for as long as the file's size, modification
+    time and inode remain the same; these are checked on every lookup.
+
+    Times recorded in the index are by the clock of the file system holding the
+    directory (which, for a filer, need not agree with the host's), so that they
+    can be compared with modification times. It is read by touching a file,
+    ``.wa_asset_index_clock``, in the directory.
+
+    """
+
+    @property
+    def index_file(self):
+        name = hashlib.sha1(self.location).hexdigest() + '.json'
+        return os.path.join(settings.environment_root, '__asset_index', name)
+
+    def __init__(self, location):
+        self.location = os.path.abspath(location)
+        self.mtime = None
+        self.indexed_at = None
+        self.entries = {}
+        self.dirty = False
+        self.clock_offset = None
+        self.clock_measured = False
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with open(self.index_file) as fh:
+                data = json.load(fh)
+        except (IOError, ValueError) as e:
+            logger.debug('Ignoring unreadable asset index {}: {}'.format(self.index_file, e))
+            return
+        if data.get('version') == INDEX_VERSION and data.get('location') == self.location:
+            self.mtime = data['mtime']
+            self.indexed_at = data['indexed_at']
+            self.entries = data['entries']
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {
+            'version': INDEX_VERSION,
+            'location': self.location,
+            'mtime': self.mtime,
+            'indexed_at': self.indexed_at,
+            'entries': self.entries,
+        }
+        try:
+            temp_file = _f(self.index_file) + '.tmp'
+            with open(temp_file, 'w') as wfh:
+                json.dump(data, wfh)
+            os.rename(temp_file, self.index_file)
+            self.dirty = False
+        except (IOError, OSError) as e:
+            logger.debug('Could not save asset index {}: {}'.format(self.index_file, e))
+
+    @_synchronized
+    def refresh(self):
+        """
+        Re-read the directory if it has changed since it was last indexed.
+        Raises ``OSError`` if the location does not exist.
+
+        """
+        if self.clock_offset is None:
+            self._measure_clock()  # may create the clock file, changing the location
+        mtime = os.stat(self.location).st_mtime
+        # Modification times may have a granularity as coarse as a couple of
+        # seconds, so a directory indexed too soon after it was last modified
+        # could since have changed without its modification time changing.
+        if mtime == self.mtime and self.indexed_at - mtime > MTIME_GRANULARITY:
+            return
+        indexed_at = self._now(mtime)
+        entries = {}
+        for name in os.listdir(self.location):
+            if name == CLOCK_FILE_NAME:
+                continue
+            try:
+                new_entry = _stat_entry(os.path.join(self.location, name))
+            except OSError:
+                continue  # e.g. a broken symlink
+            old_entry = self.entries.get(name)
+            entries[name] = old_entry if _same_file(old_entry, new_entry) else new_entry
+        self.entries = entries
+        self.mtime = mtime
+        self.indexed_at = indexed_at
+        self.dirty = True
+
+    @_synchronized
+    def listdir(self):
+        self.refresh()
+        return sorted(self.entries)
+
+    @_synchronized
+    def get_sha256(self, name):
+        entry = self._get_file_entry(name)
+        if 'sha256' not in entry:
+            extracted_at = self._now(entry['mtime'])
+            entry['sha256'] = sha256(os.path.join(self.location, name))
+            entry.setdefault('extracted_at', extracted_at)
+            self.dirty = True
+        return entry['sha256']
+
+    @_synchronized
+    def set_sha256(self, name, value):
+        """Record the (already verified) SHA256 hash of the specified file."""
+        entry = self._get_file_entry(name)
+        entry['sha256'] = value
+        entry.setdefault('extracted_at', self._now(entry['mtime']))
+        self.dirty = True
+
+    @_synchronized
+    def get_apk_info(self, name):
+        """
+        Returns a dict with the ``package``, ``version_name``, ``version_code``
+        and ``native_code`` (a list of ABIs) of the specified APK.
+
+        """
+        entry = self._get_file_entry(name)
+        if 'apk' not in entry:
+            extracted_at = self._now(entry['mtime'])
+            info = ApkInfo(os.path.join(self.location, name))
+            entry['apk'] = {
+                'package': info.package,
+                'version_name': info.version_name,
+                'version_code': info.version_code,
+                'native_code': info.native_code,
+            }
+            entry.setdefault('extracted_at', extracted_at)
+            self.dirty = True
+        return entry['apk']
+
+    @_synchronized
+    def find_revent(self, device_name, stage):
+        """
+        Returns the path to the revent file for the specified device and stage,
+        i.e. a file called ``<device_name>.<stage>.revent`` (compared
+        case-insensitively), or ``None`` if there isn't one.
+
+        """
+        filename = '.'.join([device_name, stage, 'revent']).lower()
+        for name in self.listdir():
+            if name.lower() == filename:
+                return os.path.join(self.location, name)
+
+    def _now(self, mtime=None):
+        """
+        Returns the current time by the clock of the location's file system.
+        ``mtime`` is a modification time that has just been read from it.
+
+        """
+        if self.clock_offset is None:
+            self._measure_clock()
+        now = time.time() + self.clock_offset
+        if not self.clock_measured and mtime > now + MTIME_GRANULARITY:
+            # The clock could not be read, but it must be at least this far
+            # ahead of the host's.
+            logger.warning('Clock for {} is at least {:.1f} seconds ahead of the host\'s'
+                           .format(self.location, mtime - time.time()))
+            self.clock_offset = mtime - time.time()
+            now = mtime
+        return now
+
+    def _measure_clock(self):
+        path = os.path.join(self.location, CLOCK_FILE_NAME)
+        try:
+            with open(path, 'a'):
+                os.utime(path, None)
+            self.clock_offset = os.stat(path).st_mtime - time.time()
+            self.clock_measured = True
+        except (IOError, OSError) as e:
+            logger.debug('Could not read the clock for {}: {}'.format(self.location, e))
+            self.clock_offset = 0
+            self.clock_measured = False
+            return
+        if abs(self.clock_offset) > MTIME_GRANULARITY:
+            logger.warning('Clock for {} is {:.1f} seconds {} the host\'s'
+                           .format(self.location, abs(self.clock_offset),
+                                   'ahead of' if self.clock_offset > 0 else 'behind'))
+
+    def _get_file_entry(self, name):
+        # The file is re-stat'ed on every lookup, rather than relying on the
+        # directory's modification time (which does not change when a file is
+        # rewritten in place), so that information extracted from a previous
+        # version of the file is never returned.
+        try:
+            current = _stat_entry(os.path.join(self.location, name))
+        except OSError:
+            current = None
+        if current is None or current['isdir']:
+            raise ValueError('{} is not a file in {}'.format(name, self.location))
+        entry = self.entries.get(name)
+        if not _same_file(entry, current):
+            entry = self.entries[name] = current
+            self.dirty = True
+        elif entry.get('extracted_at', 0) - entry['mtime'] <= MTIME_GRANULARITY:
+            # The file was modified so shortly before its information was
+            # extracted that it may since have been modified again without
+            # its modification time changing.
+            for field in EXTRACTED_FIELDS:
+                entry.pop(field, None)
+        return entry
+
+
+def get_asset_index(location):
+    """Returns the ``AssetIndex`` for the specified directory."""
+    location = os.path.abspath(location)
+    with _indexes_lock:
+        if location not in _indexes:
+            _indexes[location] = AssetIndex(location)
+        return _indexes[location]
+
+
+def save_asset_indexes():
+    """Saves the indexes that have changed since they were last saved."""
+    with _indexes_lock:
+        indexes = _indexes.values()
+    for index in indexes:
+        with index.lock:
+            index.save()
+
+
+atexit.register(save_asset_indexes)
+
+
+def get_apk_version_name(path):
+    """Returns the version name of the APK at ``path``, using its location's index."""
+    location, name = os.path.split(os.path.abspath(path))
+    return get_asset_index(location).get_apk_info(name)['version_name']
+
+
+def _stat_entry(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime, 'inode': st.st_ino,
+            'isdir': stat.S_ISDIR(st.st_mode)}
+
+
+def _same_file(entry, other):
+    return entry is not None and all(entry.get(f) == other[f] for f in STAT_FIELDS)
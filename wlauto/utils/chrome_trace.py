@@ -0,0 +1,200 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Incremental parsing of traces in the Chrome Trace Event format, as produced by
+Telemetry, and by ``systrace``/``atrace`` when asked for JSON output.
+
+Traces can run to hundreds of MB, so rather than loading the whole file, events
+are decoded one at a time as the file is read.
+
+"""
+import re
+import json
+import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+WHITESPACE = ' \t\n\r'
+STRING_SPECIAL_REGEX = re.compile(r'["\\]')
+STRUCTURE_SPECIAL_REGEX = re.compile(r'["\[\]{}]')
+
+
+class TraceFormatError(ValueError):
+    pass
+
+
+class _Reader(object):
+    """Buffers a file, allowing JSON values to be decoded from it incrementally."""
+
+    def __init__(self, fh, chunk_size):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.fh.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        # Discard what has already been consumed, so that the buffer never
+        # holds much more than a chunk and the value being decoded.
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character (without consuming it), or ``''`` at EOF."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def next_char(self):
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                end = None
+            # A value at the very end of the buffer (e.g. a number) may have
+            # been truncated, so make sure there is more data after it.
+            if end is not None and (end < len(self.buffer) or self.eof):
+                self.pos = end
+                return value
+            if not self.fill():
+                if end is not None:
+                    self.pos = end
+                    return value
+                raise TraceFormatError('Could not decode JSON value at end of trace')
+
+    def skip(self):
+        """
+        Consumes the next value without decoding it. Strings and containers are
+        scanned a chunk at a time, so that (unlike with ``decode()``) skipping a
+        value is linear in its size, and it is never held in memory in full.
+
+        """
+        if self.peek() not in '"[{':
+            self.decode()  # a number or literal, which cannot be large
+            return
+        depth = 0
+        in_string = False
+        while True:
+            regex = STRING_SPECIAL_REGEX if in_string else STRUCTURE_SPECIAL_REGEX
+            match = regex.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise TraceFormatError('Unterminated JSON value at end of trace')
+                continue
+            c = match.group()
+            self.pos = match.end()
+            if in_string:
+                if c == '\\':
+                    # The escaped character may be in the next chunk.
+                    if self.pos == len(self.buffer) and not self.fill():
+                        raise TraceFormatError('Unterminated JSON string at end of trace')
+                    self.pos += 1
+                else:
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c in '[{':
+                depth += 1
+            else:
+                depth -= 1
+            if not in_string and depth == 0:
+                return
+
+
+def iter_trace_events(filepath, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the events (as dicts) from a trace in the Chrome Trace Event format,
+    which is either an object with a ``"traceEvents"`` list, or just a list of
+    events. As the format allows, the closing ``]`` of a list may be missing.
+
+    """
+    with open(filepath) as fh:
+        reader = _Reader(fh, chunk_size)
+        c = reader.next_char()
+        if c == '[':
+            for event in _iter_array(reader):
+                yield event
+        elif c == '{':
+            while True:
+                c = reader.peek()
+                if c == '}' or not c:
+                    break
+                key = reader.decode()
+                if reader.next_char() != ':':
+                    raise TraceFormatError('Expected ":" after "{}"'.format(key))
+                if key == 'traceEvents' and reader.peek() == '[':
+                    reader.next_char()
+                    for event in _iter_array(reader):
+                        yield event
+                else:
+                    reader.skip()  # not interested
+                if reader.peek() == ',':
+                    reader.next_char()
+        else:
+            raise TraceFormatError('{} is not a JSON trace'.format(filepath))
+
+
+def _iter_array(reader):
+    while True:
+        c = reader.peek()
+        if c == ']':
+            reader.next_char()
+            return
+        if not c:
+            return  # unterminated list; allowed for traces
+        if c == ',':
+            reader.next_char()
+            continue
+        yield reader.decode()
+
+
+def get_event_timestamps(filepath, name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Returns the timestamps (``ts``, in microseconds) of all events with the specified
+    name in a trace. This is a numpy array if numpy is available, or a list otherwise.
+
+    """
+    timestamps = array.array('d')
+    for event in iter_trace_events(filepath, chunk_size):
+        if event.get('name') == name:
+            timestamps.append(event['ts'])
+    if np is None:
+        return timestamps.tolist()
+    return np.frombuffer(timestamps, dtype=np.float64) if timestamps else np.zeros(0)
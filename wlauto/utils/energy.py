@@ -0,0 +1,166 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Utilities for reducing power measurements collected by instruments.
+
+Measurements are processed in a single pass, a chunk of rows at a time, so memory
+use does not depend on the number of samples collected.
+
+"""
+from __future__ import division
+import csv
+from collections import OrderedDict
+from itertools import islice
+
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class ChannelStats(object):
+    """
+    Running statistics for a single channel of power measurements.
+
+    If the channel is ``cumulative`` (i.e. it is an ever-increasing counter, such
+    as an energy meter), ``delta`` is the total increase of the counter across all
+    samples. If ``wrap_value`` is also specified, decreases of the counter are
+    assumed to be due to it wrapping around at that value.
+
+    """
+
+    __slots__ = ['name', 'cumulative', 'wrap_value', 'count', 'total',
+                 'min', 'max', 'first', 'last', 'wraps']
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def delta(self):
+        if not self.count:
+            return None
+        return self.last - self.first + self.wraps * (self.wrap_value or 0)
+
+    def __init__(self, name, cumulative=False, wrap_value=None):
+        self.name = name
+        self.cumulative = cumulative
+        self.wrap_value = wrap_value
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.last = None
+        self.wraps = 0
+
+    def update(self, values):
+        """Update stats with a sequence of (float) values for this channel."""
+        if not values:
+            return
+        if self.cumulative:
+            previous = self.last if self.count else values[0]
+            for value in values:
+                if value < previous:
+                    self.wraps += 1
+                previous = value
+        if not self.count:
+            self.first = values[0]
+            self.min = min(values)
+            self.max = max(values)
+        else:
+            self.min = min(self.min, min(values))
+            self.max = max(self.max, max(values))
+        self.last = values[-1]
+        self.count += len(values)
+        self.total += sum(values)
+
+    def __repr__(self):
+        return 'ChannelStats({}, count={}, mean={}, min={}, max={})'.format(self.name, self.count,
+                                                                            self.mean, self.min, self.max)
+
+
+class PowerStreamReducer(object):
+    """
+    Reduces a stream of rows of measurements (one column per channel) into
+    per-channel ``ChannelStats``.
+
+    If ``timeline_writer`` (a ``csv.writer``-like object) is specified, a
+    downsampled timeline is written to it, with one row for every ``downsample``
+    input rows. Each timeline row contains the mean of those rows for each channel
+    (or the last value, for cumulative channels).
+
+    """
+
+    def __init__(self, channels, cumulative=None, wrap_value=None,
+                 timeline_writer=None, downsample=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        cumulative = cumulative or []
+        self.channels = list(channels)
+        self.stats = OrderedDict((c, ChannelStats(c, c in cumulative, wrap_value))
+                                 for c in self.channels)
+        self.timeline_writer = timeline_writer
+        self.downsample = max(1, downsample)
+        self.chunk_size = chunk_size - chunk_size % self.downsample or self.downsample
+        if self.timeline_writer:
+            self.timeline_writer.writerow(self.channels)
+
+    def process(self, rows):
+        """
+        Update stats with the specified rows (an iterable of sequences of values
+        that can be converted to ``float``). Returns the stats, a dict mapping
+        channel names onto ``ChannelStats``.
+
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            columns = [map(float, column) for column in zip(*chunk)]
+            for stats, column in zip(self.stats.itervalues(), columns):
+                stats.update(column)
+            if self.timeline_writer:
+                self._write_timeline(columns)
+        return self.stats
+
+    def _write_timeline(self, columns):
+        n = self.downsample
+        reduced = []
+        for stats, column in zip(self.stats.itervalues(), columns):
+            if stats.cumulative:
+                reduced.append(column[n - 1::n] if len(column) % n == 0
+                               else column[n - 1::n] + column[-1:])
+            else:
+                reduced.append([sum(column[i:i + n]) / len(column[i:i + n])
+                                for i in xrange(0, len(column), n)])
+        self.timeline_writer.writerows(zip(*reduced))
+
+
+def reduce_power_csv(filepath, cumulative=None, wrap_value=None, timeline_file=None,
+                     downsample=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reduces a CSV file of power measurements, with a header row naming the
+    channels, into per-channel ``ChannelStats``. See ``PowerStreamReducer``.
+
+    """
+    with open(filepath) as fh:
+        reader = csv.reader(fh)
+        channels = reader.next()
+        if timeline_file:
+            with open(timeline_file, 'wb') as wfh:
+                reducer = PowerStreamReducer(channels, cumulative, wrap_value,
+                                             csv.writer(wfh), downsample, chunk_size)
+                return reducer.process(reader)
+        reducer = PowerStreamReducer(channels, cumulative, wrap_value, chunk_size=chunk_size)
+        return reducer.process(reader)
@@ -14,10 +14,23 @@
 #
 
 
+"""
+Logging set up and utilities for Workload Automation.
+
+Records are not written out by the thread that logs them. Instead, they are
+queued and then formatted and written out (to the console and the run log) in
+batches by a background ``LogWriterThread``, so that threads logging large
+amounts of output (e.g. ``StreamLogger``\ s) never stall on I/O.
+``flush_logs()`` may be used to wait for everything logged so far to be
+written out.
+
+"""
 # pylint: disable=E1101
+import atexit
 import logging
 import string
 import threading
+from collections import deque
 
 import colorama
 
@@ -35,14 +48,36 @@ COLOR_MAP = {
 
 RESET_COLOR = colorama.Style.RESET_ALL
 
+# The maximum number of records written out in one go by LogWriterThread.
+MAX_BATCH_SIZE = 1000
+
+# Record attributes that are expensive to collect when a record is created,
+# along with the logging module flag that controls whether they are collected.
+OPTIONAL_RECORD_ATTRIBUTES = [
+    (['pathname', 'filename', 'module', 'lineno', 'funcName'], '_srcfile'),
+    (['thread', 'threadName'], 'logThreads'),
+    (['process'], 'logProcesses'),
+]
+
+_log_writer = None
+
 
 def init_logging(verbosity):
+    global _log_writer  # pylint: disable=global-statement
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
 
     error_handler = ErrorSignalHandler(logging.DEBUG)
     root_logger.addHandler(error_handler)
 
+    formats = [v for k, v in settings.logging.iteritems() if k.endswith('format')]
+    disable_unused_record_attributes(formats)
+
+    _log_writer = LogWriterThread()
+    _log_writer.start()
+    atexit.register(_log_writer.stop)
+    root_logger.addHandler(QueueHandler(_log_writer))
+
     console_handler = logging.StreamHandler()
     if verbosity == 1:
         console_handler.setLevel(logging.DEBUG)
@@ -56,17 +91,192 @@ def init_logging(verbosity):
             console_handler.setFormatter(LineFormatter(settings.logging['regular_format']))
         else:
             console_handler.setFormatter(ColorFormatter(settings.logging['regular_format']))
-    root_logger.addHandler(console_handler)
+    _log_writer.add_handler(console_handler)
 
     logging.basicConfig(level=logging.DEBUG)
 
 
 def add_log_file(filepath, level=logging.DEBUG):
-    root_logger = logging.getLogger()
     file_handler = logging.FileHandler(filepath)
     file_handler.setLevel(level)
     file_handler.setFormatter(LineFormatter(settings.logging['file_format']))
-    root_logger.addHandler(file_handler)
+    if _log_writer:
+        _log_writer.add_handler(file_handler)
+    else:
+        logging.getLogger().addHandler(file_handler)
+
+
+def disable_unused_record_attributes(formats):
+    """
+    Stop the logging module from collecting record attributes that are not used
+    by any of the specified formats (finding the caller of each logging call is
+    by far the most expensive part of creating a record).
+
+    """
+    for attributes, flag in OPTIONAL_RECORD_ATTRIBUTES:
+        if not any('%({})'.format(a) in fmt for a in attributes for fmt in formats):
+            setattr(logging, flag, None if flag == '_srcfile' else 0)
+
+
+def flush_logs(timeout=10):
+    """
+    Wait (for up to ``timeout`` seconds) until everything that has been logged
+    so far has been written out.
+
+    """
+    if _log_writer:
+        _log_writer.flush(timeout)
+
+
+class QueueHandler(logging.Handler):
+    """
+    Passes records on to a ``LogWriterThread`` to be written out.
+
+    """
+
+    exception_formatter = logging.Formatter()
+
+    def __init__(self, writer, level=logging.NOTSET):
+        super(QueueHandler, self).__init__(level)
+        self.writer = writer
+
+    def emit(self, record):
+        # Anything that may change by the time the record is written out (the
+        # message arguments and the exception) needs to be resolved now.
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = self.exception_formatter.formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+            return
+        self.writer.put(record)
+
+    def createLock(self):
+        self.lock = None  # not needed, as put() is thread-safe
+
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+
+class _Barrier(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class LogWriterThread(threading.Thread):
+    """
+    Writes out records queued by any number of threads using its handlers.
+    Records are written out in batches: for stream handlers, all records in a
+    batch are formatted and written with a single write, followed by a single
+    flush.
+
+    """
+
+    def __init__(self):
+        super(LogWriterThread, self).__init__(name='LogWriter')
+        self.daemon = True
+        self.handlers = []
+        self.queue = deque()
+        self.wakeup = threading.Event()
+        self.waiting = False
+        self.stopped = False
+
+    def add_handler(self, handler):
+        self.handlers = self.handlers + [handler]
+
+    def put(self, record):
+        self.queue.append(record)
+        if self.waiting:
+            self.wakeup.set()
+
+    def flush(self, timeout=None):
+        if not self.is_alive() or threading.current_thread() is self:
+            return
+        barrier = _Barrier()
+        self.put(barrier)
+        self.wakeup.set()
+        barrier.event.wait(timeout)
+
+    def stop(self, timeout=10):
+        if self.stopped:
+            return
+        self.flush(timeout)
+        self.stopped = True
+        self.wakeup.set()
+        self.join(timeout)
+
+    def run(self):
+        while True:
+            batch = self._get_batch()
+            if batch:
+                self._write(batch)
+            elif self.stopped:
+                break
+
+    def _get_batch(self):
+        batch = []
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                item = self.queue.popleft()
+            except IndexError:
+                if batch or self.stopped:
+                    break
+                # Nothing to do, so wait to be woken up by put(). The timeout
+                # guards against a put() that happens just before waiting is set.
+                self.waiting = True
+                if not self.queue:
+                    self.wakeup.wait(0.1)
+                self.wakeup.clear()
+                self.waiting = False
+                continue
+            if isinstance(item, _Barrier):
+                self._write(batch)
+                item.event.set()
+                batch = []
+                continue
+            batch.append(item)
+        return batch
+
+    def _write(self, records):
+        if not records:
+            return
+        for handler in self.handlers:
+            try:
+                if isinstance(handler, logging.StreamHandler):
+                    self._write_stream(handler, records)
+                else:
+                    for record in records:
+                        if record.levelno >= handler.level:
+                            handler.handle(record)
+            except Exception:  # pylint: disable=broad-except
+                handler.handleError(records[-1])
+
+    @staticmethod
+    def _write_stream(handler, records):
+        parts = []
+        for record in records:
+            if record.levelno >= handler.level and handler.filter(record):
+                parts.append(handler.format(record))
+        if not parts:
+            return
+        parts.append('')
+        text = '\n'.join(parts)
+        handler.acquire()
+        try:
+            try:
+                handler.stream.write(text)
+            except UnicodeError:
+                handler.stream.write(text.encode('utf-8'))
+            handler.flush()
+        finally:
+            handler.release()
 
 
 class ErrorSignalHandler(logging.Handler):
@@ -185,15 +395,17 @@ class BaseLogWriter(object):
 class LogWriter(BaseLogWriter):
 
     def write(self, data):
-        data = data.replace('\r\n', '\n').replace('\r', '\n')
-        if '\n' in data:
-            parts = data.split('\n')
-            parts[0] = self.buffer + parts[0]
-            for part in parts[:-1]:
-                self.do_write(part)
-            self.buffer = parts[-1]
-        else:
+        if '\n' not in data and '\r' not in data:
             self.buffer += data
+            return self
+        # Note: str.splitlines() treats "\r\n", "\r" and "\n" as line breaks.
+        lines = (self.buffer + data).splitlines(True)
+        if lines[-1][-1] in '\r\n':
+            self.buffer = ''
+        else:
+            self.buffer = lines.pop()
+        for line in lines:
+            self.do_write(line.rstrip('\r\n'))
         return self
 
 
@@ -817,7 +817,7 @@ def mask_to_list(mask):
             if mask & (1 << size - i - 1)]
 
 
-def sha256(path, chunk=2048):
+def sha256(path, chunk=1024 * 1024):
     """Calculates SHA256 hexdigest of the file at the specified path."""
     h = hashlib.sha256()
     with open(path, 'rb') as fh:
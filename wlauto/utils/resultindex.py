@@ -0,0 +1,361 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+An index of the results of many runs, in an sqlite database, so that they can be
+queried without re-parsing the runs' output directories.
+
+The index mirrors the structure of the results: a row in ``runs`` for each
+output directory (``RunResult``), with a row in ``iterations`` for each of its
+``IterationResult``\ s, each of which has a row in ``metrics`` for each of its
+``Metric``\ s. The classifiers of each metric are in ``metric_classifiers``.
+
+A run's results are read from ``results.jsonl`` in its output directory if it
+exists, otherwise from ``results.json`` or ``results.csv``. Runs are only
+re-indexed if the modification time and the contents of that file have changed
+since they were last indexed.
+
+"""
+import os
+import csv
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+
+from wlauto.core.result import RESULT_STREAM_FILE, read_result_stream
+from wlauto.utils.misc import sha256
+
+
+# IMPORTANT: when updating this schema, make sure to bump the version!
+SCHEMA_VERSION = '1'
+SCHEMA = [
+    '''CREATE TABLE runs (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE,
+        source TEXT,
+        mtime REAL,
+        hash TEXT,
+        name TEXT,
+        project TEXT,
+        device TEXT
+    )''',
+    '''CREATE TABLE iterations (
+        id INTEGER PRIMARY KEY,
+        run_id INTEGER,
+        spec_id TEXT,
+        workload TEXT,
+        label TEXT,
+        iteration INTEGER,
+        status TEXT
+    )''',
+    '''CREATE TABLE metrics (
+        id INTEGER PRIMARY KEY,
+        iteration_id INTEGER,
+        name TEXT,
+        value REAL,
+        units TEXT,
+        lower_is_better INTEGER
+    )''',
+    '''CREATE TABLE metric_classifiers (
+        metric_id INTEGER,
+        key TEXT,
+        value TEXT
+    )''',
+    'CREATE INDEX iterations_run ON iterations (run_id)',
+    'CREATE INDEX iterations_workload ON iterations (workload)',
+    'CREATE INDEX metrics_iteration ON metrics (iteration_id)',
+    'CREATE INDEX metrics_name ON metrics (name)',
+    'CREATE INDEX metric_classifiers_metric ON metric_classifiers (metric_id, key)',
+    'CREATE INDEX metric_classifiers_key_value ON metric_classifiers (key, value)',
+    '''CREATE TABLE __meta (
+        schema_version TEXT
+    )''',
+    '''INSERT INTO __meta VALUES ("{}")'''.format(SCHEMA_VERSION),
+]
+
+# Result files, in order of preference.
+RESULT_SOURCES = [RESULT_STREAM_FILE, 'results.json', 'results.csv']
+
+# Fields that may be used to filter or group results.
+FIELDS = {
+    'run': 'r.name',
+    'path': 'r.path',
+    'project': 'r.project',
+    'device': 'r.device',
+    'spec': 'i.spec_id',
+    'workload': 'i.workload',
+    'label': 'i.label',
+    'iteration': 'i.iteration',
+    'status': 'i.status',
+    'metric': 'm.name',
+    'units': 'm.units',
+}
+CLASSIFIER_PREFIX = 'classifier:'
+
+AGGREGATES = [
+    ('count', 'COUNT(m.value)'),
+    ('mean', 'AVG(m.value)'),
+    ('min', 'MIN(m.value)'),
+    ('max', 'MAX(m.value)'),
+]
+
+RAW_COLUMNS = ['run', 'device', 'workload', 'iteration', 'metric', 'value', 'units']
+
+
+class ResultIndexError(Exception):
+    pass
+
+
+class ResultIndex(object):
+
+    def __init__(self, database):
+        self.database = database
+        self.logger = logging.getLogger('ResultIndex')
+        if not os.path.exists(database):
+            with self._connect() as conn:
+                for command in SCHEMA:
+                    conn.execute(command)
+        else:
+            self._validate_schema_version()
+
+    def index(self, paths):
+        """
+        Indexes the output directories at, or under, the specified paths. Returns
+        a ``(indexed, skipped)`` tuple of the number of runs that were (re-)indexed
+        and the number that were already up to date.
+
+        """
+        indexed = skipped = 0
+        with self._connect() as conn:
+            for output_directory in find_output_directories(paths):
+                if self._index_run(conn, output_directory):
+                    indexed += 1
+                else:
+                    skipped += 1
+        return indexed, skipped
+
+    def query(self, filters=None, classifiers=None, group_by=None):
+        """
+        Returns ``(headers, rows)`` for the metrics that match ``filters`` (a dict
+        mapping ``FIELDS`` to lists of glob patterns, any of which may match) and
+        ``classifiers`` (a dict mapping classifier names to the values they must
+        have). If ``group_by`` (a list of ``FIELDS`` and/or
+        ``classifier:<name>``\ s) is specified, each row is an aggregate of the
+        values of the matching metrics for a group; otherwise, there is a row for
+        each metric.
+
+        """
+        joins, where, params = [], [], []
+        for field, patterns in sorted((filters or {}).iteritems()):
+            if not patterns:
+                continue
+            column = self._get_column(field)
+            where.append('({})'.format(' OR '.join(['{} GLOB ?'.format(column)] * len(patterns))))
+            params.extend(str(p) for p in patterns)
+        for key, value in sorted((classifiers or {}).iteritems()):
+            where.append('EXISTS (SELECT 1 FROM metric_classifiers AS c WHERE c.metric_id = m.id '
+                         'AND c.key = ? AND c.value = ?)')
+            params.extend([key, str(value)])
+
+        join_params = []
+        if group_by:
+            columns = []
+            for i, field in enumerate(group_by):
+                if field.startswith(CLASSIFIER_PREFIX):
+                    alias = 'g{}'.format(i)
+                    joins.append('LEFT JOIN metric_classifiers AS {0} '
+                                 'ON {0}.metric_id = m.id AND {0}.key = ?'.format(alias))
+                    join_params.append(field[len(CLASSIFIER_PREFIX):])
+                    columns.append('{}.value'.format(alias))
+                else:
+                    columns.append(self._get_column(field))
+            headers = list(group_by) + [name for name, _ in AGGREGATES] + ['units']
+            select = columns + [expr for _, expr in AGGREGATES] + ['GROUP_CONCAT(DISTINCT m.units)']
+            suffix = 'GROUP BY {0} ORDER BY {0}'.format(', '.join(columns))
+        else:
+            headers = RAW_COLUMNS
+            select = [FIELDS.get(c, 'm.' + c) for c in RAW_COLUMNS]
+            suffix = 'ORDER BY r.name, i.id, m.id'
+
+        sql = ('SELECT {} FROM metrics AS m '
+               'INNER JOIN iterations AS i ON m.iteration_id = i.id '
+               'INNER JOIN runs AS r ON i.run_id = r.id {} {} {}')
+        sql = sql.format(', '.join(select), ' '.join(joins),
+                         'WHERE ' + ' AND '.join(where) if where else '', suffix)
+        with self._connect() as conn:
+            rows = conn.execute(sql, join_params + params).fetchall()
+        return headers, rows
+
+    def _index_run(self, conn, output_directory):
+        source = get_result_source(output_directory)
+        if source is None:
+            self.logger.debug('No results found in {}'.format(output_directory))
+            return False
+        path = os.path.abspath(output_directory)
+        mtime = os.path.getmtime(source)
+        existing = conn.execute('SELECT id, source, mtime, hash FROM runs WHERE path = ?', (path,)).fetchone()
+        if existing and existing[1] == source and existing[2] == mtime:
+            return False
+        digest = sha256(source)
+        if existing and existing[1] == source and existing[3] == digest:
+            conn.execute('UPDATE runs SET mtime = ? WHERE id = ?', (mtime, existing[0]))
+            return False
+        if existing:
+            self._delete_run(conn, existing[0])
+
+        self.logger.debug('Indexing {}'.format(output_directory))
+        run_config = read_run_config(output_directory)
+        name = run_config.get('run_name') or os.path.basename(path)
+        cursor = conn.execute('INSERT INTO runs (path, source, mtime, hash, name, project, device) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (path, source, mtime, digest, name, run_config.get('project'),
+                               run_config.get('device')))
+        run_id = cursor.lastrowid
+        metric_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM metrics').fetchone()[0]
+        metric_rows, classifier_rows = [], []
+        for record in read_result_records(source):
+            cursor = conn.execute('INSERT INTO iterations (run_id, spec_id, workload, label, iteration, status) '
+                                  'VALUES (?, ?, ?, ?, ?, ?)',
+                                  (run_id, record.get('id'), record.get('workload'), record.get('label'),
+                                   record.get('iteration'), record.get('status')))
+            iteration_id = cursor.lastrowid
+            for metric in record['metrics']:
+                metric_id += 1
+                metric_rows.append((metric_id, iteration_id, metric['name'], metric['value'],
+                                    metric.get('units'), int(bool(metric.get('lower_is_better')))))
+                for key, value in (metric.get('classifiers') or {}).iteritems():
+                    classifier_rows.append((metric_id, key, str(value)))
+        conn.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?)', metric_rows)
+        conn.executemany('INSERT INTO metric_classifiers VALUES (?, ?, ?)', classifier_rows)
+        return True
+
+    def _delete_run(self, conn, run_id):
+        iterations = 'SELECT id FROM iterations WHERE run_id = ?'
+        metrics = 'SELECT id FROM metrics WHERE iteration_id IN ({})'.format(iterations)
+        conn.execute('DELETE FROM metric_classifiers WHERE metric_id IN ({})'.format(metrics), (run_id,))
+        conn.execute('DELETE FROM metrics WHERE iteration_id IN ({})'.format(iterations), (run_id,))
+        conn.execute('DELETE FROM iterations WHERE run_id = ?', (run_id,))
+        conn.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+    def _get_column(self, field):
+        try:
+            return FIELDS[field]
+        except KeyError:
+            message = 'Unknown field "{}"; must be one of: {} (or {}<name>)'
+            raise ResultIndexError(message.format(field, ', '.join(sorted(FIELDS)), CLASSIFIER_PREFIX))
+
+    def _validate_schema_version(self):
+        with self._connect() as conn:
+            try:
+                found_version = conn.execute('SELECT schema_version FROM __meta').fetchone()[0]
+            except sqlite3.DatabaseError:
+                message = '{} does not appear to be a valid WA results index.'
+                raise ResultIndexError(message.format(self.database))
+        if found_version != SCHEMA_VERSION:
+            message = 'Schema version in {} ({}) does not match current version ({}); please re-create it.'
+            raise ResultIndexError(message.format(self.database, found_version, SCHEMA_VERSION))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.database)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def find_output_directories(paths):
+    """
+    Yields the WA output directories at, or under, each of the specified paths.
+    The output directories of runs are recognized by their ``__meta``
+    subdirectory, or by the presence of a results file.
+
+    """
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            if '__meta' in dirs or any(source in files for source in RESULT_SOURCES):
+                dirs[:] = []  # do not descend into iteration directories
+                yield root
+            else:
+                dirs.sort()
+
+
+def get_result_source(output_directory):
+    for name in RESULT_SOURCES:
+        path = os.path.join(output_directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_run_config(output_directory):
+    path = os.path.join(output_directory, '__meta', 'run_config.json')
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as fh:
+        try:
+            return json.load(fh)
+        except ValueError:
+            return {}
+
+
+def read_result_records(source):
+    """
+    Yields records (in the format of ``wlauto.core.result.iteration_result_to_record``,
+    with any fields that are not available omitted) from a results file.
+
+    """
+    name = os.path.basename(source)
+    if name == RESULT_STREAM_FILE:
+        for record in read_result_stream(source):
+            yield record
+    elif name == 'results.json':
+        with open(source) as fh:
+            for record in json.load(fh):
+                yield record
+    else:
+        for record in _read_results_csv(source):
+            yield record
+
+
+def _read_results_csv(source):
+    # results.csv has a row for each metric, with any extra columns between
+    # "metric" and "value" being classifiers.
+    with open(source) as fh:
+        reader = csv.reader(fh)
+        header = next(reader, None)
+        if not header:
+            return
+        classifier_names = header[4:-2]
+        record = None
+        for row in reader:
+            if len(row) != len(header):
+                continue
+            spec_id, label, iteration, name = row[:4]
+            if record is None or (record['id'], record['label'], record['iteration']) != (spec_id, label, iteration):
+                if record is not None:
+                    yield record
+                record = {'id': spec_id, 'workload': label, 'label': label, 'iteration': iteration, 'metrics': []}
+            try:
+                value = float(row[-2])
+            except ValueError:
+                continue
+            classifiers = dict((k, v) for k, v in zip(classifier_names, row[4:-2]) if v)
+            record['metrics'].append({'name': name, 'value': value, 'units': row[-1] or None,
+                                      'classifiers': classifiers})
+        if record is not None:
+            yield record
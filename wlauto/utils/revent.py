@@ -13,14 +13,37 @@
 # limitations under the License.
 #
 
+import os
 import struct
 import datetime
-import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+if np is not None:
+    # Mirrors ReventParser.event_struct ("<i4xqqHHi"), including the four bytes
+    # of padding after the device id, so that the event section of a recording
+    # can be mapped directly from disk.
+    EVENT_DTYPE = np.dtype({'names': ['device_id', 'sec', 'usec', 'type', 'code', 'value'],
+                            'formats': ['<i4', '<i8', '<i8', '<u2', '<u2', '<i4'],
+                            'offsets': [0, 8, 16, 24, 26, 28],
+                            'itemsize': 32})
+else:
+    EVENT_DTYPE = None
 
 
 class ReventParser(object):
     """
     Parses revent binary recording files so they can be easily read within python.
+
+    ``parse()`` streams events one at a time and works without numpy.
+    ``get_events()`` and ``get_timestamps()`` map the event section of the file as
+    a numpy structured array, so that large recordings can be processed without
+    unpacking each event individually.
+
     """
 
     int32_struct = struct.Struct("<i")
@@ -32,22 +55,50 @@ class ReventParser(object):
         self.device_paths = []
 
     def parse(self, path):
-        ReventParser.check_revent_file(path)
-
         with open(path, "rb") as f:
-            _read_struct(f, ReventParser.header_struct)
-            path_count, = _read_struct(f, self.int32_struct)
-            for _ in xrange(path_count):
-                path_length, = _read_struct(f, self.int32_struct)
-                if path_length >= 30:
-                    raise ValueError("path length too long. corrupt file")
-                self.device_paths.append(f.read(path_length))
-
-            while f.tell() < os.path.getsize(path):
-                device_id, sec, usec, typ, code, value = _read_struct(f, self.event_struct)
+            _, self.device_paths = _read_header(f, path)
+            while True:
+                data = f.read(self.event_struct.size)
+                if len(data) < self.event_struct.size:
+                    break  # end of file, or a truncated final event
+                device_id, sec, usec, typ, code, value = self.event_struct.unpack(data)
                 yield (device_id, datetime.datetime.fromtimestamp(sec + float(usec) / 1000000),
                        typ, code, value)
 
+    def get_events(self, path):
+        """
+        Returns a numpy structured array (with ``EVENT_DTYPE``) of the events in the
+        recording at ``path``. The array is memory-mapped from the file, so it is
+        not read into memory until it is accessed. Any trailing partial event in a
+        truncated file is ignored.
+
+        If numpy is not available, this falls back to streaming the file and
+        returns a list of ``(device_id, sec, usec, type, code, value)`` tuples.
+
+        """
+        with open(path, "rb") as f:
+            _, self.device_paths = _read_header(f, path)
+            offset = f.tell()
+            if np is None:
+                return [self.event_struct.unpack(data)
+                        for data in iter(lambda: f.read(self.event_struct.size), '')
+                        if len(data) == self.event_struct.size]
+        count = _get_event_count(path, offset)
+        if not count:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        return np.memmap(path, dtype=EVENT_DTYPE, mode='r', offset=offset, shape=(count,))
+
+    def get_timestamps(self, path):
+        """
+        Returns the timestamps of all events in the recording at ``path`` as float
+        seconds. This is a numpy array if numpy is available, and a list otherwise.
+
+        """
+        events = self.get_events(path)
+        if np is None:
+            return [sec + float(usec) / 1000000 for _, sec, usec, _, _, _ in events]
+        return events['sec'] + events['usec'] / 1000000.0
+
     @staticmethod
     def check_revent_file(path):
         """
@@ -64,13 +115,42 @@ class ReventParser(object):
     @staticmethod
     def get_revent_duration(path):
         """
-        Takes an ReventParser and returns the duration of the revent recording in seconds.
+        Returns the duration of the revent recording at ``path`` in seconds.
+
+        Only the first and last events are read, so this takes the same time
+        regardless of the length of the recording.
+
         """
-        revent_parser = ReventParser().parse(path)
-        first = last = next(revent_parser)
-        for last in revent_parser:
-            pass
-        return (last[1] - first[1]).total_seconds()
+        event_struct = ReventParser.event_struct
+        with open(path, "rb") as f:
+            _read_header(f, path)
+            offset = f.tell()
+            count = _get_event_count(path, offset)
+            if count < 2:
+                return 0.0
+            _, first_sec, first_usec, _, _, _ = _read_struct(f, event_struct)
+            f.seek(offset + (count - 1) * event_struct.size)
+            _, last_sec, last_usec, _, _, _ = _read_struct(f, event_struct)
+        return (last_sec - first_sec) + float(last_usec - first_usec) / 1000000
+
+
+def _read_header(f, path):
+    magic, file_version = _read_struct(f, ReventParser.header_struct)
+    if magic != "REVENT":
+        msg = "'{}' isn't an revent file, are you using an old recording?"
+        raise ValueError(msg.format(path))
+    device_paths = []
+    path_count, = _read_struct(f, ReventParser.int32_struct)
+    for _ in xrange(path_count):
+        path_length, = _read_struct(f, ReventParser.int32_struct)
+        if path_length >= 30:
+            raise ValueError("path length too long. corrupt file")
+        device_paths.append(f.read(path_length))
+    return file_version, device_paths
+
+
+def _get_event_count(path, offset):
+    return (os.path.getsize(path) - offset) // ReventParser.event_struct.size
 
 
 def _read_struct(f, struct_spec):
@@ -25,6 +25,9 @@ numpy, pyyaml (yaml), imutils and opencv (cv2)
 """
 
 import os
+import threading
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 import yaml
 try:
@@ -41,6 +44,25 @@ except ImportError:
     imutils = None
 
 
+MATCH_THRESHOLD = 0.5
+
+# Templates that would be smaller than this (in pixels, along either axis)
+# when downscaled are matched at full resolution only.
+MIN_COARSE_TEMPLATE_SIZE = 16
+
+# The number of best matches in the downscaled screenshot that are checked at
+# full resolution.
+COARSE_CANDIDATES = 3
+
+# Templates whose best match in the downscaled screenshot scores lower than this
+# are assumed not to be present. Otherwise, if none of the candidates are
+# confirmed, the whole screenshot is searched at full resolution.
+COARSE_REJECT_THRESHOLD = 0.3
+
+_definitions_cache = {}
+_definitions_cache_lock = threading.Lock()
+
+
 class StateDefinitionError(RuntimeError):
     pass
 
@@ -58,77 +80,205 @@ def auto_canny(image, sigma=0.33):
     return edged
 
 
-def match_state(screenshot_file, defpath, state_definitions):  # pylint: disable=too-many-locals
-    # check dependencies
+def check_dependencies():
     if np is None or cv2 is None or imutils is None:
         raise RuntimeError("State detection requires numpy, opencv (cv2) and imutils.")
 
-    # check if file exists, then load screenshot into opencv and create edge map
-    if not os.path.isfile(screenshot_file):
-        raise StateDefinitionError("Screenshot file not found")
-    img_rgb = cv2.imread(screenshot_file)
-    img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_BGR2GRAY)
-    img_edge = auto_canny(img_gray)
-
-    # make a list of all templates defined in the state definitions
-    template_list = []
-    for state in state_definitions["workload_states"]:
-        template_list.extend(state["templates"])
-
-    # check all template PNGs exist
-    for template_png in template_list:
-        if not os.path.isfile(os.path.join(defpath, 'templates', template_png + '.png')):
-            raise StateDefinitionError("Missing template PNG file: " + template_png + ".png")
-
-    # try to match each PNG
-    matched_templates = []
-    for template_png in template_list:
-        template = cv2.imread(os.path.join(defpath, 'templates', template_png + '.png'), 0)
-        template_edge = auto_canny(template)
-
-        res = cv2.matchTemplate(img_edge, template_edge, cv2.TM_CCOEFF_NORMED)
-        threshold = 0.5
-        loc = np.where(res >= threshold)
-        zipped = zip(*loc[::-1])
-
-        if len(zipped) > 0:
-            matched_templates.append(template_png)
-
-    # determine the state according to the matched templates
-    matched_state = "none"
-    for state in state_definitions["workload_states"]:
-        # look in the matched templates list for each template of this state
-        match_count = 0
-        for template in state["templates"]:
-            if template in matched_templates:
-                match_count += 1
-
-        if match_count >= state["matches"]:
-            # we have a match
-            matched_state = state["state_name"]
-            break
 
-    return matched_state
+class StateTemplate(object):
+    """
+    A template PNG loaded from a state definition directory, along with its edge
+    maps. Downscaled edge maps are computed on first use for each scale and kept.
 
+    """
 
-def verify_state(screenshot_file, state_defs_path, workload_phase):
-    # load and parse state definition file
-    statedefs_file = os.path.join(state_defs_path, 'definition.yaml')
-    if not os.path.isfile(statedefs_file):
-        raise StateDefinitionError("Missing state definitions yaml file: " + statedefs_file)
-    with open(statedefs_file) as fh:
-        state_definitions = yaml.load(fh)
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.image = cv2.imread(path, 0)
+        if self.image is None:
+            raise StateDefinitionError("Could not read template PNG file: " + name + ".png")
+        self.edge = auto_canny(self.image)
+        self._scaled_edges = {}
 
-    # run a match on the screenshot
-    matched_state = match_state(screenshot_file, state_defs_path, state_definitions)
+    def get_edge(self, scale=None):
+        if not scale or scale >= 1:
+            return self.edge
+        if scale not in self._scaled_edges:
+            height, width = self.image.shape[:2]
+            if min(height, width) * scale < MIN_COARSE_TEMPLATE_SIZE:
+                self._scaled_edges[scale] = None
+            else:
+                self._scaled_edges[scale] = auto_canny(_resize(self.image, scale))
+        return self._scaled_edges[scale]
 
-    # find what the expected state is for the given workload phase
-    expected_state = None
-    for phase in state_definitions["workload_phases"]:
-        if phase["phase_name"] == workload_phase:
-            expected_state = phase["expected_state"]
 
-    if expected_state is None:
+class StateDefinition(object):
+    """
+    The contents of a state definition directory: the parsed ``definition.yaml``
+    and the edge maps of all templates it references. Use
+    ``get_state_definition()`` to obtain instances, so that each directory is
+    only loaded once.
+
+    """
+
+    def __init__(self, path, definitions=None):
+        check_dependencies()
+        self.path = path
+        if definitions is None:
+            definitions_file = os.path.join(path, 'definition.yaml')
+            if not os.path.isfile(definitions_file):
+                raise StateDefinitionError("Missing state definitions yaml file: " + definitions_file)
+            with open(definitions_file) as fh:
+                definitions = yaml.load(fh)
+        self.definitions = definitions
+
+        # make a list of all templates defined in the state definitions
+        template_names = []
+        for state in self.definitions["workload_states"]:
+            for name in state["templates"]:
+                if name not in template_names:
+                    template_names.append(name)
+
+        # check all template PNGs exist
+        for name in template_names:
+            if not os.path.isfile(os.path.join(path, 'templates', name + '.png')):
+                raise StateDefinitionError("Missing template PNG file: " + name + ".png")
+
+        self.templates = [StateTemplate(name, os.path.join(path, 'templates', name + '.png'))
+                          for name in template_names]
+
+    def get_expected_state(self, workload_phase):
+        for phase in self.definitions["workload_phases"]:
+            if phase["phase_name"] == workload_phase:
+                return phase["expected_state"]
         raise StateDefinitionError("Phase not defined")
 
+    def match(self, screenshot_file, scale=None, jobs=None):
+        """
+        Returns the name of the state matching the screenshot, or ``"none"``.
+
+        If ``scale`` is specified (a value between 0 and 1), each template is first
+        located in a copy of the screenshot downscaled by that factor, and then
+        only the areas around the best few coarse matches are checked at full
+        resolution (see ``COARSE_CANDIDATES`` and ``COARSE_REJECT_THRESHOLD``).
+        ``jobs`` is the number of threads used to match templates (defaults to the
+        number of host CPUs).
+
+        """
+        # check if file exists, then load screenshot into opencv and create edge map
+        if not os.path.isfile(screenshot_file):
+            raise StateDefinitionError("Screenshot file not found")
+        img_gray = cv2.cvtColor(cv2.imread(screenshot_file), cv2.COLOR_BGR2GRAY)
+        img_edge = auto_canny(img_gray)
+        coarse_edge = None
+        if scale and scale < 1:
+            coarse_edge = auto_canny(_resize(img_gray, scale))
+            for template in self.templates:
+                template.get_edge(scale)  # populate before matching concurrently
+
+        def match_template(template):
+            if coarse_edge is not None and template.get_edge(scale) is not None:
+                return _match_coarse_to_fine(img_edge, coarse_edge, template, scale)
+            return _match_edges(img_edge, template.edge)
+
+        # matchTemplate releases the GIL, so templates can be matched concurrently
+        pool = ThreadPool(min(jobs or cpu_count(), len(self.templates)) or 1)
+        try:
+            results = pool.map(match_template, self.templates)
+        finally:
+            pool.close()
+        matched_templates = [t.name for t, matched in zip(self.templates, results) if matched]
+
+        # determine the state according to the matched templates
+        for state in self.definitions["workload_states"]:
+            # look in the matched templates list for each template of this state
+            match_count = 0
+            for template in state["templates"]:
+                if template in matched_templates:
+                    match_count += 1
+
+            if match_count >= state["matches"]:
+                # we have a match
+                return state["state_name"]
+        return "none"
+
+
+def get_state_definition(defpath):
+    """
+    Returns the ``StateDefinition`` for the specified directory, loading it only
+    if it has not been loaded before.
+
+    """
+    defpath = os.path.abspath(defpath)
+    with _definitions_cache_lock:
+        if defpath not in _definitions_cache:
+            _definitions_cache[defpath] = StateDefinition(defpath)
+        return _definitions_cache[defpath]
+
+
+def clear_state_definitions_cache():
+    with _definitions_cache_lock:
+        _definitions_cache.clear()
+
+
+def match_state(screenshot_file, defpath, state_definitions, scale=None, jobs=None):
+    definition = get_state_definition(defpath)
+    if definition.definitions != state_definitions:
+        definition = StateDefinition(defpath, state_definitions)
+    return definition.match(screenshot_file, scale=scale, jobs=jobs)
+
+
+def verify_state(screenshot_file, state_defs_path, workload_phase, scale=None, jobs=None):
+    definition = get_state_definition(state_defs_path)
+
+    # run a match on the screenshot
+    matched_state = definition.match(screenshot_file, scale=scale, jobs=jobs)
+
+    # find what the expected state is for the given workload phase
+    expected_state = definition.get_expected_state(workload_phase)
+
     return expected_state == matched_state
+
+
+def _resize(image, scale):
+    height, width = image.shape[:2]
+    return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _match_edges(img_edge, template_edge):
+    if img_edge.shape[0] < template_edge.shape[0] or img_edge.shape[1] < template_edge.shape[1]:
+        return False
+    res = cv2.matchTemplate(img_edge, template_edge, cv2.TM_CCOEFF_NORMED)
+    return res.max() >= MATCH_THRESHOLD
+
+
+def _match_coarse_to_fine(img_edge, coarse_edge, template, scale):
+    coarse_template = template.get_edge(scale)
+    if coarse_edge.shape[0] < coarse_template.shape[0] or coarse_edge.shape[1] < coarse_template.shape[1]:
+        return False
+    res = cv2.matchTemplate(coarse_edge, coarse_template, cv2.TM_CCOEFF_NORMED)
+    best_score = cv2.minMaxLoc(res)[1]
+    if best_score < COARSE_REJECT_THRESHOLD:
+        return False
+
+    # only search the neighbourhoods of the best coarse matches at full resolution
+    margin = int(2 / scale)
+    height, width = template.edge.shape[:2]
+    coarse_height, coarse_width = coarse_template.shape[:2]
+    for _ in xrange(COARSE_CANDIDATES):
+        _, score, _, (cx, cy) = cv2.minMaxLoc(res)
+        if score < COARSE_REJECT_THRESHOLD:
+            break
+        x, y = int(cx / scale), int(cy / scale)
+        region = img_edge[max(0, y - margin):y + height + margin,
+                          max(0, x - margin):x + width + margin]
+        if _match_edges(region, template.edge):
+            return True
+        # suppress this match, so that the next candidate is somewhere else
+        res[max(0, cy - coarse_height // 2):cy + coarse_height // 2 + 1,
+            max(0, cx - coarse_width // 2):cx + coarse_width // 2 + 1] = -1
+
+    # the template may not have survived downscaling well
+    return _match_edges(img_edge, template.edge)
@@ -0,0 +1,216 @@
+#    Copyright 2016 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Diffing of ``/proc/interrupts`` and sysfs snapshots taken before and after
+workload execution.
+
+``/proc/interrupts`` is parsed into a matrix of counts (IRQ x CPU), so that the
+deltas for all interrupts are computed in a single step (vectorized, if numpy is
+available). Sysfs files are compared as a whole before being diffed token by
+token, and the diffs of unchanged contents (which is the vast majority of files)
+are cached by content, so that each distinct value is only tokenized once.
+
+As well as the text diffs, the results can be written as CSV and JSON.
+
+"""
+import re
+import csv
+import json
+import logging
+from collections import OrderedDict
+from itertools import izip_longest
+
+from wlauto.utils.misc import diff_tokens, write_table
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+logger = logging.getLogger('sysdiff')
+
+TOKEN_REGEX = re.compile(r'(\W+)')
+
+
+class InterruptTable(object):
+    """
+    The contents of ``/proc/interrupts`` (or a diff of two of them).
+
+    ``counts`` is a matrix (a numpy array if numpy is available, or a list of
+    lists otherwise) with a row for each interrupt and a column for each CPU.
+    Some entries (e.g. ``Err:``) have fewer counts than there are CPUs; the number
+    of counts in each row is in ``widths``, and the remaining columns are zero.
+    In a diff, ``new`` indicates the interrupts that only appeared in the "after"
+    table, for which the counts are absolute rather than deltas.
+
+    """
+
+    def __init__(self, cpus, names, counts, widths, descriptions, new=None):
+        self.cpus = cpus
+        self.names = names
+        self.counts = counts
+        self.widths = widths
+        self.descriptions = descriptions
+        self.new = new or [False] * len(names)
+
+    def iter_rows(self):
+        """Yields ``(name, counts, description, new)`` for each interrupt."""
+        counts = self.counts.tolist() if np is not None and hasattr(self.counts, 'tolist') else self.counts
+        for i, name in enumerate(self.names):
+            yield name, counts[i][:self.widths[i]], self.descriptions[i], self.new[i]
+
+    def write_text(self, wfh):
+        rows = [['', ''] + self.cpus]
+        padding = len(self.cpus)
+        for name, counts, description, new in self.iter_rows():
+            rows.append(['>' if new else '', name] + counts +
+                        [''] * (padding - len(counts)) + [description])
+        write_table(rows, wfh)
+
+    def write_csv(self, wfh):
+        writer = csv.writer(wfh)
+        writer.writerow(['irq'] + self.cpus + ['description', 'new'])
+        padding = len(self.cpus)
+        for name, counts, description, new in self.iter_rows():
+            writer.writerow([name.rstrip(':')] + counts + [''] * (padding - len(counts)) +
+                            [description, int(new)])
+
+    def write_json(self, wfh):
+        interrupts = [OrderedDict([('irq', name.rstrip(':')), ('counts', counts),
+                                   ('description', description), ('new', new)])
+                      for name, counts, description, new in self.iter_rows()]
+        json.dump(OrderedDict([('cpus', self.cpus), ('interrupts', interrupts)]), wfh, indent=4)
+
+
+def parse_interrupts(text):
+    """Parses the contents of ``/proc/interrupts`` into an ``InterruptTable``."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        raise ValueError('No interrupts found')
+    cpus = lines[0].split()
+    ncpus = len(cpus)
+    names, counts, widths, descriptions = [], [], [], []
+    for line in lines[1:]:
+        tokens = line.split(None, ncpus + 1)
+        if len(tokens) > ncpus and ''.join(tokens[1:ncpus + 1]).isdigit():
+            width = ncpus
+        else:  # e.g. "Err:", which only has a single count
+            width = 0
+            for token in tokens[1:ncpus + 1]:
+                if not token.isdigit():
+                    break
+                width += 1
+            tokens = line.split(None, width + 1)
+        names.append(tokens[0])
+        widths.append(width)
+        descriptions.append(' '.join(tokens[width + 1].split()) if len(tokens) > width + 1 else '')
+        counts.extend(tokens[1:width + 1])
+        counts.extend('0' * (ncpus - width))
+    if np is not None:
+        counts = np.fromstring(' '.join(counts), dtype=np.int64, sep=' ').reshape(len(names), ncpus)
+    else:
+        counts = map(int, counts)
+        counts = [counts[i:i + ncpus] for i in xrange(0, len(counts), ncpus)]
+    return InterruptTable(cpus, names, counts, widths, descriptions)
+
+
+def diff_interrupts(before, after):
+    """
+    Returns an ``InterruptTable`` with the change in the counts of each interrupt
+    from ``before`` to ``after``, in the order in which they appear in ``after``.
+    Interrupts that are no longer present in ``after`` are ignored.
+
+    """
+    index = dict((name, i) for i, name in enumerate(before.names))
+    matched = [index.get(name) for name in after.names]
+    new = [i is None for i in matched]
+    missing = set(before.names) - set(after.names)
+    if missing:
+        logger.debug('Interrupts missing after execution: {}'.format(', '.join(sorted(missing))))
+
+    if np is not None:
+        if not before.names or all(new):
+            deltas = after.counts.copy()
+        else:
+            before_rows = before.counts[np.array([i or 0 for i in matched], dtype=np.intp)]
+            deltas = np.where(np.array(new)[:, np.newaxis], after.counts, after.counts - before_rows)
+    else:
+        deltas = [arow if i is None else [a - b for a, b in zip(arow, before.counts[i])]
+                  for arow, i in zip(after.counts, matched)]
+    return InterruptTable(after.cpus, after.names, deltas, after.widths, after.descriptions, new)
+
+
+def diff_sysfs_text(before, after, name=None):
+    """
+    Returns a token-level diff of the ``before`` and ``after`` contents of a sysfs
+    file. Numeric tokens are replaced with the change in their value, and other
+    tokens that changed are shown as ``[before -> after]``.
+
+    """
+    output = []
+    for i, (bline, aline) in enumerate(izip_longest(before.splitlines(True), after.splitlines(True)), 1):
+        if aline is None or bline is None:
+            logger.debug('Number of lines changed in {}'.format(name))
+            break
+        bchunks = TOKEN_REGEX.split(bline)
+        achunks = TOKEN_REGEX.split(aline)
+        if len(bchunks) != len(achunks):
+            logger.debug('Token length mismatch in {} on line {}'.format(name, i))
+            output.append('xxx ' + bline)
+            continue
+        if ((len([c for c in bchunks if c.strip()]) == len([c for c in achunks if c.strip()]) == 2) and
+                (bchunks[0] == achunks[0])):
+            # if there are only two columns and the first column is the
+            # same, assume it's a "header" column and do not diff it.
+            dchunks = [bchunks[0]] + [diff_tokens(b, a) for b, a in zip(bchunks[1:], achunks[1:])]
+        else:
+            dchunks = [diff_tokens(b, a) for b, a in zip(bchunks, achunks)]
+        output.append(''.join(dchunks))
+    return ''.join(output)
+
+
+class SysfsDiffer(object):
+    """
+    Diffs the contents of sysfs files, recording the files whose contents changed
+    in ``changes`` (an ``OrderedDict`` mapping names to ``(before, after)``).
+
+    """
+
+    def __init__(self):
+        self.changes = OrderedDict()
+        self._unchanged_diffs = {}
+
+    def diff(self, name, before, after):
+        if before == after:
+            result = self._unchanged_diffs.get(before)
+            if result is None:
+                result = diff_sysfs_text(before, after, name)
+                self._unchanged_diffs[before] = result
+            return result
+        self.changes[name] = (before, after)
+        return diff_sysfs_text(before, after, name)
+
+    def write_csv(self, wfh):
+        writer = csv.writer(wfh)
+        writer.writerow(['path', 'before', 'after'])
+        for name, (before, after) in self.changes.iteritems():
+            writer.writerow([name, before.rstrip('\n'), after.rstrip('\n')])
+
+    def write_json(self, wfh):
+        changes = OrderedDict((name, OrderedDict([('before', before), ('after', after)]))
+                              for name, (before, after) in self.changes.iteritems())
+        json.dump(changes, wfh, indent=4)
@@ -126,9 +126,9 @@ class Geekbench(AndroidUiAutoBenchmark):
         outfile_glob = self.device.path.join(self.device.package_data_directory, self.package, 'files', '*gb3')
         on_device_output_files = [f.strip() for f in self.device.execute('ls {}'.format(outfile_glob),
                                                                          as_root=True).split('\n') if f]
-        for i, on_device_output_file in enumerate(on_device_output_files):
-            host_temp_file = tempfile.mktemp()
-            self.device.pull_file(on_device_output_file, host_temp_file)
+        host_temp_files = [tempfile.mktemp() for _ in on_device_output_files]
+        self.device.pull_files(zip(on_device_output_files, host_temp_files))
+        for i, (on_device_output_file, host_temp_file) in enumerate(zip(on_device_output_files, host_temp_files)):
             host_output_file = os.path.join(context.output_directory, os.path.basename(on_device_output_file))
             with open(host_temp_file) as fh:
                 data = json.load(fh)
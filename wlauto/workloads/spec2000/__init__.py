@@ -252,8 +252,8 @@ class Spec2000(Workload):
         datadir = self.device.path.join(self.device.working_directory, self.name, basename)
         if self.force_push_assets or not self.device.file_exists(datadir):
             self.device.execute('mkdir -p {}'.format(datadir))
-            for datafile in bench.datafiles:
-                self.device.push_file(datafile, self.device.path.join(datadir, os.path.basename(datafile)))
+            self.device.push_files([(datafile, self.device.path.join(datadir, os.path.basename(datafile)))
+                                    for datafile in bench.datafiles])
 
         if self.mode == 'speed':
             cpus = [self._get_fastest_cpu().lower()]
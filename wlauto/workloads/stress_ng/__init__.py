@@ -89,8 +89,8 @@ class StressNg(Workload):
                                      'stress_ng_output.txt')
         host_file_results = os.path.join(context.output_directory,
                                          'stress_ng_results.yaml')
-        self.device.pull_file(self.log, host_file_log)
-        self.device.pull_file(self.results, host_file_results)
+        self.device.pull_files([(self.log, host_file_log),
+                                (self.results, host_file_results)])
 
         with open(host_file_results, 'r') as stress_ng_results:
             results = yaml.load(stress_ng_results)
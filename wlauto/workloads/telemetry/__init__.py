@@ -18,18 +18,18 @@ import os
 import re
 import csv
 import shutil
-import json
 import urllib
 import stat
 from zipfile import is_zipfile, ZipFile
 
 try:
-    import pandas as pd
+    import numpy as np
 except ImportError:
-    pd = None
+    np = None
 
 from wlauto import Workload, Parameter
 from wlauto.exceptions import WorkloadError, ConfigError
+from wlauto.utils.chrome_trace import get_event_timestamps
 from wlauto.utils.misc import check_output, get_null, get_meansd
 from wlauto.utils.types import numeric
 
@@ -131,6 +131,8 @@ class Telemetry(Workload):
             raise WorkloadError('Unexected error from run_benchmark: {}'.format(ret))
         if self.extract_fps and 'trace' not in self.run_benchmark_params:
             raise ConfigError('"trace" profiler must be enabled in order to extract FPS for Telemetry')
+        if self.extract_fps and np is None:
+            raise ConfigError('numpy must be installed in order to extract FPS for Telemetry')
         self._resolve_run_benchmark_path()
 
     def setup(self, context):
@@ -233,21 +235,17 @@ def _extract_fps(context):
     for tf in trace_files:
         name = os.path.splitext(os.path.basename(tf))[0]
         fps_file = os.path.join(context.output_directory, name + '-fps.csv')
-        with open(tf) as fh:
-            data = json.load(fh)
-            events = pd.Series([e['ts'] for e in data['traceEvents'] if
-                                FRAME_EVENT == e['name']])
-            fps = (1000000 / (events - events.shift(1)))
-            fps.index = events
-            df = fps.dropna().reset_index()
-            df.columns = ['timestamp', 'fps']
-            with open(fps_file, 'w') as wfh:
-                df.to_csv(wfh, index=False)
-            context.add_artifact('{}_fps'.format(name), fps_file, kind='data')
-            context.result.add_metric('{} FPS'.format(name), df.fps.mean(),
-                                      units='fps')
-            context.result.add_metric('{} FPS (std)'.format(name), df.fps.std(),
-                                      units='fps', lower_is_better=True)
+        events = get_event_timestamps(tf, FRAME_EVENT)
+        fps = 1000000 / np.diff(events)
+        with open(fps_file, 'w') as wfh:
+            writer = csv.writer(wfh)
+            writer.writerow(['timestamp', 'fps'])
+            writer.writerows(zip(events[1:].tolist(), fps.tolist()))
+        context.add_artifact('{}_fps'.format(name), fps_file, kind='data')
+        context.result.add_metric('{} FPS'.format(name), fps.mean() if len(fps) else float('nan'),
+                                  units='fps')
+        context.result.add_metric('{} FPS (std)'.format(name), fps.std(ddof=1) if len(fps) > 1 else float('nan'),
+                                  units='fps', lower_is_better=True)
 
 
 class TelemetryResult(object):